@@ -0,0 +1,386 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from utils import estimate_tokens
+
+class RateLimitError(Exception):
+    """
+    Raised by a backend when the model API rejects a request because a quota was exceeded (HTTP 429).
+
+    Attributes:
+        retry_after (float): The delay in seconds suggested by the API before retrying, or None.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PermanentError(Exception):
+    """
+    Raised by a backend when a request failed in a way that retrying cannot fix, e.g. an
+    invalid request or missing credentials.
+    """
+
+class ModelBackend:
+    """
+    The interface between the model modules and a model API.
+
+    get_code_response, get_dir_response, get_final_response and update_with_feedback all
+    go through the active backend, so the pipeline can run against Gemini or offline
+    against a simulated backend.
+    """
+
+    def generate(self, model_name, system_prompt, prompt):
+        """
+        Sends a single stateless request.
+
+        Args:
+            model_name (str): The name of the model.
+            system_prompt (str): The system instruction of the model.
+            prompt (str): The prompt.
+
+        Returns:
+            str: The text of the response.
+        """
+        raise NotImplementedError
+
+    def generate_stream(self, model_name, system_prompt, prompt):
+        """
+        Sends a single stateless request, yielding the response as it is generated.
+
+        Backends without streaming yield the whole response at once.
+
+        Args:
+            model_name (str): The name of the model.
+            system_prompt (str): The system instruction of the model.
+            prompt (str): The prompt.
+
+        Yields:
+            str: Consecutive pieces of the response text.
+        """
+        yield self.generate(model_name, system_prompt, prompt)
+
+    def start_chat(self, model_name, system_prompt):
+        """
+        Starts a chat session that keeps its history between messages.
+
+        Args:
+            model_name (str): The name of the model.
+            system_prompt (str): The system instruction of the model.
+
+        Returns:
+            object: A chat with a send_message(prompt) method returning the response text.
+        """
+        raise NotImplementedError
+
+class GeminiBackend(ModelBackend):
+    """
+    Backend calling the Gemini API through google.generativeai.
+
+    The client is configured and each GenerativeModel is created on first use. All models
+    share the default client of google.generativeai, so every call reuses its connection.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._configured = False
+
+    def _get_model(self, model_name, system_prompt):
+        key = (model_name, system_prompt)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                import google.generativeai as genai
+                if not self._configured:
+                    from dotenv import load_dotenv
+                    load_dotenv()
+                    if 'GOOGLE_API_KEY' not in os.environ:
+                        raise PermanentError("GOOGLE_API_KEY is not set")
+                    genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
+                    self._configured = True
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name, system_instruction=system_prompt)
+                    self._models[key] = model
+        return model
+
+    @staticmethod
+    def _translate_error(error):
+        from google.api_core import exceptions as api_exceptions
+        if isinstance(error, api_exceptions.TooManyRequests) or isinstance(error, api_exceptions.ResourceExhausted):
+            match = re.search(r'retry_delay\s*\{\s*seconds:\s*(\d+)', str(error))
+            return RateLimitError(str(error), float(match.group(1)) if match else None)
+        if isinstance(error, api_exceptions.ClientError):
+            return PermanentError(str(error))
+        return error
+
+    def generate(self, model_name, system_prompt, prompt):
+        try:
+            return self._get_model(model_name, system_prompt).generate_content(prompt).text
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is e:
+                raise
+            raise error from e
+
+    def generate_stream(self, model_name, system_prompt, prompt):
+        try:
+            for chunk in self._get_model(model_name, system_prompt).generate_content(prompt, stream=True):
+                yield chunk.text
+        except Exception as e:
+            error = self._translate_error(e)
+            if error is e:
+                raise
+            raise error from e
+
+    def start_chat(self, model_name, system_prompt):
+        return GeminiChat(self, self._get_model(model_name, system_prompt).start_chat(history=[]))
+
+class GeminiChat:
+    """
+    A Gemini chat session returning plain response text.
+    """
+
+    def __init__(self, backend, chat):
+        self.backend = backend
+        self.chat = chat
+
+    def send_message(self, prompt):
+        try:
+            return self.chat.send_message(prompt).text
+        except Exception as e:
+            error = self.backend._translate_error(e)
+            if error is e:
+                raise
+            raise error from e
+
+class FakeBackend(ModelBackend):
+    """
+    Offline backend simulating model latency, failures and rate limiting.
+
+    Responses are deterministic functions of the model name and prompt, so caching and
+    deduplication behave as with a real model. Request, token and byte counters make it
+    possible to measure the pipeline without network access.
+
+    Attributes:
+        latency (float): The mean simulated latency of a request in seconds.
+        distribution (str): The latency distribution, one of "fixed", "uniform", "exponential" or "lognormal".
+        error_rate (float): The probability that a request fails with a transient error.
+        rate_limit_rate (float): The probability that a request fails with a RateLimitError.
+        quota (int): The number of requests accepted per quota window, further requests fail
+            with a RateLimitError like an exhausted API quota. 0 disables the quota.
+        quota_window (float): The length of the quota window in seconds.
+        response_tokens (int): The approximate length of a response in tokens.
+        requests (int): The number of requests received, including failed ones.
+        errors (int): The number of simulated transient errors.
+        rate_limited (int): The number of simulated rate limit errors.
+        prompt_tokens (int): The estimated number of prompt tokens received.
+        output_tokens (int): The estimated number of response tokens returned.
+        bytes_sent (int): The number of prompt bytes received.
+    """
+
+    def __init__(self, latency=0.0, distribution='fixed', error_rate=0.0, rate_limit_rate=0.0, quota=0, quota_window=60.0,
+                 response_tokens=150, seed=None):
+        """
+        Initializes a new FakeBackend instance.
+
+        Args:
+            latency (float, optional): The mean simulated latency in seconds. Defaults to 0.0.
+            distribution (str, optional): The latency distribution. Defaults to 'fixed'.
+            error_rate (float, optional): The probability of a transient error. Defaults to 0.0.
+            rate_limit_rate (float, optional): The probability of a rate limit error. Defaults to 0.0.
+            quota (int, optional): The number of requests accepted per quota window. Defaults to 0 (no quota).
+            quota_window (float, optional): The length of the quota window in seconds. Defaults to 60.0.
+            response_tokens (int, optional): The approximate response length in tokens. Defaults to 150.
+            seed (int, optional): The seed of the random generator. Defaults to None.
+        """
+        if distribution not in ('fixed', 'uniform', 'exponential', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.latency = latency
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.quota = quota
+        self.quota_window = quota_window
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._accepted = deque()
+
+    def _sample_latency(self):
+        if self.latency <= 0 or self.distribution == 'fixed':
+            return max(0.0, self.latency)
+        if self.distribution == 'uniform':
+            return self._random.uniform(0, 2 * self.latency)
+        if self.distribution == 'exponential':
+            return self._random.expovariate(1 / self.latency)
+        sigma = 0.5
+        return self._random.lognormvariate(math.log(self.latency) - sigma ** 2 / 2, sigma)
+
+    def _respond(self, model_name, prompt):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(prompt.encode('utf-8', errors='replace'))
+            self.prompt_tokens += estimate_tokens(prompt)
+            latency = self._sample_latency()
+            roll = self._random.random()
+            retry_after = self._check_quota()
+        if retry_after is not None:
+            with self._lock:
+                self.rate_limited += 1
+            raise RateLimitError("429 Quota exceeded (simulated)", retry_after=retry_after)
+        time.sleep(latency)
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limited += 1
+            raise RateLimitError("429 Resource has been exhausted (simulated)", retry_after=1.0)
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError("503 The service is currently unavailable (simulated)")
+
+        # Batched prompts ask for a JSON object keyed by the file names they contain
+        file_names = re.findall(r'^=== FILE: (.+) ===$', prompt, re.MULTILINE)
+        # Feedback routing prompts ask for a JSON array of the numbers of the sections they list
+        sections = re.findall(r'^(\d+)\. ', prompt, re.MULTILINE)
+        if file_names and 'JSON object' in prompt:
+            text = json.dumps({name: self._summary_text(model_name, f"{prompt}\0{name}") for name in file_names})
+        elif sections and 'JSON array' in prompt:
+            text = json.dumps([int(sections[int(hashlib.sha256(prompt.encode('utf-8', errors='replace')).hexdigest(), 16) % len(sections)])])
+        else:
+            text = self._summary_text(model_name, prompt)
+        with self._lock:
+            self.output_tokens += estimate_tokens(text)
+        return text
+
+    def _check_quota(self):
+        # Sliding window of accepted requests, returns the retry-after delay when the quota is used up
+        if not self.quota:
+            return None
+        now = time.monotonic()
+        while self._accepted and now - self._accepted[0] >= self.quota_window:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.quota:
+            return self.quota_window - (now - self._accepted[0])
+        self._accepted.append(now)
+        return None
+
+    def _summary_text(self, model_name, prompt):
+        digest = hashlib.sha256(f"{model_name}\0{prompt}".encode('utf-8', errors='replace')).hexdigest()
+        words = [digest[i:i + 6] for i in range(0, len(digest), 6)]
+        return f"Summary {digest[:12]}: " + " ".join(words[i % len(words)] for i in range(self.response_tokens))
+
+    def generate(self, model_name, system_prompt, prompt):
+        return self._respond(model_name, prompt)
+
+    def generate_stream(self, model_name, system_prompt, prompt):
+        # The simulated latency is the time to the first piece, the rest follows word by word
+        words = self._respond(model_name, prompt).split(' ')
+        for index in range(0, len(words), 16):
+            yield ' '.join(words[index:index + 16]) + (' ' if index + 16 < len(words) else '')
+
+    def start_chat(self, model_name, system_prompt):
+        return FakeChat(self, model_name)
+
+    def stats(self):
+        """
+        Returns the request counters.
+
+        Returns:
+            dict: The request, error, token and byte counters.
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'rate_limited': self.rate_limited,
+                'prompt_tokens': self.prompt_tokens,
+                'output_tokens': self.output_tokens,
+                'bytes_sent': self.bytes_sent,
+            }
+
+class FakeChat:
+    """
+    A simulated chat session. Like a real chat API, every message resends the whole history.
+    """
+
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+        self.history = []
+
+    def send_message(self, prompt):
+        response = self.backend._respond(self.model_name, "\n".join(self.history + [prompt]))
+        self.history.extend([prompt, response])
+        return response
+
+def create_backend(spec):
+    """
+    Creates a backend from a command-line specification.
+
+    Args:
+        spec (str): "gemini", or "fake" optionally followed by ":key=value,..." options of
+            FakeBackend, e.g. "fake:latency=0.5,distribution=lognormal,rate_limit_rate=0.02".
+
+    Returns:
+        ModelBackend: The backend.
+
+    Raises:
+        ValueError: If the specification names an unknown backend or has invalid options.
+    """
+    name, _, options = spec.partition(':')
+    if name == 'gemini':
+        return GeminiBackend()
+    if name == 'fake':
+        kwargs = {}
+        try:
+            for option in filter(None, options.split(',')):
+                key, _, value = option.partition('=')
+                kwargs[key.strip()] = value.strip() if key.strip() == 'distribution' else float(value)
+            for key in ('quota', 'response_tokens', 'seed'):
+                if key in kwargs:
+                    kwargs[key] = int(kwargs[key])
+            return FakeBackend(**kwargs)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid fake backend options {options!r}: {e}") from None
+    raise ValueError(f"Unknown model backend: {spec}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Returns the active backend, creating a GeminiBackend if none was set.
+
+    Returns:
+        ModelBackend: The active backend.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = GeminiBackend()
+    return _backend
+
+def set_backend(backend):
+    """
+    Sets the backend used by the model modules.
+
+    Args:
+        backend (ModelBackend): The backend to use.
+    """
+    global _backend
+    _backend = backend
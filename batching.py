@@ -0,0 +1,114 @@
+import json
+import os
+import re
+from utils import estimate_tokens
+
+BATCH_INSTRUCTIONS = """The following {count} files are small, describe each of them separately.
+Reply with a single JSON object and nothing else. Its keys are the file names exactly as given below and each value is the description of that file.
+"""
+# Only files estimated at up to this share of the batch budget are batched, so that a batch holds several files
+SMALL_FILE_SHARE = 0.25
+
+def fits_in_batch(size, batch_tokens):
+    """
+    Checks whether a file is small enough to be described in a batch with other files.
+
+    Args:
+        size (int): The size of the file in bytes.
+        batch_tokens (int): The token budget of the file contents of one batch.
+
+    Returns:
+        bool: True if the estimated tokens of the file are at most SMALL_FILE_SHARE of the budget.
+    """
+    return size // 4 <= batch_tokens * SMALL_FILE_SHARE
+
+def pack_batches(file_paths, token_budget, max_files, get_size=os.path.getsize):
+    """
+    Groups small files into batches that fit one request.
+
+    Files are packed greedily in order using their size on disk as a token estimate. A
+    batch never holds two files with the same name, since names are the keys of the
+    structured answer.
+
+    Args:
+        file_paths (list): The paths of the files to pack.
+        token_budget (int): The token budget of the file contents of one batch.
+        max_files (int): The maximum number of files in one batch.
+        get_size (callable, optional): Returns the size of a file in bytes. Defaults to os.path.getsize.
+
+    Returns:
+        list: The batches as lists of indices into file_paths.
+    """
+    batches = []
+    current, current_tokens, current_names = [], 0, set()
+    for index, file_path in enumerate(file_paths):
+        name = os.path.basename(file_path)
+        try:
+            tokens = get_size(file_path) // 4 + estimate_tokens(name)
+        except OSError:
+            tokens = 0
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_files or name in current_names):
+            batches.append(current)
+            current, current_tokens, current_names = [], 0, set()
+        current.append(index)
+        current_tokens += tokens
+        current_names.add(name)
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_prompt(files):
+    """
+    Builds the prompt asking for per-file descriptions of several files at once.
+
+    Args:
+        files (list): (file_name, contents) pairs.
+
+    Returns:
+        str: The prompt.
+    """
+    parts = [BATCH_INSTRUCTIONS.format(count=len(files))]
+    for file_name, contents in files:
+        parts.append(f"\n=== FILE: {file_name} ===\n{contents}\n")
+    return "".join(parts)
+
+def parse_batch_response(response, file_names):
+    """
+    Splits the structured answer to a batch prompt into per-file descriptions.
+
+    Args:
+        response (str): The model response.
+        file_names (list): The names of the files of the batch.
+
+    Returns:
+        dict: Descriptions keyed by file name, or None if the response is not a JSON object
+              with a non-empty description for every file.
+    """
+    text = response.strip()
+    fenced = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        start, end = text.find('{'), text.rfind('}')
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+
+    descriptions = {}
+    for file_name in file_names:
+        value = data.get(file_name)
+        if value is None:
+            return None
+        if not isinstance(value, str):
+            value = json.dumps(value, indent=1)
+        if not value.strip():
+            return None
+        descriptions[file_name] = value
+    return descriptions
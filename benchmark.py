@@ -0,0 +1,348 @@
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from backends import FakeBackend, get_backend
+from path_filter import PathFilter
+from skeleton import SKELETON_EXTENSIONS, digest_source
+from utils import read_csv_file, extract_code_cells_from_notebook, read_file_with_fallback, estimate_tokens, BinaryFileError
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def make_synthetic_tree(root_dir, file_count, files_per_dir=50):
+    """
+    Creates a synthetic repository of empty files resembling a monorepo.
+
+    About 60% of the files are sources under src/, and the rest sit in node_modules/,
+    build/ and .venv/ subtrees that the generated .gitignore excludes.
+
+    Args:
+        root_dir (str): The directory to create the tree in.
+        file_count (int): The total number of files to create.
+        files_per_dir (int, optional): The number of files per leaf directory. Defaults to 50.
+    """
+    with open(os.path.join(root_dir, '.gitignore'), 'w') as file:
+        file.write("node_modules/\n/build\n.venv/\n*.log\n")
+    shares = [('src', 0.6, '.py'), ('node_modules', 0.25, '.js'), ('build', 0.1, '.o'), ('.venv', 0.05, '.py')]
+    for top, share, ext in shares:
+        count = int(file_count * share)
+        for index in range(count):
+            group = index // files_per_dir
+            dir_path = os.path.join(root_dir, top, f"pkg{group // 20}", f"mod{group % 20}")
+            if index % files_per_dir == 0:
+                os.makedirs(dir_path, exist_ok=True)
+            open(os.path.join(dir_path, f"file{index}{ext if index % 10 else '.log'}"), 'w').close()
+
+def legacy_walk(root_dir, ignored_dir, ignored_files, ignored_exts):
+    """
+    The directory walk used before PathFilter, kept as the benchmark baseline.
+    """
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = [d for d in dirs if d not in ignored_dir]
+        yield root, dirs, [f for f in files if f not in ignored_files and not any(f.endswith(ext) for ext in ignored_exts)]
+
+def bench_walk(args):
+    ignored_dir = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_dir.csv'))
+    ignored_exts = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_exts.csv'))
+    ignored_files = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_files.csv'))
+
+    root_dir = tempfile.mkdtemp(prefix='readme-maker-bench-')
+    try:
+        start = time.perf_counter()
+        make_synthetic_tree(root_dir, args.files)
+        print(f"Created {args.files} files in {time.perf_counter() - start:.1f}s")
+
+        walkers = [
+            ("os.walk + list filters", lambda: legacy_walk(root_dir, ignored_dir, ignored_files, ignored_exts)),
+            ("PathFilter.walk", lambda: PathFilter(root_dir, ignored_dir, ignored_files, ignored_exts).walk()),
+        ]
+        for name, walker in walkers:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                kept = sum(len(files) for _, _, files in walker())
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{name:<26} {kept:>9} files kept  {best:8.3f}s  {args.files / best:>12,.0f} files/sec")
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+def legacy_extract_code_cells(file_path):
+    """
+    The notebook extraction used before the streaming parser, kept as the benchmark baseline.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        notebook_data = json.load(file)
+    return '\n\n'.join(''.join(cell['source']) for cell in notebook_data['cells'] if cell['cell_type'] == 'code')
+
+def make_large_notebook(file_path, size_mb, rng):
+    """
+    Writes a notebook whose size comes almost entirely from base64 plot outputs, as saved by a data-science session.
+
+    Args:
+        file_path (str): The path of the notebook.
+        size_mb (float): The approximate size in MB.
+        rng (random.Random): The random generator of the image bytes.
+    """
+    image = base64.b64encode(rng.randbytes(750000)).decode('ascii')
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('{"cells": [')
+        for cell in range(max(1, int(size_mb))):
+            if cell:
+                file.write(', ')
+            json.dump({"cell_type": "markdown", "metadata": {}, "source": [f"## Figure {cell}\n"]}, file)
+            file.write(', ')
+            json.dump({
+                "cell_type": "code", "execution_count": cell, "metadata": {"scrolled": True},
+                "source": [f"frame_{cell} = load_frame({cell})\n", f"frame_{cell}.plot()\n"],
+                "outputs": [{"output_type": "display_data", "metadata": {},
+                             "data": {"image/png": image, "text/plain": ["<Figure size 640x480>"]}}],
+            }, file)
+        file.write('], "metadata": {"kernelspec": {"name": "python3"}}, "nbformat": 4, "nbformat_minor": 5}')
+
+def bench_notebook(args):
+    root_dir = tempfile.mkdtemp(prefix='readme-maker-notebook-')
+    try:
+        file_path = os.path.join(root_dir, "large.ipynb")
+        make_large_notebook(file_path, args.mb, random.Random(args.seed))
+        print(f"Notebook of {os.path.getsize(file_path) / 1e6:.1f} MB")
+        extractors = [
+            ("json.load", lambda: legacy_extract_code_cells(file_path)),
+            ("streaming", lambda: extract_code_cells_from_notebook(file_path)),
+            (f"streaming, {args.max_chars} chars", lambda: extract_code_cells_from_notebook(file_path, args.max_chars)),
+        ]
+        print(f"{'extractor':<26} {'time (s)':>9} {'peak MB':>9} {'chars':>9}")
+        for name, extractor in extractors:
+            tracemalloc.start()
+            start = time.perf_counter()
+            text = extractor()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<26} {elapsed:>9.2f} {peak / 1e6:>9.1f} {len(text or ''):>9}")
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+def bench_startup(args):
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-c", f"import {args.module}"]
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=project_dir, check=True)
+        timings.append(time.perf_counter() - start)
+    baseline = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], cwd=project_dir, check=True)
+        baseline.append(time.perf_counter() - start)
+    print(f"python -c 'import {args.module}': median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms over {args.repeat} runs "
+          f"(bare interpreter: median {statistics.median(baseline) * 1000:.0f} ms)")
+
+    # Cumulative import times of the slowest top-level imports
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                            cwd=project_dir, check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].rstrip()))
+    print("Slowest imports (cumulative):")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+def bench_skeleton(args):
+    ignored_dir = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_dir.csv'))
+    ignored_exts = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_exts.csv'))
+    ignored_files = read_csv_file(os.path.join(PROJECT_DIR, 'ignored_files.csv'))
+    repo_dir = os.path.abspath(args.path)
+
+    # Per extension: source files, files sent as skeletons, tokens of the sources and tokens sent
+    totals = {}
+    elapsed = 0.0
+    for root, _, files in PathFilter(repo_dir, ignored_dir, ignored_files, ignored_exts).walk():
+        for file_name in files:
+            ext = os.path.splitext(file_name)[1].lower()
+            if ext not in SKELETON_EXTENSIONS:
+                continue
+            try:
+                text = read_file_with_fallback(os.path.join(root, file_name))
+            except (BinaryFileError, OSError):
+                continue
+            if not text:
+                continue
+            start = time.perf_counter()
+            sent, is_skeleton = digest_source(file_name, text, args.ratio)
+            elapsed += time.perf_counter() - start
+            counts = totals.setdefault(ext, [0, 0, 0, 0])
+            counts[0] += 1
+            counts[1] += is_skeleton
+            counts[2] += estimate_tokens(file_name + text)
+            counts[3] += estimate_tokens(file_name + sent)
+
+    print(f"{'ext':<8} {'files':>7} {'skeletons':>10} {'source tok':>11} {'sent tok':>10} {'saved':>7}")
+    overall = [0, 0, 0, 0]
+    for ext, counts in sorted(totals.items(), key=lambda item: -item[1][2]):
+        print(f"{ext:<8} {counts[0]:>7} {counts[1]:>10} {counts[2]:>11} {counts[3]:>10} {1 - counts[3] / max(1, counts[2]):>7.0%}")
+        overall = [total + count for total, count in zip(overall, counts)]
+    print(f"{'total':<8} {overall[0]:>7} {overall[1]:>10} {overall[2]:>11} {overall[3]:>10} {1 - overall[3] / max(1, overall[2]):>7.0%}")
+    print(f"Skeleton extraction took {elapsed:.2f}s for {overall[0]} files")
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+def _python_source(rng, functions):
+    lines = [f"import os\nimport sys\n\nCONSTANT_{rng.randrange(1000)} = {rng.randrange(10 ** 6)}\n"]
+    for index in range(functions):
+        lines.append(f"\ndef function_{index}(value, factor={rng.randrange(10)}):\n"
+                     f"    \"\"\"Scales value number {index}.\"\"\"\n"
+                     f"    result = value * factor + {rng.randrange(1000)}\n"
+                     f"    if result > {rng.randrange(1000)}:\n"
+                     f"        return result - 1\n"
+                     f"    return result\n")
+    return "".join(lines)
+
+def make_tiny_files_repo(root_dir, rng, scale):
+    for index in range(int(2000 * scale)):
+        _write(os.path.join(root_dir, f"pkg{index % 40}", f"module_{index}.py"), _python_source(rng, 1))
+
+def make_huge_files_repo(root_dir, rng, scale):
+    for index in range(max(1, int(4 * scale))):
+        _write(os.path.join(root_dir, "generated", f"big_{index}.py"), _python_source(rng, 15000))
+    for index in range(10):
+        _write(os.path.join(root_dir, "src", f"small_{index}.py"), _python_source(rng, 3))
+
+def make_deep_tree_repo(root_dir, rng, scale):
+    for branch in range(max(1, int(4 * scale))):
+        path = os.path.join(root_dir, f"branch{branch}")
+        for depth in range(25):
+            path = os.path.join(path, f"level{depth}")
+            for index in range(3):
+                _write(os.path.join(path, f"node_{index}.py"), _python_source(rng, 2))
+
+def make_notebooks_repo(root_dir, rng, scale):
+    for index in range(max(1, int(30 * scale))):
+        cells = []
+        for cell in range(20):
+            cells.append({"cell_type": "markdown", "metadata": {}, "source": [f"## Step {cell}\n"]})
+            cells.append({
+                "cell_type": "code", "execution_count": cell, "metadata": {},
+                "source": [f"x_{cell} = load({cell})\n", "plot(x)\n"],
+                "outputs": [{"output_type": "display_data", "metadata": {},
+                             "data": {"image/png": base64.b64encode(rng.randbytes(25000)).decode('ascii'),
+                                      "text/plain": ["<Figure>"]}}],
+            })
+        notebook = {"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}
+        _write(os.path.join(root_dir, "notebooks", f"analysis_{index}.ipynb"), json.dumps(notebook))
+
+SCENARIOS = {
+    "tiny-files": make_tiny_files_repo,
+    "huge-files": make_huge_files_repo,
+    "deep-tree": make_deep_tree_repo,
+    "notebooks": make_notebooks_repo,
+}
+
+def run_scenario(repo_dir, backend, cli_args):
+    """
+    Runs the file, directory and initial README stages of main.py on a repository against a backend.
+
+    Args:
+        repo_dir (str): The repository to summarize.
+        backend (ModelBackend): The backend to run against.
+        cli_args (list): Extra command-line arguments of main.py.
+
+    Returns:
+        tuple: The wall time in seconds and the peak traced Python memory in bytes.
+    """
+    import main as cli
+    from redme_model import ReadmeGenerator
+
+    args = cli.build_parser().parse_args(["--local", repo_dir, "--no-cache"] + cli_args)
+    cli.configure_backend(backend, args)
+    ignored_dir, ignored_files, ignored_exts = cli.load_ignore_lists(args)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        cli.summarize_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts,
+                                 lambda structure: ReadmeGenerator().generate_readme(f"Generate a README for a GitHub repository with the following structure:\n\nStructure: {structure}"))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def bench_pipeline(args):
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    cli_args = args.cli_args[1:] if args.cli_args[:1] == ["--"] else args.cli_args
+    print(f"{'scenario':<12} {'files':>6} {'wall (s)':>9} {'requests':>9} {'errors':>7} {'retries':>8} {'prompt tok':>11} {'MB sent':>8} {'peak MB':>8}")
+    for name in names:
+        root_dir = tempfile.mkdtemp(prefix=f'readme-maker-{name}-')
+        try:
+            SCENARIOS[name](root_dir, random.Random(args.seed), args.scale)
+            file_count = sum(len(files) for _, _, files in os.walk(root_dir))
+            backend = FakeBackend(latency=args.latency, distribution=args.distribution, error_rate=args.error_rate,
+                                  rate_limit_rate=args.rate_limit_rate, quota=args.quota, quota_window=args.quota_window, seed=args.seed)
+            elapsed, peak = run_scenario(root_dir, backend, cli_args)
+            stats = backend.stats()
+            print(f"{name:<12} {file_count:>6} {elapsed:>9.2f} {stats['requests']:>9} {stats['errors'] + stats['rate_limited']:>7} {get_backend().retries:>8} "
+                  f"{stats['prompt_tokens']:>11} {stats['bytes_sent'] / 1e6:>8.2f} {peak / 1e6:>8.1f}")
+        finally:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for README-Maker.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    walk_parser = subparsers.add_parser("walk", help="Directory walk and ignore filtering throughput")
+    walk_parser.add_argument("--files", type=int, default=500000, help="Number of files in the synthetic tree")
+    walk_parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best one is reported")
+    walk_parser.set_defaults(func=bench_walk)
+
+    startup_parser = subparsers.add_parser("startup", help="Interpreter startup and import time of the CLI")
+    startup_parser.add_argument("--module", default="main", help="Module to import")
+    startup_parser.add_argument("--repeat", type=int, default=10, help="Number of timed runs")
+    startup_parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    startup_parser.set_defaults(func=bench_startup)
+
+    notebook_parser = subparsers.add_parser("notebook", help="Peak memory and time of extracting the code cells of a large notebook")
+    notebook_parser.add_argument("--mb", type=float, default=100, help="Approximate size of the notebook in MB")
+    notebook_parser.add_argument("--max-chars", type=int, default=2000, help="Extraction limit of the capped run")
+    notebook_parser.add_argument("--seed", type=int, default=0, help="Seed of the image bytes")
+    notebook_parser.set_defaults(func=bench_notebook)
+
+    skeleton_parser = subparsers.add_parser("skeleton", help="Prompt tokens of the source files of a repository, sent whole and as skeletons")
+    skeleton_parser.add_argument("path", help="Repository to measure")
+    skeleton_parser.add_argument("--ratio", type=float, default=0.5, help="Largest skeleton size as a fraction of the source, as --skeleton-ratio")
+    skeleton_parser.set_defaults(func=bench_skeleton)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="End-to-end pipeline runs on synthetic repositories against a simulated model")
+    pipeline_parser.add_argument("--scenario", choices=["all"] + list(SCENARIOS), default="all", help="Synthetic repository to run")
+    pipeline_parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the number of files in the synthetic repositories")
+    pipeline_parser.add_argument("--latency", type=float, default=0.05, help="Mean simulated model latency in seconds")
+    pipeline_parser.add_argument("--distribution", default="lognormal", choices=["fixed", "uniform", "exponential", "lognormal"], help="Simulated latency distribution")
+    pipeline_parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a simulated transient error")
+    pipeline_parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a simulated 429 response")
+    pipeline_parser.add_argument("--quota", type=int, default=0, help="Simulated API quota in requests per quota window, 0 for none")
+    pipeline_parser.add_argument("--quota-window", type=float, default=60.0, help="Length of the simulated quota window in seconds")
+    pipeline_parser.add_argument("--seed", type=int, default=0, help="Seed of the repository generator and the simulated model")
+    pipeline_parser.add_argument("cli_args", nargs=argparse.REMAINDER, help="Extra main.py options, e.g. -- --workers 16")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
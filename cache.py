@@ -0,0 +1,166 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Temporary files older than this are left over by interrupted writers, younger ones may belong
+# to another process writing to the same cache
+STALE_TMP_AGE = 3600
+
+class SummaryCache:
+    """
+    An on-disk, content-addressed cache for model responses.
+
+    Entries are stored as one text file per key, sharded by the first two characters
+    of the key. The modification time of an entry is refreshed on every hit so that
+    size-based eviction removes the least recently used entries first.
+
+    Attributes:
+        cache_dir (str): The directory holding the cache entries.
+        max_bytes (int): The maximum total size of the cache, or None for no limit.
+        max_age (float): The maximum age of an entry in seconds, or None for no limit.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not found in the cache.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None, max_age=None):
+        """
+        Initializes a new SummaryCache instance, creating the cache directory if needed.
+
+        Args:
+            cache_dir (str): The directory holding the cache entries.
+            max_bytes (int, optional): The maximum total size of the cache. Defaults to None.
+            max_age (float, optional): The maximum age of an entry in seconds. Defaults to None.
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, system_prompt, payload):
+        """
+        Builds the cache key of a model request.
+
+        Args:
+            model_name (str): The name of the model answering the request.
+            system_prompt (str): The system instruction of the model.
+            payload (str or bytes): The prompt sent to the model.
+
+        Returns:
+            str: The hex SHA-256 digest identifying the request.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8', errors='surrogatepass')
+        digest = hashlib.sha256()
+        for part in (model_name.encode('utf-8'), system_prompt.encode('utf-8'), payload):
+            digest.update(len(part).to_bytes(8, 'big'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.txt')
+
+    def get(self, key):
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The cache key from make_key.
+
+        Returns:
+            str: The cached response, or None if there is no fresh entry for the key.
+        """
+        path = self._path(key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as file:
+                value = file.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores a response in the cache. The write is atomic so concurrent readers never see partial entries.
+
+        Args:
+            key (str): The cache key from make_key.
+            value (str): The response to store.
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {path}: {e}")
+
+    def evict(self):
+        """
+        Removes entries older than max_age, then the least recently used entries until the
+        cache fits in max_bytes.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        removed = 0
+        now = time.time()
+        kept = []
+        for mtime, size, path in entries:
+            if (self.max_age is not None and now - mtime > self.max_age) or (path.endswith('.tmp') and now - mtime > STALE_TMP_AGE):
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in kept)
+            for mtime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        """
+        Returns a one-line description of the cache hit/miss counters.
+
+        Returns:
+            str: The hit and miss counts and the hit rate.
+        """
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
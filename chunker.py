@@ -0,0 +1,130 @@
+import re
+from utils import estimate_tokens
+
+# Lines at column 0 that start a new top-level definition in common languages
+BLOCK_START = re.compile(
+    r'^(?:@|def |async def |class |function |export |public |private |protected |static |func |fn |pub |impl |'
+    r'struct |enum |interface |type |module |package |template|#include|#define|'
+    r'(?:CREATE|INSERT|ALTER|DROP|COPY|UPDATE|DELETE) )',
+    re.IGNORECASE,
+)
+
+def split_into_blocks(text):
+    """
+    Splits source text at syntactic boundaries.
+
+    A new block starts at every top-level definition (function, class, decorator, SQL
+    statement, ...) and at every non-indented line following a blank line, so blocks are
+    function/class bodies or blank-line separated paragraphs.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The blocks as lists of lines (with line endings), in order.
+    """
+    blocks = []
+    current = []
+    previous_blank = False
+    for line in text.splitlines(keepends=True):
+        starts_block = line[:1] not in (' ', '\t', '\n', '\r', '') and (previous_blank or BLOCK_START.match(line))
+        if starts_block and current and not (current[-1].lstrip().startswith('@') and not previous_blank):
+            blocks.append(current)
+            current = []
+        current.append(line)
+        previous_blank = not line.strip()
+    if current:
+        blocks.append(current)
+    return blocks
+
+# The largest part number a header is sized for when the number of parts is not known yet
+MAX_PARTS = 999999
+
+def part_header(file_name, index, count):
+    """
+    Returns the line introducing one part of a file in its chunk request.
+
+    Args:
+        file_name (str): The name of the file.
+        index (int): The number of the part, from 1.
+        count (int): The number of parts.
+
+    Returns:
+        str: The header line, with its line ending.
+    """
+    return f"{file_name} (part {index} of {count})\n"
+
+def part_budget(file_name, chunk_tokens, overlap_tokens):
+    """
+    Splits the token budget of a chunk request between the header, the overlap and the new text.
+
+    Args:
+        file_name (str): The name of the file.
+        chunk_tokens (int): The token budget of the whole request.
+        overlap_tokens (int): The requested overlap.
+
+    Returns:
+        tuple: The token budget of the new text of a chunk and of its overlap, at most half of what the header leaves.
+    """
+    available = max(2, chunk_tokens - estimate_tokens(part_header(file_name, MAX_PARTS, MAX_PARTS)))
+    overlap_tokens = min(max(0, overlap_tokens), available // 2)
+    return available - overlap_tokens, overlap_tokens
+
+def _split_line(line, max_chars):
+    return [line[i:i + max_chars] for i in range(0, len(line), max_chars)]
+
+def chunk_text(text, chunk_tokens, overlap_tokens=0):
+    """
+    Packs the syntactic blocks of a text into chunks that fit a token budget.
+
+    Blocks are packed greedily. A block larger than the budget is split by lines, and a
+    single line larger than the budget is split by characters. Each chunk after the first
+    is prefixed with up to overlap_tokens of the lines ending the previous chunk.
+
+    Args:
+        text (str): The text to split.
+        chunk_tokens (int): The token budget of a chunk, excluding the overlap, see part_budget.
+        overlap_tokens (int, optional): The token budget of the overlap. Defaults to 0.
+
+    Returns:
+        list: The chunks as strings, in order.
+    """
+    # A piece of a line estimated at no more than the budget
+    max_chars = max(1, (chunk_tokens - 1) * 4)
+    lines = []
+    for block in split_into_blocks(text):
+        block_tokens = sum(estimate_tokens(line) for line in block)
+        for line in block:
+            for part in (_split_line(line, max_chars) if len(line) > max_chars else [line]):
+                lines.append((part, block_tokens <= chunk_tokens, block))
+
+    chunks = []
+    current, current_tokens, current_block = [], 0, None
+    for line, block_fits, block in lines:
+        if block is not current_block and block_fits:
+            # Starting a new block that fits the budget: only add it if the whole block fits
+            block_tokens = sum(estimate_tokens(part) for part in block)
+            if current and current_tokens + block_tokens > chunk_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+        elif current and current_tokens + estimate_tokens(line) > chunk_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current_block = block
+        current.append(line)
+        current_tokens += estimate_tokens(line)
+    if current:
+        chunks.append(current)
+
+    results = []
+    for index, chunk in enumerate(chunks):
+        overlap = []
+        if index and overlap_tokens:
+            budget = overlap_tokens
+            for line in reversed(chunks[index - 1]):
+                budget -= estimate_tokens(line)
+                if budget < 0:
+                    break
+                overlap.insert(0, line)
+        results.append(''.join(overlap + chunk))
+    return results
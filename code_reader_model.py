@@ -1,9 +1,4 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-api_key = os.environ['GOOGLE_API_KEY']
+from model_client import get_client
 
 
 sys_prpt = """
@@ -19,8 +14,8 @@ Ensure the description is free of filler details and grounded in what the code a
 """
 
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash',system_instruction=sys_prpt)
+model_name = 'gemini-1.5-flash'
+get_client().register('file', model_name, sys_prpt)
 
 def get_code_response(prompt):
     """
@@ -33,5 +28,4 @@ def get_code_response(prompt):
         str: A detailed description of the code file, including its logic flow, input/output, key components, and dependencies.
 
     """
-    response = model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+    return get_client().summarize_file(prompt)
\ No newline at end of file
@@ -0,0 +1,410 @@
+import argparse
+import contextvars
+import itertools
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import main as cli
+from backends import create_backend, get_backend
+from cache import SummaryCache
+from multi_repo import is_git_source, resolve_repository, write_repository_readme
+from pipeline import inflight_calls
+from rate_limiter import RateLimiter
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# The log file of the job the current thread works for, everything the pipeline prints goes there
+_job_log = contextvars.ContextVar('job_log', default=None)
+
+class JobOutput:
+    """
+    A stream writing to the log of the current job, or to the daemon's own stream outside of jobs.
+
+    It replaces sys.stdout and sys.stderr, since redirect_stdout would send the output of all
+    the jobs running at the same time to the same file.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        return (_job_log.get() or self.stream).write(text)
+
+    def flush(self):
+        (_job_log.get() or self.stream).flush()
+
+    def isatty(self):
+        return _job_log.get() is None and self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class ReadmeDaemon:
+    """
+    Runs README jobs in one long-lived process.
+
+    The model backend, the rate limiter and the summary cache are created once and shared by
+    every job, so a job pays neither the client setup nor a cold cache. Jobs wait in a queue
+    for one of the job threads. The concurrency limit of the backend and the rate limiter
+    hold for all jobs together, and identical file and directory requests of concurrent jobs
+    share a single model call. Jobs on the same repository run one after the other.
+
+    Finished jobs are kept for status requests until they are older than --job-max-age-hours
+    or more than --max-finished-jobs jobs have finished after them. Their logs stay on disk.
+
+    Attributes:
+        args (argparse.Namespace): The pipeline options used for every job.
+        limiter (RateLimiter): The rate limiter shared by the jobs.
+        cache (SummaryCache): The summary cache shared by the jobs, or None.
+        jobs (dict): The jobs keyed by id, as dicts with the id, source, description, status
+            ("queued", "running", "ok" or "failed"), repository directory, README path, error,
+            log path and submission, start and end times.
+    """
+
+    def __init__(self, args):
+        """
+        Initializes a new ReadmeDaemon instance and starts its job threads.
+
+        Args:
+            args (argparse.Namespace): The parsed command-line arguments of the serve command.
+        """
+        self.args = args
+        self.limiter = RateLimiter(args.rpm, args.tpm)
+        self.cache = None if args.no_cache else SummaryCache(args.cache_dir, args.cache_max_mb * 1024 * 1024, args.cache_max_age_days * 86400)
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._repo_locks = {}
+        cli.configure_backend(create_backend(args.backend), args)
+        self._threads = [threading.Thread(target=self._work, name=f'job-{index}', daemon=True) for index in range(max(1, args.jobs))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, source, description=""):
+        """
+        Queues a README job, or returns the job already queued or running for the same source and description.
+
+        Args:
+            source (str): A Git URL or a local path, relative paths are resolved against the daemon's directory.
+            description (str, optional): The description of the codebase. Defaults to "".
+
+        Returns:
+            dict: The job.
+
+        Raises:
+            ValueError: If the source is a Git URL and the daemon has no --root to clone it into.
+        """
+        is_git = is_git_source(source)
+        if is_git and not self.args.root:
+            raise ValueError("The daemon was started without --root, it cannot clone Git repositories")
+        if not is_git:
+            source = os.path.abspath(source)
+        with self._lock:
+            self._prune()
+            for job in self.jobs.values():
+                if job['source'] == source and job['description'] == description and job['status'] in ('queued', 'running'):
+                    return dict(job)
+            job_id = str(next(self._ids))
+            slug = re.sub(r'[^A-Za-z0-9._-]+', '_', source.rstrip('/'))[-60:]
+            job = {
+                'id': job_id,
+                'source': source,
+                'git': is_git,
+                'description': description,
+                'status': 'queued',
+                'repo_dir': None,
+                'readme': None,
+                'error': None,
+                'log': os.path.join(self.args.log_dir, f"{int(job_id):04d}-{slug}.log"),
+                'submitted': time.time(),
+                'started': None,
+                'finished': None,
+            }
+            self.jobs[job_id] = job
+        self._queue.put(job_id)
+        return dict(job)
+
+    def get(self, job_id):
+        """
+        Returns a snapshot of a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            dict: The job, or None if there is no such job.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        """
+        Returns the state of the daemon.
+
+        Returns:
+            dict: The number of jobs per status, the calls shared between jobs, and the
+                  counters of the backend and of the summary cache.
+        """
+        with self._lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+        backend = get_backend()
+        return {
+            'jobs': {status: statuses.count(status) for status in ('queued', 'running', 'ok', 'failed')},
+            'shared_calls': inflight_calls.shared,
+            'backend': backend.stats() if hasattr(backend, 'stats') else None,
+            'cache': self.cache.stats() if self.cache else None,
+        }
+
+    def _prune(self):
+        # Called with the lock held. Queued and running jobs are never dropped
+        finished = sorted((job for job in self.jobs.values() if job['finished'] is not None), key=lambda job: job['finished'])
+        oldest = time.time() - self.args.job_max_age_hours * 3600
+        excess = len(finished) - max(0, self.args.max_finished_jobs)
+        for index, job in enumerate(finished):
+            if index < excess or job['finished'] < oldest:
+                del self.jobs[job['id']]
+        # A repository lock is only needed while a job of that repository is queued or running
+        active = {job['source'] for job in self.jobs.values() if job['finished'] is None}
+        for source in [source for source in self._repo_locks if source not in active]:
+            del self._repo_locks[source]
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self.jobs[job_id]
+            repo_lock = self._repo_locks.setdefault(job['source'], threading.Lock())
+        with repo_lock:
+            with self._lock:
+                job.update(status='running', started=time.time())
+            status, error = 'failed', None
+            with open(job['log'], 'w', encoding='utf-8') as log:
+                token = _job_log.set(log)
+                try:
+                    entry = {'source': job['source'], 'git': job['git'], 'description': job['description']}
+                    repo_dir = resolve_repository(entry, self.args)
+                    with self._lock:
+                        job['repo_dir'] = repo_dir
+                    readme_path = write_repository_readme(entry, repo_dir, self.args, self.limiter, self.cache)
+                    with self._lock:
+                        job['readme'] = readme_path
+                    status = 'ok'
+                except (Exception, SystemExit) as e:
+                    # The pipeline exits on fatal errors of a single run, which must not end the daemon
+                    error = f"{type(e).__name__}: {e}"
+                    traceback.print_exc()
+                finally:
+                    _job_log.reset(token)
+            with self._lock:
+                job.update(status=status, error=error, finished=time.time())
+                self._prune()
+        print(f"Job {job_id} {status}: {job['source']}" + (f" ({error})" if error else ""))
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of the daemon.
+
+    GET /status returns the state of the daemon, POST /jobs with a JSON body
+    {"source": ..., "description": ...} queues a job, GET /jobs lists the jobs,
+    GET /jobs/<id> returns a job and GET /jobs/<id>/readme the README it wrote.
+    """
+
+    daemon = None
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['status']:
+            self._send_json(200, self.daemon.stats())
+        elif parts == ['jobs']:
+            with self.daemon._lock:
+                self._send_json(200, [dict(job) for job in self.daemon.jobs.values()])
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.daemon.get(parts[1])
+            if job is None:
+                self._send_json(404, {'error': f"No job {parts[1]}"})
+            elif len(parts) == 2:
+                self._send_json(200, job)
+            elif parts[2] != 'readme':
+                self._send_json(404, {'error': f"Unknown path {self.path}"})
+            elif job['status'] != 'ok':
+                self._send_json(409, {'error': f"Job {job['id']} is {job['status']}"})
+            else:
+                with open(job['readme'], 'rb') as file:
+                    self._send(200, 'text/markdown; charset=utf-8', file.read())
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.strip('/') != 'jobs':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            if not isinstance(body, dict) or not isinstance(body.get('source'), str) or not body['source']:
+                raise ValueError("The body must be a JSON object with a \"source\"")
+            job = self.daemon.submit(body['source'], str(body.get('description') or ""))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(202, job)
+
+    def _send_json(self, code, data):
+        self._send(code, 'application/json', json.dumps(data, indent=1).encode('utf-8'))
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Polling clients would flood the output with one line per request
+        pass
+
+def serve(args):
+    args.cache_dir = os.path.abspath(os.path.expanduser(args.cache_dir))
+    args.log_dir = os.path.abspath(args.log_dir)
+    os.makedirs(args.log_dir, exist_ok=True)
+    if args.root:
+        args.root = os.path.abspath(args.root)
+        os.makedirs(args.root, exist_ok=True)
+    sys.stdout, sys.stderr = JobOutput(sys.stdout), JobOutput(sys.stderr)
+
+    handler = type('Handler', (DaemonRequestHandler,), {'daemon': ReadmeDaemon(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"README daemon listening on http://{args.host}:{server.server_address[1]} with {args.jobs} job threads")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def request(server, method, path, body=None):
+    """
+    Sends a request to the daemon.
+
+    Args:
+        server (str): The URL of the daemon, e.g. "http://127.0.0.1:8765".
+        method (str): The HTTP method.
+        path (str): The path of the request.
+        body (dict, optional): Sent as JSON. Defaults to None.
+
+    Returns:
+        object: The decoded JSON response, or the text of a README.
+
+    Raises:
+        RuntimeError: If the daemon cannot be reached or rejected the request.
+    """
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    http_request = urllib.request.Request(server.rstrip('/') + path, data=data, method=method,
+                                          headers={'Content-Type': 'application/json'} if data else {})
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            text = response.read().decode('utf-8')
+            return json.loads(text) if response.headers.get_content_type() == 'application/json' else text
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read().decode('utf-8'))['error']
+        except (ValueError, KeyError):
+            message = str(e)
+        raise RuntimeError(message) from e
+    except urllib.error.URLError as e:
+        raise RuntimeError(f"Could not reach the daemon at {server}: {e.reason}") from e
+
+def submit(args):
+    source = args.git or os.path.abspath(args.local)
+    try:
+        job = request(args.server, 'POST', '/jobs', {'source': source, 'description': args.description})
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Job {job['id']} {job['status']}: {job['source']}")
+    if args.no_wait:
+        return
+    while job['status'] in ('queued', 'running'):
+        time.sleep(args.poll)
+        try:
+            job = request(args.server, 'GET', f"/jobs/{job['id']}")
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+    if job['status'] != 'ok':
+        print(f"Job {job['id']} failed: {job['error']}, see {job['log']}")
+        sys.exit(1)
+    print(f"README written to {job['readme']} in {job['finished'] - job['started']:.1f}s")
+
+def status(args):
+    try:
+        print(json.dumps(request(args.server, 'GET', f"/jobs/{args.job}" if args.job else '/status'), indent=1))
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+def build_parser():
+    """
+    Builds the parser of the serve, submit and status commands.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(description="Long-running README daemon and its client.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    default_server = os.environ.get("README_MAKER_SERVER", f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+    serve_parser = subparsers.add_parser("serve", help="Run the daemon")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    serve_parser.add_argument("--jobs", type=int, default=2, help="Number of README jobs run at the same time")
+    serve_parser.add_argument("--log-dir", default="readme-daemon-logs", help="Directory receiving the output of every job")
+    serve_parser.add_argument("--max-finished-jobs", type=int, default=200, help="Number of finished jobs kept for status requests")
+    serve_parser.add_argument("--job-max-age-hours", type=float, default=24.0, help="Hours a finished job is kept for status requests")
+    cli.add_pipeline_arguments(serve_parser)
+    serve_parser.set_defaults(func=serve)
+
+    submit_parser = subparsers.add_parser("submit", help="Queue a README job and wait for it")
+    group = submit_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--git", help="Git repository URL, cloned into the daemon's --root")
+    group.add_argument("--local", help="Path to local directory")
+    submit_parser.add_argument("--description", default="", help="Brief description of the codebase")
+    submit_parser.add_argument("--no-wait", action="store_true", help="Return once the job is queued")
+    submit_parser.add_argument("--poll", type=float, default=1.0, help="Seconds between status requests while waiting")
+    submit_parser.add_argument("--server", default=default_server, help="URL of the daemon")
+    submit_parser.set_defaults(func=submit)
+
+    status_parser = subparsers.add_parser("status", help="Print the state of the daemon, or of a job")
+    status_parser.add_argument("job", nargs="?", help="Id of the job")
+    status_parser.add_argument("--server", default=default_server, help="URL of the daemon")
+    status_parser.set_defaults(func=status)
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command == 'serve':
+        try:
+            create_backend(args.backend)
+        except ValueError as e:
+            parser.error(str(e))
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
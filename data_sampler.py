@@ -0,0 +1,398 @@
+import csv
+import io
+import json
+import os
+import re
+import struct
+from notebook import JsonStream
+
+# Bytes read from the start of a text data file, whatever its size
+SAMPLE_BYTES = 64 * 1024
+# Largest Parquet footer read, footers with many row groups hold per-column statistics
+MAX_FOOTER_BYTES = 8 * 1024 * 1024
+SAMPLE_ROWS = 3
+MAX_VALUE_CHARS = 40
+# Wide tables only list their first columns, and show even fewer in the sample rows
+MAX_COLUMNS = 100
+MAX_TABLE_COLUMNS = 12
+
+DATA_FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.json': 'json',
+}
+
+_INTEGER = re.compile(r'^[-+]?\d+$')
+_FLOAT = re.compile(r'^[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?$|^(?:nan|inf|-inf)$', re.IGNORECASE)
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_DATETIME = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+_BOOLEAN = {'true', 'false', 'yes', 'no'}
+
+def data_format(file_path, size):
+    """
+    Returns the data format of a file that is sampled instead of read.
+
+    JSON files are only sampled above SAMPLE_BYTES, smaller ones are usually configuration
+    that is better sent as it is.
+
+    Args:
+        file_path (str): The path to the file.
+        size (int): The size of the file in bytes.
+
+    Returns:
+        str: "csv", "tsv", "jsonl", "parquet" or "json", or None for other files.
+    """
+    data_type = DATA_FORMATS.get(os.path.splitext(file_path)[1].lower())
+    if data_type == 'json' and size <= SAMPLE_BYTES:
+        return None
+    return data_type
+
+def sample_data_file(file_path, data_type=None):
+    """
+    Describes a data file by its schema and first rows, reading a bounded part of it.
+
+    Args:
+        file_path (str): The path to the file.
+        data_type (str, optional): The format, see data_format. Defaults to the format of the file extension.
+
+    Returns:
+        str: The schema description.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        return sample_data(file, data_type or DATA_FORMATS[os.path.splitext(file_path)[1].lower()], size)
+
+def sample_data(file, data_type, size):
+    """
+    Describes data by its schema and first rows.
+
+    Text formats are described from their first SAMPLE_BYTES, Parquet files from the
+    metadata in their footer, so the cost does not depend on the size of the file.
+
+    Args:
+        file (file): The data, opened in binary mode. Parquet data must be seekable.
+        data_type (str): "csv", "tsv", "jsonl", "parquet" or "json".
+        size (int): The total size of the data in bytes.
+
+    Returns:
+        str: The format, size and (estimated) row count, the columns with their types, and the first rows.
+    """
+    if data_type == 'parquet':
+        return _describe_parquet(file, size)
+    head = file.read(SAMPLE_BYTES)
+    complete = len(head) >= size
+    text = head.decode('utf-8', errors='replace')
+    if not complete:
+        # The last line was cut by the sample
+        text = text[:text.rfind('\n') + 1] if '\n' in text else text
+    if data_type in ('csv', 'tsv'):
+        return _describe_delimited(text, data_type, size, complete)
+    if data_type == 'jsonl':
+        return _describe_jsonl(text, size, complete)
+    return _describe_json(text, size, complete)
+
+def _format_size(size):
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _row_count(lines, sample_bytes, size, complete):
+    if complete:
+        return f"{lines:,} rows"
+    if not lines:
+        return "unknown number of rows"
+    return f"about {round(size / (sample_bytes / lines)):,} rows (estimated from the first {_format_size(sample_bytes)})"
+
+def _clip(value):
+    value = str(value)
+    return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS - 3] + '...'
+
+def _infer_text_type(values):
+    # The most specific type matching every non-empty value
+    values = [value.strip() for value in values]
+    present = [value for value in values if value]
+    if not present:
+        return "empty"
+    for name, matches in (("integer", _INTEGER.match), ("float", _FLOAT.match), ("boolean", lambda value: value.lower() in _BOOLEAN),
+                          ("date", _DATE.match), ("datetime", _DATETIME.match)):
+        if all(matches(value) for value in present):
+            break
+    else:
+        name = "string"
+    return name + (", has empty values" if len(present) < len(values) else "")
+
+def _format_table(rows):
+    rows = [row[:MAX_TABLE_COLUMNS] for row in rows]
+    column_count = max(len(row) for row in rows)
+    rows = [[_clip(value) for value in row] + [''] * (column_count - len(row)) for row in rows]
+    widths = [max(len(row[i]) for row in rows) for i in range(column_count)]
+    return "\n".join("  " + " ".join(value.rjust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+def _describe_delimited(text, data_type, size, complete):
+    rows = [row for row in csv.reader(io.StringIO(text, newline=''), delimiter='\t' if data_type == 'tsv' else ',') if row]
+    if not rows:
+        return f"{data_type.upper()} data file, {_format_size(size)}, no rows in the first {_format_size(SAMPLE_BYTES)}"
+    header, records = rows[0], rows[1:]
+    lines = [f"{data_type.upper()} data file, {_format_size(size)}, {_row_count(len(records), len(text.encode('utf-8')), size, complete)}",
+             f"Columns ({len(header)}):"]
+    for index, name in enumerate(header[:MAX_COLUMNS]):
+        lines.append(f"  {name}: {_infer_text_type([row[index] if index < len(row) else '' for row in records])}")
+    if len(header) > MAX_COLUMNS:
+        lines.append(f"  ... and {len(header) - MAX_COLUMNS} more columns")
+    lines.append("First rows:")
+    lines.append(_format_table([header] + records[:SAMPLE_ROWS]))
+    return "\n".join(lines)
+
+def _json_type(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "null"
+
+def _describe_records(records):
+    # The union of the keys of the records in order of appearance, with every type seen for each key
+    types = {}
+    for record in records:
+        if not isinstance(record, dict):
+            types.setdefault("(value)", set()).add(_json_type(record))
+            continue
+        for key, value in record.items():
+            types.setdefault(key, set()).add(_json_type(value))
+    lines = [f"Fields ({len(types)}):"]
+    for key, seen in list(types.items())[:MAX_COLUMNS]:
+        lines.append(f"  {key}: {' | '.join(sorted(seen))}")
+    if len(types) > MAX_COLUMNS:
+        lines.append(f"  ... and {len(types) - MAX_COLUMNS} more fields")
+    lines.append("First records:")
+    lines.extend("  " + _clip_record(record) for record in records[:SAMPLE_ROWS])
+    return lines
+
+def _clip_record(record):
+    text = json.dumps(record, ensure_ascii=False)
+    return text if len(text) <= 4 * MAX_VALUE_CHARS else text[:4 * MAX_VALUE_CHARS - 3] + '...'
+
+def _describe_jsonl(text, size, complete):
+    records, invalid = [], 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            invalid += 1
+    lines = [f"JSON Lines data file, {_format_size(size)}, {_row_count(len(records) + invalid, len(text.encode('utf-8')), size, complete)}"]
+    if invalid:
+        lines.append(f"{invalid} of the sampled lines are not valid JSON")
+    if records:
+        lines.extend(_describe_records(records))
+    return "\n".join(lines)
+
+def _describe_json(text, size, complete):
+    header = f"JSON data file, {_format_size(size)}"
+    stripped = text.lstrip()
+    decoder = json.JSONDecoder()
+    if stripped.startswith('['):
+        # Decodes the records of a top-level array until the one cut by the sample
+        records, position = [], 1
+        while len(records) < 1000:
+            while position < len(stripped) and stripped[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(stripped) or stripped[position] == ']':
+                break
+            try:
+                record, position = decoder.raw_decode(stripped, position)
+            except ValueError:
+                break
+            records.append(record)
+        count = f"{len(records):,} records" if complete and len(records) < 1000 else f"an array, {len(records):,} records sampled"
+        return "\n".join([f"{header}, {count}"] + (_describe_records(records) if records else []))
+    if stripped.startswith('{'):
+        # Lists the top-level keys found in the sample with the type of their value
+        stream = JsonStream(io.StringIO(stripped))
+        lines = [f"{header}, an object"]
+        try:
+            for key in stream.items():
+                first = stream.peek()
+                kind = {'{': "object", '[': "array", '"': "string", 't': "boolean", 'f': "boolean", 'n': "null"}.get(first, "number")
+                lines.append(f"  {key}: {kind}")
+                stream.skip_value()
+        except ValueError:
+            lines.append(f"  ... (keys after the first {_format_size(SAMPLE_BYTES)} were not read)")
+        return "\n".join(lines)
+    return f"{header}, not an array or object:\n{stripped[:4 * MAX_VALUE_CHARS]}"
+
+# Parquet footer metadata is Thrift compact protocol, this reads the parts describing the schema
+_PHYSICAL_TYPES = ['boolean', 'int32', 'int64', 'int96', 'float', 'double', 'binary', 'fixed_len_byte_array']
+_CONVERTED_TYPES = {0: 'string', 1: 'map', 3: 'list', 4: 'enum', 5: 'decimal', 6: 'date', 7: 'time[ms]', 8: 'time[us]',
+                    9: 'timestamp[ms]', 10: 'timestamp[us]', 11: 'uint8', 12: 'uint16', 13: 'uint32', 14: 'uint64',
+                    15: 'int8', 16: 'int16', 17: 'int32', 18: 'int64', 19: 'json', 20: 'bson', 21: 'interval'}
+_LOGICAL_TYPES = {1: 'string', 2: 'map', 3: 'list', 4: 'enum', 5: 'decimal', 6: 'date', 7: 'time', 8: 'timestamp',
+                  10: 'integer', 11: 'null', 12: 'json', 13: 'bson', 14: 'uuid', 15: 'float16'}
+
+class _ThriftReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        result, shift = 0, 0
+        while True:
+            byte = self.byte()
+            result |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def integer(self):
+        value = self.varint()
+        return (value >> 1) ^ -(value & 1)
+
+    def binary(self):
+        length = self.varint()
+        value = self.data[self.pos:self.pos + length]
+        if len(value) < length:
+            raise IndexError("Truncated binary")
+        self.pos += length
+        return value
+
+    def fields(self):
+        # Yields (field id, type) for each field of a struct, the value must be read or skipped before the next one
+        field_id = 0
+        while True:
+            header = self.byte()
+            if header == 0:
+                return
+            delta, field_type = header >> 4, header & 0x0f
+            field_id = field_id + delta if delta else self.integer()
+            yield field_id, field_type
+
+    def list_header(self):
+        header = self.byte()
+        size = header >> 4
+        if size == 15:
+            size = self.varint()
+        return size, header & 0x0f
+
+    def value(self, field_type):
+        if field_type in (1, 2):
+            return field_type == 1
+        if field_type == 3:
+            return self.byte()
+        if field_type in (4, 5, 6):
+            return self.integer()
+        if field_type == 7:
+            self.pos += 8
+            return struct.unpack('<d', self.data[self.pos - 8:self.pos])[0]
+        if field_type == 8:
+            return self.binary()
+        if field_type in (9, 10):
+            size, element_type = self.list_header()
+            if element_type in (1, 2):
+                # Booleans in a collection take a byte each
+                return [self.byte() == 1 for _ in range(size)]
+            return [self.value(element_type) for _ in range(size)]
+        if field_type == 11:
+            size = self.varint()
+            types = self.byte() if size else 0
+            return {self.value(types >> 4): self.value(types & 0x0f) for _ in range(size)}
+        if field_type == 12:
+            return {field_id: self.value(field_type) for field_id, field_type in self.fields()}
+        raise ValueError(f"Unknown Thrift type {field_type}")
+
+def _parquet_type(element):
+    logical = element.get(10)
+    if logical:
+        (kind, details), = logical.items()
+        name = _LOGICAL_TYPES.get(kind, 'unknown')
+        if kind == 5:
+            return f"decimal({details.get(2)},{details.get(1)})"
+        if kind in (7, 8):
+            unit = details.get(2, {})
+            return f"{name}[{'ms' if 1 in unit else 'us' if 2 in unit else 'ns'}]"
+        if kind == 10:
+            return f"{'int' if details.get(2) else 'uint'}{details.get(1)}"
+        return name
+    if 6 in element:
+        name = _CONVERTED_TYPES.get(element[6], 'unknown')
+        return f"decimal({element.get(8)},{element.get(7)})" if name == 'decimal' else name
+    if 1 in element:
+        return _PHYSICAL_TYPES[element[1]] if element[1] < len(_PHYSICAL_TYPES) else 'unknown'
+    return 'group'
+
+def _describe_parquet(file, size):
+    header = f"Parquet data file, {_format_size(size)}"
+    if size < 12:
+        return f"{header}, too small to be a Parquet file"
+    file.seek(size - 8)
+    footer_length, magic = struct.unpack('<I4s', file.read(8))
+    if magic != b'PAR1' or footer_length > size - 12:
+        return f"{header}, without a valid Parquet footer"
+    # The schema and row count come first, an oversized footer is cut at its end
+    file.seek(size - 8 - footer_length)
+    reader = _ThriftReader(file.read(min(footer_length, MAX_FOOTER_BYTES)))
+
+    schema, rows, row_groups, created_by = [], None, None, None
+    try:
+        for field_id, field_type in reader.fields():
+            if field_id == 2:
+                schema = reader.value(field_type)
+            elif field_id == 3:
+                rows = reader.value(field_type)
+            elif field_id == 4:
+                row_groups, element_type = reader.list_header()
+                for _ in range(row_groups):
+                    reader.value(element_type)
+            elif field_id == 6:
+                created_by = reader.value(field_type).decode('utf-8', errors='replace')
+            else:
+                reader.value(field_type)
+    except (IndexError, struct.error):
+        # A footer above MAX_FOOTER_BYTES is cut, the schema and row count come before the row groups
+        pass
+    except ValueError:
+        # A type the reader does not know, or a corrupt footer: keep what was read before it
+        pass
+
+    summary = header
+    if rows is not None:
+        summary += f", {rows:,} rows" + (f" in {row_groups:,} row group{'s' if row_groups != 1 else ''}" if row_groups is not None else "")
+    if created_by:
+        summary += f", written by {created_by}"
+    lines = [summary, f"Columns ({schema[0].get(5, 0) if schema else 0}):"]
+
+    # The schema is a depth-first flattening of the column tree, below a root element
+    remaining = [schema[0].get(5, 0)] if schema else []
+    for index, element in enumerate(schema[1:]):
+        if index == MAX_COLUMNS:
+            lines.append(f"  ... and {len(schema) - 1 - MAX_COLUMNS} more schema elements")
+            break
+        while remaining and remaining[-1] == 0:
+            remaining.pop()
+        depth = len(remaining)
+        if remaining:
+            remaining[-1] -= 1
+        name = element.get(4, b'').decode('utf-8', errors='replace')
+        nullable = ", nullable" if element.get(3) == 1 else ", repeated" if element.get(3) == 2 else ""
+        lines.append(f"{'  ' * depth}{name}: {_parquet_type(element)}{nullable}")
+        if element.get(5):
+            remaining.append(element[5])
+    lines.append("Rows are not sampled from Parquet files, only the footer metadata is read.")
+    return "\n".join(lines)
@@ -0,0 +1,130 @@
+import hashlib
+import re
+import threading
+import zlib
+
+SHINGLE_TOKENS = 5
+SKETCH_BINS = 64
+BANDS = 16
+# Files with fewer shingles are only matched exactly, their sketches are too coarse to compare
+MIN_SHINGLES = 20
+EMPTY_BIN = 1 << 32
+
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+
+def fingerprint(text, sketch=True):
+    """
+    Computes the exact digest and the similarity sketch of a text.
+
+    The sketch is a one-permutation MinHash over shingles of SHINGLE_TOKENS consecutive
+    tokens: every shingle hash falls into one of SKETCH_BINS bins by its low bits, and each
+    bin keeps its smallest hash. Two sketches agree in about as many bins as the Jaccard
+    similarity of the two shingle sets, and computing one is a single pass over the text.
+
+    Args:
+        text (str): The text, as it would be sent to the model.
+        sketch (bool, optional): Compute the sketch, which only near-duplicate matching needs. Defaults to True.
+
+    Returns:
+        tuple: The SHA-256 hex digest and the sketch, a tuple of SKETCH_BINS values, or None
+               for texts with fewer than MIN_SHINGLES shingles or without sketch.
+    """
+    digest = hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+    if not sketch:
+        return digest, None
+    tokens = _TOKEN.findall(text)
+    if len(tokens) - SHINGLE_TOKENS + 1 < MIN_SHINGLES:
+        return digest, None
+    bins = [EMPTY_BIN] * SKETCH_BINS
+    for index in range(len(tokens) - SHINGLE_TOKENS + 1):
+        value = zlib.crc32(' '.join(tokens[index:index + SHINGLE_TOKENS]).encode('utf-8', errors='surrogatepass'))
+        slot = value % SKETCH_BINS
+        if value < bins[slot]:
+            bins[slot] = value
+    return digest, tuple(bins)
+
+def similarity(sketch, other):
+    """
+    Estimates the Jaccard similarity of the shingles of two texts from their sketches.
+
+    Args:
+        sketch (tuple): A sketch from fingerprint.
+        other (tuple): Another sketch.
+
+    Returns:
+        float: The fraction of bins, among those filled in either sketch, holding the same value.
+    """
+    filled = same = 0
+    for value, other_value in zip(sketch, other):
+        if value != EMPTY_BIN or other_value != EMPTY_BIN:
+            filled += 1
+            same += value == other_value
+    return same / filled if filled else 0.0
+
+class DuplicateIndex:
+    """
+    Assigns files to the first earlier file they duplicate, exactly or approximately.
+
+    Exact duplicates are found by digest. Near-duplicate candidates are found with
+    locality-sensitive hashing: the sketch is split into BANDS bands, and files sharing all
+    the values of any band land in the same bucket. Candidates are then compared on the
+    whole sketch. Only representatives are indexed, so every group has a single
+    representative whose summary the others reuse.
+
+    Attributes:
+        threshold (float): The estimated similarity from which files are near-duplicates, or None to match identical files only.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self._digests = {}
+        self._sketches = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, digest, sketch):
+        """
+        Matches a file against the files added before it, indexing it if it is new.
+
+        Args:
+            key (str): The file path.
+            digest (str): The digest from fingerprint.
+            sketch (tuple): The sketch from fingerprint, or None.
+
+        Returns:
+            tuple: The representative, "exact" or "near" and the similarity, or None if the file is new.
+        """
+        with self._lock:
+            if digest in self._digests:
+                return self._digests[digest]
+            match = None
+            if sketch is not None and self.threshold is not None:
+                rows = SKETCH_BINS // BANDS
+                bands = [(band, sketch[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+                candidates = {candidate for band in bands for candidate in self._buckets.get(band, ())}
+                best = max(((similarity(sketch, self._sketches[candidate]), candidate) for candidate in candidates), default=None)
+                if best and best[0] >= self.threshold:
+                    match = (best[1], 'near', best[0])
+                else:
+                    self._sketches[key] = sketch
+                    for band in bands:
+                        self._buckets.setdefault(band, []).append(key)
+            # Later exact copies of a near-duplicate share its representative
+            self._digests[digest] = match or (key, 'exact', 1.0)
+            return match
+
+    def match(self, key, text):
+        """
+        Fingerprints the contents of a file as they are read and matches them, see add.
+
+        Files are matched in the order they are read, from several threads, so the first
+        copy read becomes the representative of its group.
+
+        Args:
+            key (str): The file path.
+            text (str): The contents, as they would be sent to the model.
+
+        Returns:
+            tuple: The representative, "exact" or "near" and the similarity, or None if the file is new.
+        """
+        return self.add(key, *fingerprint(text, self.threshold is not None))
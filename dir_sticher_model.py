@@ -1,9 +1,4 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-api_key = os.environ['GOOGLE_API_KEY']
+from model_client import get_client
 
 
 sys_prpt = """
@@ -20,8 +15,8 @@ Ensure the description is precise, detailed, and grounded in the code. Maintain
 """
 
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash',system_instruction=sys_prpt)
+model_name = 'gemini-1.5-flash'
+get_client().register('dir', model_name, sys_prpt)
 
 def get_dir_response(prompt):
     """
@@ -34,5 +29,4 @@ def get_dir_response(prompt):
     str: The generated summary of the codebase directory.
 
     """
-    response = model.generate_content(prompt)
-    return response.text
\ No newline at end of file
+    return get_client().summarize_dir(prompt)
\ No newline at end of file
@@ -0,0 +1,383 @@
+import contextlib
+import io
+import os
+import subprocess
+import threading
+from profiler import profile_span, record
+from notebook import extract_notebook_cells
+from data_sampler import MAX_FOOTER_BYTES, SAMPLE_BYTES, data_format, sample_data
+from utils import decode_file_bytes, DEFAULT_MAX_BYTES
+
+class MissingBlobError(Exception):
+    """
+    Raised when a file's contents were not downloaded by a blob-filtered clone.
+    """
+
+class _BlobReader(io.RawIOBase):
+    # Reads one object from the cat-file stream without going past its end
+    def __init__(self, stream, size):
+        super().__init__()
+        self.stream = stream
+        self.size = size
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.stream.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def skip(self, count):
+        count = min(count, self.remaining)
+        while count > 0:
+            data = self.stream.read(min(count, 1 << 20))
+            if not data:
+                break
+            count -= len(data)
+            self.remaining -= len(data)
+
+class _TailFile:
+    # A seekable view of a blob that holds its tail, reads before the tail stream the blob again
+    def __init__(self, store, path, size, tail_bytes):
+        self.store = store
+        self.path = path
+        self.start = max(0, size - tail_bytes)
+        self.tail = store.read_range(path, self.start, size - self.start)
+        self.pos = 0
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def read(self, count):
+        if self.pos >= self.start:
+            data = self.tail[self.pos - self.start:self.pos - self.start + count]
+        else:
+            data = self.store.read_range(self.path, self.pos, count)
+        self.pos += len(data)
+        return data
+
+def git_output(repo_dir, *args):
+    """
+    Runs a Git command in a repository and returns its output.
+
+    Args:
+        repo_dir (str): The repository, bare or with a working tree.
+        *args: The arguments of the Git command.
+
+    Returns:
+        bytes: The standard output of the command.
+    """
+    return subprocess.run(["git", "-C", repo_dir] + list(args), check=True, capture_output=True).stdout
+
+def is_bare_repository(repo_dir):
+    """
+    Checks whether a directory is a bare Git repository.
+
+    Args:
+        repo_dir (str): The directory to check.
+
+    Returns:
+        bool: True for a bare repository, False for a working tree or a directory that is not a repository.
+    """
+    try:
+        return git_output(repo_dir, "rev-parse", "--is-bare-repository").strip() == b"true"
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+class GitObjectStore:
+    """
+    Reads the files of a commit straight from the Git object database, without a checkout.
+
+    The tree is listed once with "git ls-tree". File contents are streamed through a single
+    long-running "git cat-file --batch" process, so reading thousands of files costs no
+    process start-up per file. Blobs left out by a blob-filtered partial clone are reported
+    as missing instead of being fetched one by one.
+
+    Files are addressed by virtual paths below root_dir, so the rest of the pipeline can key
+    them like files on disk.
+
+    Attributes:
+        root_dir (str): The repository directory, the virtual root of the file paths.
+        commit (str): The commit the files are read from.
+        blobs (dict): (object id, size) pairs keyed by repository-relative path. The size is None for missing blobs.
+    """
+
+    def __init__(self, repo_dir, treeish='HEAD'):
+        """
+        Initializes a new GitObjectStore instance, listing the tree of a commit.
+
+        Args:
+            repo_dir (str): The repository, bare or with a working tree.
+            treeish (str, optional): The commit to read. Defaults to 'HEAD'.
+        """
+        self.root_dir = os.path.abspath(repo_dir)
+        self.commit = git_output(self.root_dir, "rev-parse", "--verify", f"{treeish}^{{commit}}").decode().strip()
+        self.blobs = {}
+        self._children = {}
+        self._process = None
+        self._lock = threading.Lock()
+
+        # Regular files only: symbolic links and submodules have no contents to describe
+        listing = git_output(self.root_dir, "ls-tree", "-r", "-z", "--full-tree", self.commit)
+        oids = {}
+        for record_bytes in listing.split(b'\0'):
+            if not record_bytes:
+                continue
+            meta, _, path = record_bytes.partition(b'\t')
+            mode, kind, oid = meta.split()
+            if kind != b'blob' or mode == b'120000':
+                continue
+            oids[path.decode('utf-8', errors='surrogateescape')] = oid.decode()
+
+        # Sizes come from --batch-check, which does not fetch blobs missing from a partial clone
+        missing = self._missing_blobs() if self._is_partial() else set()
+        present = [oid for oid in oids.values() if oid not in missing]
+        sizes = {}
+        if present:
+            output = subprocess.run(["git", "-C", self.root_dir, "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+                                    input="\n".join(present).encode() + b"\n", check=True, capture_output=True).stdout
+            for line in output.decode().splitlines():
+                oid, _, size = line.partition(' ')
+                if size.isdigit():
+                    sizes[oid] = int(size)
+        for rel_path, oid in oids.items():
+            self.blobs[rel_path] = (oid, sizes.get(oid))
+            self._add_to_tree(rel_path)
+
+    def _is_partial(self):
+        # Older Git marks partial clones with extensions.partialClone, newer with a promisor remote
+        try:
+            return bool(git_output(self.root_dir, "config", "--get-regexp", r"^(extensions\.partialclone|remote\..*\.promisor)$").strip())
+        except subprocess.CalledProcessError:
+            return False
+
+    def _missing_blobs(self):
+        output = git_output(self.root_dir, "rev-list", "--objects", "--no-walk", "--missing=print", self.commit)
+        return {line[1:].strip() for line in output.decode().splitlines() if line.startswith('?')}
+
+    def _add_to_tree(self, rel_path):
+        parts = rel_path.split('/')
+        for depth in range(len(parts)):
+            self._children.setdefault('/'.join(parts[:depth]), set()).add((parts[depth], depth < len(parts) - 1))
+
+    def path(self, rel_path):
+        """
+        Returns the virtual path of a file.
+
+        Args:
+            rel_path (str): The repository-relative path, with forward slashes.
+
+        Returns:
+            str: The path below root_dir.
+        """
+        return os.path.join(self.root_dir, *rel_path.split('/')) if rel_path else self.root_dir
+
+    def relative(self, path):
+        """
+        Returns the repository-relative path of a virtual path.
+
+        Args:
+            path (str): A path below root_dir.
+
+        Returns:
+            str: The relative path with forward slashes, "" for the root.
+        """
+        rel_path = os.path.relpath(path, self.root_dir).replace(os.sep, '/')
+        return '' if rel_path == '.' else rel_path
+
+    def list_dir(self, dirpath):
+        """
+        Lists a directory of the tree, for PathFilter.walk.
+
+        Args:
+            dirpath (str): The virtual path of the directory.
+
+        Returns:
+            list: (name, is_dir) pairs.
+        """
+        return list(self._children.get(self.relative(dirpath), ()))
+
+    def walk(self, path_filter):
+        """
+        Walks the tree like PathFilter.walk walks a directory, applying the same ignore rules.
+
+        Args:
+            path_filter (PathFilter): The filter, created with read_file=self.read_text.
+
+        Yields:
+            tuple: (dirpath, dirnames, filenames) for every visited directory.
+        """
+        return path_filter.walk(self.root_dir, list_dir=self.list_dir)
+
+    def size(self, path):
+        """
+        Returns the size of a file in bytes, 0 if it was not downloaded.
+
+        Args:
+            path (str): The virtual path of the file.
+
+        Returns:
+            int: The size.
+        """
+        blob = self.blobs.get(self.relative(path))
+        return (blob[1] or 0) if blob else 0
+
+    @contextlib.contextmanager
+    def open_blob(self, path):
+        """
+        Streams the contents of a file from the cat-file process.
+
+        The store is locked while the blob is open, and whatever was not read is skipped when
+        it is closed, so a large blob is never held in memory.
+
+        Args:
+            path (str): The virtual path of the file.
+
+        Yields:
+            io.RawIOBase: The contents, with the blob size in its size attribute.
+
+        Raises:
+            FileNotFoundError: If the file is not part of the tree.
+            MissingBlobError: If the contents were not downloaded.
+        """
+        rel_path = self.relative(path)
+        if rel_path not in self.blobs:
+            raise FileNotFoundError(f"{rel_path} is not in {self.commit[:12]}")
+        oid, size = self.blobs[rel_path]
+        if size is None:
+            raise MissingBlobError(f"{rel_path} was larger than the blob size limit of the clone and was not downloaded")
+        with self._lock:
+            if self._process is None:
+                self._process = subprocess.Popen(["git", "-C", self.root_dir, "cat-file", "--batch"],
+                                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self._process.stdin.write(oid.encode() + b"\n")
+            self._process.stdin.flush()
+            header = self._process.stdout.readline().split()
+            if len(header) != 3:
+                raise MissingBlobError(f"{rel_path}: {b' '.join(header).decode(errors='replace')}")
+            blob = _BlobReader(self._process.stdout, int(header[2]))
+            try:
+                yield blob
+            finally:
+                # The rest of the object and its newline have to be consumed to keep the stream in sync
+                blob.skip(blob.remaining)
+                self._process.stdout.read(1)
+
+    def read_bytes(self, path, max_bytes=None):
+        """
+        Reads the contents of a file from the cat-file stream.
+
+        Args:
+            path (str): The virtual path of the file.
+            max_bytes (int, optional): The maximum number of bytes returned. Defaults to None (no limit).
+
+        Returns:
+            tuple: The contents and whether they were truncated.
+
+        Raises:
+            FileNotFoundError: If the file is not part of the tree.
+            MissingBlobError: If the contents were not downloaded.
+        """
+        with self.open_blob(path) as blob:
+            data = blob.read(-1 if max_bytes is None else max_bytes)
+        return data, len(data) < blob.size
+
+    def read_range(self, path, offset, length):
+        """
+        Reads a part of a file, streaming past the bytes before it.
+
+        Args:
+            path (str): The virtual path of the file.
+            offset (int): The position of the first byte.
+            length (int): The maximum number of bytes returned.
+
+        Returns:
+            bytes: The contents, shorter than length at the end of the file.
+        """
+        with self.open_blob(path) as blob:
+            blob.skip(offset)
+            return blob.read(length)
+
+    def read_text(self, rel_path):
+        """
+        Reads a small text file of the tree, e.g. a .gitignore or the README.
+
+        Args:
+            rel_path (str): The repository-relative path.
+
+        Returns:
+            str: The decoded contents, or None if the file does not exist or could not be read.
+        """
+        if rel_path not in self.blobs:
+            return None
+        try:
+            data, _ = self.read_bytes(self.path(rel_path))
+        except (MissingBlobError, OSError):
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    def load(self, file_path, max_bytes=DEFAULT_MAX_BYTES, include_markdown=False):
+        """
+        Loads the contents of a file in the form that is sent to the model, like pipeline.load_file_contents.
+
+        Args:
+            file_path (str): The virtual path of the file.
+            max_bytes (int, optional): The maximum number of bytes read from a text file, or characters extracted from a notebook. Defaults to DEFAULT_MAX_BYTES.
+            include_markdown (bool, optional): Include the markdown cells of notebooks. Defaults to False.
+
+        Returns:
+            str: The code cells for notebooks, the schema and first rows for data files and the decoded text for everything else.
+
+        Raises:
+            MissingBlobError: If the contents were not downloaded.
+        """
+        with profile_span('git cat-file', 'io', metric='read_time', path=file_path):
+            size = self.size(file_path)
+            data_type = data_format(file_path, size)
+            if data_type == 'parquet':
+                # The footer is at the end of the blob, which cat-file can only stream from the start: only the tail is kept
+                tail = _TailFile(self, file_path, size, 8 + MAX_FOOTER_BYTES)
+                record(bytes_read=len(tail.tail))
+                return sample_data(tail, data_type, size)
+            if data_type:
+                data, _ = self.read_bytes(file_path, SAMPLE_BYTES)
+                record(bytes_read=len(data))
+                return sample_data(io.BytesIO(data), data_type, size)
+            if file_path.endswith('.ipynb'):
+                # Cells are parsed from the stream, outputs are skipped without being held in memory
+                with self.open_blob(file_path) as blob:
+                    try:
+                        return extract_notebook_cells(io.TextIOWrapper(io.BufferedReader(blob), encoding='utf-8'), max_bytes, include_markdown)
+                    except Exception as e:
+                        print(f"Error processing Jupyter notebook {file_path}: {e}")
+                        return None
+                    finally:
+                        record(bytes_read=blob.size - blob.remaining)
+            data, truncated = self.read_bytes(file_path, max_bytes)
+            record(bytes_read=len(data))
+        return decode_file_bytes(data, truncated, file_path)
+
+    def close(self):
+        """
+        Stops the cat-file process.
+        """
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                self._process.wait()
+                self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
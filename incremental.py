@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+
+STATE_FILE = '.readme-maker-state.json'
+
+def load_state(state_path):
+    """
+    Loads the state of the last processed run.
+
+    Args:
+        state_path (str): The path to the state file.
+
+    Returns:
+        dict: The state with the keys "commit", "files", "dirs" and "dir_inputs", or None if
+              there is no usable state file.
+    """
+    try:
+        with open(state_path, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        print("No incremental state found, summarizing the whole repository.")
+        return None
+    except Exception as e:
+        print(f"Error reading incremental state {state_path}: {e}")
+        return None
+    if not all(key in state for key in ('commit', 'files', 'dirs')):
+        print(f"Ignoring malformed incremental state {state_path}.")
+        return None
+    state.setdefault('dir_inputs', {})
+    return state
+
+def save_state(state_path, commit, files, dirs, dir_inputs=None):
+    """
+    Saves the state of the current run so the next run can reuse its summaries.
+
+    Args:
+        state_path (str): The path to the state file.
+        commit (str): The commit the summaries correspond to.
+        files (dict): File summaries keyed by repository-relative path.
+        dirs (dict): Directory summaries keyed by repository-relative path.
+        dir_inputs (dict, optional): Digests of the inputs of each directory summary, keyed by
+            repository-relative path. Defaults to None.
+    """
+    tmp_path = state_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'commit': commit, 'files': files, 'dirs': dirs, 'dir_inputs': dir_inputs or {}}, file, indent=1)
+        os.replace(tmp_path, state_path)
+    except Exception as e:
+        print(f"Error writing incremental state {state_path}: {e}")
+
+def get_head_commit(repo_dir):
+    """
+    Returns the commit currently checked out in a repository.
+
+    Args:
+        repo_dir (str): The directory of the repository.
+
+    Returns:
+        str: The full hash of HEAD, or None if the directory is not a Git repository.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, check=True, capture_output=True, text=True)
+        return result.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+def get_changed_files(repo_dir, since_commit, until_commit=None):
+    """
+    Lists the files changed between a commit and the working tree using git diff --name-status.
+
+    Paths are relative to repo_dir, which may be a subdirectory of the repository, and files
+    outside of it are left out. When diffing against the working tree, untracked files that
+    are not ignored count as changed.
+
+    Args:
+        repo_dir (str): The directory of the repository.
+        since_commit (str): The last processed commit.
+        until_commit (str, optional): Diff against this commit instead of the working tree,
+            e.g. for a bare repository. Defaults to None.
+
+    Returns:
+        tuple: A (changed, deleted) pair of sets of repository-relative paths, where changed
+               holds added, modified and renamed-to paths and deleted holds removed and
+               renamed-from paths. Returns None if the diff could not be computed.
+    """
+    try:
+        target = [until_commit] if until_commit else []
+        result = subprocess.run(["git", "-C", repo_dir, "diff", "--name-status", "--relative", "-M", "-z", since_commit] + target + ["--"],
+                                check=True, capture_output=True, text=True)
+        # Untracked files are not in the diff, ls-files also lists them relative to repo_dir
+        untracked = "" if until_commit else subprocess.run(["git", "-C", repo_dir, "ls-files", "-o", "--exclude-standard", "-z"],
+                                                           check=True, capture_output=True, text=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Could not diff against {since_commit}: {e}")
+        return None
+
+    changed, deleted = set(), set()
+    fields = result.stdout.split('\0')
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i]
+        if status[0] in 'RC':
+            old_path, new_path = fields[i + 1], fields[i + 2]
+            if status[0] == 'R':
+                deleted.add(old_path)
+            changed.add(new_path)
+            i += 3
+        else:
+            path = fields[i + 1]
+            if status[0] == 'D':
+                deleted.add(path)
+            else:
+                changed.add(path)
+            i += 2
+    changed.update(path for path in untracked.split('\0') if path)
+    return changed, deleted
+
+def relative_path(repo_dir, path):
+    """
+    Converts a path to the repository-relative, forward-slash form used by Git and the state file.
+
+    Args:
+        repo_dir (str): The directory of the repository.
+        path (str): The path to convert.
+
+    Returns:
+        str: The relative path, "." for the repository root.
+    """
+    return os.path.relpath(path, repo_dir).replace(os.sep, '/')
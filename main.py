@@ -1,30 +1,471 @@
 import argparse
 import os
+import subprocess
+import sys
+import threading
 import time
-import pandas as pd
 from tqdm import tqdm
-import sys
 from spinner import Spinner
-from redme_model import get_final_response, update_with_feedback
-from code_reader_model import get_code_response
-from dir_sticher_model import get_dir_response
-from utils import read_csv_file, read_existing_readme, get_repo_path, extract_code_cells_from_notebook, read_file_with_fallback
+from redme_model import get_final_response, update_with_feedback, get_readme_generator
+from pipeline import FileSummarizer, DirectorySummarizer, is_error_response
+from rate_limiter import RateLimiter
+from scheduler import DagScheduler
+from git_source import GitObjectStore, is_bare_repository
+from cache import SummaryCache
+from dedup import DuplicateIndex
+from planner import content_tokens, file_cost, plan_repository, print_plan
+from path_filter import PathFilter
+from incremental import STATE_FILE, load_state, save_state, get_head_commit, get_changed_files, relative_path
+from backends import create_backend, get_backend, set_backend
+from model_client import get_client
+from resilience import ResilientBackend
+from profiler import Profiler, set_profiler, profile_span, record
+from utils import read_csv_file, read_existing_readme, get_repo_path, DEFAULT_MAX_BYTES
 
-def main():   
+def build_parser():
+    """
+    Builds the command-line parser of the README generator.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
     parser = argparse.ArgumentParser(description="Generate README for a Git repository or local directory.")
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--git", help="Git repository URL")
     group.add_argument("--local", help="Path to local directory")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--plan", action="store_true",
+                        help="Print the estimated requests, tokens and time of the run and the files ranked by importance, without calling the model")
+    parser.add_argument("--feedback-mode", choices=("sections", "full"), default="sections",
+                        help="Regenerate only the README sections a feedback applies to, or the whole README")
+    parser.add_argument("--profile", nargs="?", const="readme-maker-profile", metavar="PREFIX",
+                        help="Record per-stage timings and token counts, written to PREFIX.json and a Chrome trace PREFIX.trace.json")
+    return parser
+
+def add_pipeline_arguments(parser):
+    """
+    Adds the options of the summarization pipeline, shared by the interactive and the batch entry points.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser to extend.
+    """
     parser.add_argument("--root", help="Root directory for cloning Git repositories")
+    parser.add_argument("--ingest", choices=("checkout", "objects"), default="checkout",
+                        help="Read files from a checkout, or straight from the Git object database of a bare, blob-filtered clone")
+    parser.add_argument("--blob-limit", type=int, default=None,
+                        help="With --ingest objects, do not download files larger than this many bytes (default: download every file, so that large data files can be sampled)")
+    parser.add_argument("--no-gitignore", action="store_true", help="Do not skip the files matched by the repository's .gitignore files")
+    parser.add_argument("--backend", default=os.environ.get("README_MAKER_BACKEND", "gemini"), help="Model backend, 'gemini' or 'fake[:key=value,...]' for offline runs")
+    parser.add_argument("--workers", type=int, default=8, help="Maximum number of concurrent model requests")
+    parser.add_argument("--io-workers", type=int, default=4, help="Number of threads reading files while model requests are in flight")
+    parser.add_argument("--request-timeout", type=float, help="Seconds to wait for the answer to a model call, including its retries, before giving up on it (streamed READMEs are not limited)")
+    parser.add_argument("--model-config", help="JSON file overriding the model and system prompt of the 'file', 'dir', 'readme' and 'readme_router' roles")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries of a failed model call, with exponential backoff")
+    parser.add_argument("--hedge-percentile", type=float, help="Send a second copy of a request slower than this latency percentile, e.g. 95")
+    parser.add_argument("--rpm", type=int, help="Maximum model requests per minute")
+    parser.add_argument("--tpm", type=int, help="Maximum prompt tokens per minute")
+    parser.add_argument("--cache-dir", default=os.path.join("~", ".cache", "readme-maker"), help="Directory of the file and directory summary cache")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the summary cache")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="Maximum size of the summary cache in MB")
+    parser.add_argument("--cache-max-age-days", type=float, default=30, help="Maximum age of summary cache entries in days")
+    parser.add_argument("--chunk-tokens", type=int, default=8000, help="Token budget of a single file request, larger files are summarized in chunks")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="Tokens repeated between consecutive chunks of a large file")
+    parser.add_argument("--batch-tokens", type=int, default=0, help="Pack small files into shared requests of this many tokens (0 disables batching)")
+    parser.add_argument("--batch-max-files", type=int, default=20, help="Maximum number of files in one batched request")
+    parser.add_argument("--dir-token-budget", type=int, default=8000, help="Token budget of a single directory request, larger directories are summarized in groups")
+    parser.add_argument("--max-file-bytes", type=int, default=DEFAULT_MAX_BYTES, help="Maximum number of bytes read from a single file, or characters of code extracted from a notebook")
+    parser.add_argument("--no-dedup", action="store_true", help="Summarize identical files separately instead of reusing one summary")
+    parser.add_argument("--dedup-threshold", type=float, default=None, help="Also reuse one summary for near-identical files from this estimated similarity, between 0 and 1, e.g. 0.8 (default: identical files only)")
+    parser.add_argument("--skeleton-ratio", type=float, default=0.5,
+                        help="Send the outline of a source file (imports, signatures, docstrings, control flow) instead of its text when it is at most this fraction of the text, 0 to always send the text")
+    parser.add_argument("--notebook-markdown", action="store_true", help="Send the markdown cells of notebooks along with their code cells")
+    parser.add_argument("--budget", type=int, help="Prompt token budget of the run: the most important files that fit are summarized, the others are listed by name only")
+    parser.add_argument("--incremental", action="store_true", help="Only re-summarize files changed since the last processed commit")
+    parser.add_argument("--state-file", default=STATE_FILE, help="Incremental state file, relative to the repository root")
+
+def configure_backend(backend, args):
+    """
+    Makes a backend the active backend, behind the retry, adaptive concurrency and hedging layer,
+    and configures the model client sending every call to it.
+
+    Args:
+        backend (ModelBackend): The backend to use.
+        args (argparse.Namespace): The parsed command-line arguments.
+    """
+    set_backend(ResilientBackend(backend, args.workers, args.max_retries, hedge_percentile=args.hedge_percentile))
+    client = get_client()
+    client.max_workers = args.workers
+    client.timeout = args.request_timeout
+    if args.model_config:
+        try:
+            client.configure_from_file(args.model_config)
+        except (OSError, ValueError) as e:
+            print(f"Error reading model configuration {args.model_config}: {e}")
+            sys.exit(1)
+
+def load_ignore_lists(args):
+    """
+    Reads the directories, files and extensions to skip from the CSV files next to this script.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        tuple: The lists of ignored directory names, file names and file name suffixes.
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    ignored_dir = read_csv_file(os.path.join(project_dir, 'ignored_dir.csv'))
+    ignored_exts = read_csv_file(os.path.join(project_dir, 'ignored_exts.csv'))
+    ignored_files = read_csv_file(os.path.join(project_dir, 'ignored_files.csv'))
+    ignored_files.append('LICENSE')
+    ignored_files.append(os.path.basename(args.state_file))
+    return ignored_dir, ignored_files, ignored_exts
+
+def build_readme_prompt(description, existing_readme, structure):
+    """
+    Builds the prompt of the initial README.
+
+    Args:
+        description (str): The description of the codebase given by the user, may be empty.
+        existing_readme (str): The current README of the repository, may be empty.
+        structure (str): The summary of the repository root.
+
+    Returns:
+        str: The prompt.
+    """
+    return f"Generate a README for a GitHub repository with the following description and structure:\n\nDescription: {description}\n\nExisting README: {existing_readme}\n\nStructure: {structure}"
+
+def stream_to_file(file):
+    """
+    Returns a callback writing each piece of a streamed README to a file as it arrives.
+
+    Args:
+        file (file): The file, opened for writing text.
+
+    Returns:
+        callable: The callback.
+    """
+    def on_text(text):
+        file.write(text)
+        file.flush()
+    return on_text
+
+def walk_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts, source=None):
+    """
+    Walks a repository with the ignore rules, gathering the files and child directories of every directory.
+
+    Args:
+        repo_dir (str): The absolute path to the repository.
+        args (argparse.Namespace): The parsed command-line arguments.
+        ignored_dir (list): Directory names to skip.
+        ignored_files (list): File names to skip.
+        ignored_exts (list): File name suffixes to skip.
+        source (GitObjectStore, optional): Walks the tree of a commit instead of the working tree. Defaults to None.
+
+    Returns:
+        tuple: The file names and the child directory paths of every directory, keyed by directory path in walk order.
+    """
+    path_filter = PathFilter(repo_dir, ignored_dir, ignored_files, ignored_exts, use_gitignore=not args.no_gitignore,
+                             read_file=source.read_text if source else None)
+    try:
+        dir_files, dir_children = {}, {}
+        with profile_span('walk', 'walk', path=repo_dir):
+            for root, dirs, files in (source.walk(path_filter) if source else path_filter.walk()): # Walking through the repository to gather the files of each directory
+                dir_files[root] = files
+                dir_children[root] = [os.path.join(root, d) for d in dirs]
+    except Exception as e:
+        print(f"An error occurred while walking through the directory: {e}")
+        sys.exit(1)
+    return dir_files, dir_children
+
+def summarize_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts, readme_fn=None, limiter=None, source=None, cache=None):
+    """
+    Runs the file, directory and README stages on a repository as one task graph.
+
+    Every file read, file summary, directory summary and the final README is a task that
+    starts as soon as the tasks it depends on are done: a directory is summarized once its
+    own files and child directories are, while other files are still being read or
+    described. Reads run on their own threads so that disk I/O overlaps with model calls.
+
+    Args:
+        repo_dir (str): The absolute path to the repository.
+        args (argparse.Namespace): The parsed command-line arguments.
+        ignored_dir (list): Directory names to skip.
+        ignored_files (list): File names to skip.
+        ignored_exts (list): File name suffixes to skip.
+        readme_fn (callable, optional): Called with the root summary as the last task of the graph. Defaults to None.
+        limiter (RateLimiter, optional): A rate limiter shared with other runs. Defaults to a new one from --rpm and --tpm.
+        source (GitObjectStore, optional): Reads the tree and the files of a commit instead of the working tree. Defaults to None.
+        cache (SummaryCache, optional): A summary cache shared with other runs. Defaults to a new one from --cache-dir, or none with --no-cache.
+
+    Returns:
+        tuple: Directory summaries keyed by absolute directory path in walk order, where the summary
+               of repo_dir covers the whole repository, and the result of readme_fn (None without
+               readme_fn or if it failed).
+    """
+    limiter = limiter or RateLimiter(args.rpm, args.tpm)
+    if cache is None and not args.no_cache:
+        cache = SummaryCache(args.cache_dir, args.cache_max_mb * 1024 * 1024, args.cache_max_age_days * 86400)
+    # Only the first file read of every group of identical or near-identical files is described
+    duplicate_index = None if args.no_dedup else DuplicateIndex(args.dedup_threshold)
+    summarizer = FileSummarizer(args.workers, limiter, cache, args.chunk_tokens, args.chunk_overlap, args.max_file_bytes,
+                                args.batch_tokens, args.batch_max_files, source, args.notebook_markdown, args.skeleton_ratio,
+                                duplicate_index)
+    duplicates = summarizer.duplicates
+    dir_summarizer = DirectorySummarizer(args.workers, limiter, cache, args.dir_token_budget)
+
+    dir_files, dir_children = walk_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts, source)
+
+    # Loading the summaries of the last processed commit and the files changed since then
+    state_path = os.path.join(repo_dir, args.state_file)
+    state = load_state(state_path) if args.incremental else None
+    changed_files = set()
+    if state:
+        diff = get_changed_files(repo_dir, state['commit'], source.commit if source else None)
+        if diff is None:
+            state = None
+        else:
+            changed_files, deleted_files = diff
+            print(f"Incremental run: {len(changed_files)} changed and {len(deleted_files)} deleted files since {state['commit'][:12]}")
+    previous_files = state['files'] if state else {}
+    previous_dirs = {}
+    if state:
+        for rel_dir, digest in state['dir_inputs'].items():
+            if rel_dir in state['dirs']:
+                previous_dirs[os.path.normpath(os.path.join(repo_dir, rel_dir))] = (digest, state['dirs'][rel_dir])
+
+    # Reusing stored summaries of unchanged files, the other files are read and described by the graph
+    file_paths = [os.path.join(root, file_name) for root, file_names in dir_files.items() for file_name in file_names]
+    file_responses = {}
+    stale_paths = []
+    for file_path in file_paths:
+        rel_path = relative_path(repo_dir, file_path)
+        if rel_path in previous_files and rel_path not in changed_files:
+            file_responses[file_path] = previous_files[rel_path]
+            record(file_path, kind='file', reused=True)
+        else:
+            stale_paths.append(file_path)
+    if state:
+        print(f"Reusing {len(file_paths) - len(stale_paths)} stored file summaries, summarizing {len(stale_paths)} files")
+
+    # Within a budget, the most important files are described and the others only named in their directory
+    skimmed = set()
+    if args.budget is not None:
+        with profile_span('plan', 'plan', files=len(stale_paths)):
+            plan = plan_repository(repo_dir, dir_files, dir_children, stale_paths, args, source, args.budget)
+        skimmed = {entry['path'] for entry in plan['files'] if not entry['selected']}
+        stale_paths = [file_path for file_path in stale_paths if file_path not in skimmed]
+        print(f"Budget of {args.budget} prompt tokens: summarizing {len(stale_paths)} files (about {plan['tokens']} tokens),"
+              f" skimming {len(skimmed)} by name only")
+
+    scheduler = DagScheduler(args.io_workers, args.workers)
+    # Bounds the files read ahead of the model calls, so that contents do not pile up in memory
+    read_ahead = threading.BoundedSemaphore(max(1, args.workers) * 4)
+    file_tasks = {}
+
+    def read_task(paths):
+        read_ahead.acquire()
+        try:
+            return summarizer.read_batch(paths)
+        except BaseException:
+            read_ahead.release()
+            raise
+
+    def describe_task(paths, loaded):
+        try:
+            if len(paths) == 1:
+                contents, result = loaded[0]
+                results = [result if contents is None else summarizer.describe_file(paths[0], contents)]
+            else:
+                results = summarizer.describe_batch(paths, loaded)
+        finally:
+            read_ahead.release()
+        file_responses.update(zip(paths, results))
+        return results
+
+    # Deeper files are read and described first, since the chain of directories above them is the longest
+    stale_paths.sort(key=lambda path: -path.count(os.sep))
+    for index, indices in enumerate(summarizer.plan_tasks(stale_paths)):
+        paths = [stale_paths[i] for i in indices]
+        scheduler.add(('read', index), lambda paths=paths: read_task(paths), kind='io')
+        scheduler.add(('file', index), lambda loaded, paths=paths: describe_task(paths, loaded), deps=[('read', index)])
+        for file_path in paths:
+            file_tasks[file_path] = ('file', index)
+
+    # Directories are summarized bottom-up, reusing directories whose inputs did not change
+    dir_responses, dir_digests = {}, {}
+
+    def describe_duplicate(file_path):
+        representative, kind, score = duplicates[file_path]
+        if kind == 'exact':
+            return f"identical to {relative_path(repo_dir, representative)}"
+        return f"near-duplicate of {relative_path(repo_dir, representative)} ({score:.0%} similar)"
+
+    def dir_task(dir_path, *_):
+        file_entries = []
+        for file_name in dir_files[dir_path]:
+            file_path = os.path.join(dir_path, file_name)
+            if file_path in duplicates:
+                # The directory prompt points at the representative instead of repeating its summary
+                file_entries.append((file_name, describe_duplicate(file_path)))
+                continue
+            if file_path in skimmed:
+                file_entries.append((file_name, "not summarized, only the name is known"))
+                continue
+            summary = file_responses.get(file_path)
+            if summary is not None:
+                file_entries.append((file_name, summary))
+        child_entries = [(os.path.basename(child), dir_responses[child]) for child in dir_children[dir_path] if child in dir_responses]
+        digest, summary = dir_summarizer.summarize_directory(dir_path, file_entries, child_entries, previous_dirs.get(dir_path))
+        if summary is not None:
+            dir_digests[dir_path] = digest
+            dir_responses[dir_path] = summary
+        return summary
+
+    # The walk is pre-order, so in reverse every child directory is added before its parent
+    for dir_path in reversed(list(dir_files)):
+        deps = {file_tasks[os.path.join(dir_path, name)] for name in dir_files[dir_path] if os.path.join(dir_path, name) in file_tasks}
+        deps = sorted(deps) + [('dir', child) for child in dir_children[dir_path]]
+        scheduler.add(('dir', dir_path), lambda *results, dir_path=dir_path: dir_task(dir_path, *results), deps=deps)
+    if readme_fn:
+        scheduler.add(('readme',), lambda root_summary: readme_fn(root_summary or ""), deps=[('dir', repo_dir)])
+
+    with summarizer, dir_summarizer, tqdm(total=len(stale_paths) + len(dir_files), desc="Summarizing files and directories", unit="task") as pbar:
+        def on_done(name):
+            if name[0] == 'file':
+                pbar.update(len(scheduler.results.get(name) or [None]))
+            elif name[0] == 'dir':
+                pbar.update(1)
+        scheduler.run(on_done)
+    for name, error in scheduler.errors.items():
+        print(f"Task {name} failed: {error}")
+
+    if duplicates:
+        report_duplicates(repo_dir, duplicates, file_responses, args, source)
+    if summarizer.batch_requests:
+        print(f"Batched {summarizer.batched_files} small files into {summarizer.batch_requests - summarizer.batch_fallbacks} requests"
+              f" ({summarizer.batch_fallbacks} batches fell back to per-file requests)")
+    if summarizer.skeleton_files:
+        print(f"Sent {summarizer.skeleton_files} source files as skeletons, leaving out about {summarizer.skeleton_saved_chars // 4} prompt tokens")
+    if summarizer.skipped_binaries:
+        print(f"Skipped {len(summarizer.skipped_binaries)} binary files:")
+        for file_path in summarizer.skipped_binaries:
+            print(f"  {relative_path(repo_dir, file_path)}")
+    if summarizer.missing_blobs:
+        print(f"Skipped {len(summarizer.missing_blobs)} files that the partial clone did not download:")
+        for file_path in summarizer.missing_blobs:
+            print(f"  {relative_path(repo_dir, file_path)}")
+
+    dir_responses = {dir_path: dir_responses[dir_path] for dir_path in dir_files if dir_path in dir_responses}
+    if args.incremental:
+        head_commit = source.commit if source else get_head_commit(repo_dir)
+        if head_commit:
+            save_state(state_path,
+                       head_commit,
+                       {relative_path(repo_dir, path): response for path, response in file_responses.items()
+                        if response is not None and not is_error_response(response)},
+                       {relative_path(repo_dir, root): response for root, response in dir_responses.items()
+                        if not is_error_response(response)},
+                       {relative_path(repo_dir, root): digest for root, digest in dir_digests.items()})
+        else:
+            print("Not a Git repository, incremental state was not saved.")
+
+    if isinstance(get_backend(), ResilientBackend):
+        print(f"Model calls: {get_backend().stats()}")
+    if cache:
+        print(f"Summary cache: {cache.stats()}")
+        cache.evict()
+
+    return dir_responses, scheduler.results.get(('readme',))
+
+def report_duplicates(repo_dir, duplicates, file_responses, args, source=None):
+    """
+    Gives duplicate files the summary of their representative and prints how many model calls that saved.
+
+    Args:
+        repo_dir (str): The absolute path to the repository.
+        duplicates (dict): The duplicates found by the file summarizer, see FileSummarizer.duplicates.
+        file_responses (dict): The file summaries keyed by path, completed with the duplicates.
+        args (argparse.Namespace): The parsed command-line arguments.
+        source (GitObjectStore, optional): Where the files were read from, None for the disk. Defaults to None.
+    """
+    get_size = source.size if source else os.path.getsize
+    saved = 0
+    for file_path, (representative, kind, score) in duplicates.items():
+        summary = file_responses.get(representative)
+        if summary is not None and kind == 'near' and not is_error_response(summary):
+            summary = f"Near-duplicate of {relative_path(repo_dir, representative)} ({score:.0%} similar). {summary}"
+        file_responses[file_path] = summary
+        record(file_path, kind='file', duplicate_of=relative_path(repo_dir, representative))
+        # A file above the chunk budget would have cost a request per chunk plus the merge
+        try:
+            tokens = content_tokens(file_path, get_size(file_path), args)
+        except OSError:
+            tokens = 0
+        saved += file_cost(tokens, args)[0]
+    exact = sum(kind == 'exact' for _, kind, _ in duplicates.values())
+    representatives = len({representative for representative, _, _ in duplicates.values()})
+    print(f"Deduplication: {exact} identical and {len(duplicates) - exact} near-duplicate files reused the summaries of"
+          f" {representatives} files, saving about {saved} model calls")
+
+def main():   
+    parser = build_parser()
     args = parser.parse_args()
+    args.cache_dir = os.path.abspath(os.path.expanduser(args.cache_dir))
+    try:
+        backend = create_backend(args.backend)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_backend(backend, args)
+    if not args.profile:
+        run(args)
+        return
+
+    # The profile is written even when the run stops early
+    profile_prefix = os.path.abspath(args.profile)
+    profiler = Profiler()
+    set_profiler(profiler)
+    try:
+        run(args)
+    finally:
+        set_profiler(None)
+        profiler.print_report(base_dir=os.getcwd())
+        profiler.write(profile_prefix)
+
+def run(args):
+    """
+    Generates the README of the repository selected by the command-line arguments, with the feedback loop.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+    """
 
     # Reading CSV files to get directories, extensions, and files to ignore
-    ignored_dir = read_csv_file(r'ignored_dir.csv')
-    ignored_exts = read_csv_file(r'ignored_exts.csv')
-    ignored_files = read_csv_file(r'ignored_files.csv')
-    ignored_files.append('LICENSE')
+    ignored_dir, ignored_files, ignored_exts = load_ignore_lists(args)
 
     repo_dir = get_repo_path(args)
+
+    # Bare repositories have no working tree, their files are always read from the object database
+    source = None
+    bare = is_bare_repository(repo_dir)
+    if args.ingest == 'objects' or bare:
+        try:
+            source = GitObjectStore(repo_dir)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Could not read the Git objects of {repo_dir}: {e}")
+            sys.exit(1)
+
+    # A dry run only estimates the cost of the run, without asking anything or calling the model
+    if args.plan:
+        try:
+            dir_files, dir_children = walk_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts, source)
+            file_paths = [os.path.join(root, file_name) for root, file_names in dir_files.items() for file_name in file_names]
+            plan = plan_repository(repo_dir, dir_files, dir_children, file_paths, args, source, args.budget)
+            print_plan(plan, repo_dir, args.budget)
+        finally:
+            if source:
+                source.close()
+        return
     
     user_desc_bool = input("Do you wish to describe what your codebase in brief? (y/n): ")
 
@@ -35,137 +476,98 @@ def main():
     else:
         user_description = ""
 
-    try:
-        os.chdir(repo_dir)
-    except FileNotFoundError:
-        print(f"The directory {repo_dir} does not exist.")
-        sys.exit(1)
-    except PermissionError:
-        print(f"Permission denied to access {repo_dir}.")
-        sys.exit(1)
-    except Exception as e:
-        print(f"An error occurred while changing to {repo_dir}: {e}")
-        sys.exit(1)
+    # The README of a bare repository is written to the current directory instead
+    if not bare:
+        try:
+            os.chdir(repo_dir)
+        except FileNotFoundError:
+            print(f"The directory {repo_dir} does not exist.")
+            sys.exit(1)
+        except PermissionError:
+            print(f"Permission denied to access {repo_dir}.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"An error occurred while changing to {repo_dir}: {e}")
+            sys.exit(1)
 
-    existing_readme = read_existing_readme(os.getcwd())
+    if source:
+        existing_readme = source.read_text("README.md") or ""
+    else:
+        existing_readme = read_existing_readme(os.getcwd())
     
-    dir_responses = {}
+    # The root summary covers the whole repository and is bounded by the directory token budget.
+    # The README is written to README_v1.md while it is generated
+    get_readme_generator().section_edits = args.feedback_mode == 'sections'
 
-    try:
-        for root, dirs, files in os.walk(os.getcwd()): # Walking through the repository to gather responses for each file in the directory
-            dirs[:] = [d for d in dirs if d not in ignored_dir]
-            filtered_files = [f for f in files if f not in ignored_files and not any(f.endswith(ext) for ext in ignored_exts)]
-
-            print(f"Scanning directory: {root}")
-            code_file_responses = {}
-
-            # Progress bar for reading files
-            with tqdm(total=len(filtered_files), desc="Reading files", unit="file") as pbar:
-                for file_name in filtered_files:
-                    file_path = os.path.join(root, file_name)
-
-                    try:
-                        if file_path.endswith('.ipynb'):
-                            contents = extract_code_cells_from_notebook(file_path)
-                            
-                        elif file_path.endswith('.csv'):
-                            df = pd.read_csv(file_path, nrows=2)
-                            contents = df.to_string(index=False)
-
-                        else:
-                            contents = read_file_with_fallback(file_path)
-                            #with open(file_path, 'r', encoding='utf-8') as file:
-                                #contents = file.read()
-                        
-                        if contents:    
-                            spinner = Spinner(f"Processing {file_name}")
-                            spinner.start()
-                            try:
-                                model_response = get_code_response(file_name + contents)
-                            except Exception as e:
-                                print(f"Error getting code response for {file_name}: {e}")
-                                time.sleep(2) 
-                                model_response = f"Error processing file: {str(e)}"
-                            finally:
-                                spinner.stop()
-                            code_file_responses[file_name] = model_response
-                    except Exception as e:
-                        print(f"Error reading {file_path}: {e}")
-                        code_file_responses[file_name] = f"File could not be read: {str(e)}"
-                    
-                    pbar.update(1)
-                    time.sleep(0.1) 
-
-            # Process directory structure after collecting file responses
-            if code_file_responses:
-                spinner = Spinner("Processing directory")
-                spinner.start()
+    def generate_initial_readme(readme_prompt):
+        initial_prompt = build_readme_prompt(user_description, existing_readme, readme_prompt)
+
+        def write_readme():
+            with open("README_v1.md", 'w', encoding='utf-8') as file:
+                return get_final_response(initial_prompt, stream_to_file(file), readme_prompt)
+
+        spinner = Spinner("Generating initial README into README_v1.md")
+        spinner.start()
+        try:
+            try:
+                return write_readme()
+            except Exception as e:
+                print(f"Error generating initial README: {e}")
+                time.sleep(2)
                 try:
-                    dir_prompt = "\n".join([f"{file_name}: {code_description}" for file_name, code_description in code_file_responses.items()])
-                    dir_responses[root] = get_dir_response(dir_prompt)
+                    return write_readme()
                 except Exception as e:
-                    print(f"Error getting directory response for {root}: {e}")
-                    time.sleep(2)  
-                    dir_responses[root] = f"Error processing directory: {str(e)}"
-                finally:
-                    spinner.stop()
-
-    except Exception as e:
-        print(f"An error occurred while walking through the directory: {e}")
-        sys.exit(1)
+                    print(f"Failed to generate README after retry: {e}")
+                    raise
+        finally:
+            spinner.stop()
 
-    # Combine directory responses and create a final prompt for README generation
-    readme_prompt = "\n".join([f"{dir_name}: {dir_description}" for dir_name, dir_description in dir_responses.items()])
-    
-    spinner = Spinner("Generating initial README")
-    spinner.start()
     try:
-        initial_prompt = f"Generate a README for a GitHub repository with the following description and structure:\n\nDescription: {user_description}\n\nExisting README: {existing_readme}\n\nStructure: {readme_prompt}"
-        readme_content = get_final_response(initial_prompt)
-    except Exception as e:
-        print(f"Error generating initial README: {e}")
-        time.sleep(2) 
-        try:
-            readme_content = get_final_response(initial_prompt)
-        except Exception as e:
-            print(f"Failed to generate README after retry: {e}")
-            sys.exit(1)
+        _, readme_content = summarize_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts, generate_initial_readme,
+                                                 source=source)
     finally:
-        spinner.stop()
+        if source:
+            source.close()
+    if readme_content is None:
+        sys.exit(1)
 
     # Loop for user feedback and updating the README until satisfied
     iteration = 1
     while True:
         readme_filename = f"README_v{iteration}.md"
-        try:
-            with open(readme_filename, 'w', encoding='utf-8') as file:
-                file.write(readme_content)
-        except Exception as e:
-            print(f"Error writing README to file: {e}")
-            continue
-
         print(f"\nREADME version {iteration} has been saved as {readme_filename}")
         print("Please review the file and provide feedback.")
         
-        user_feedback = input("\nAre you satisfied with this README? (yes/no): ").lower()
+        with profile_span('user_review', 'feedback'):
+            user_feedback = input("\nAre you satisfied with this README? (yes/no): ").lower()
         if user_feedback == 'yes':
             break
         
         print("\nPlease provide feedback or suggestions for improvement:")
-        user_feedback = input()
+        with profile_span('user_review', 'feedback'):
+            user_feedback = input()
         
-        spinner = Spinner(f"Updating README (iteration {iteration + 1})")
+        # The next version is written as it is generated, the previous one is kept until it is complete
+        next_filename = f"README_v{iteration + 1}.md"
+        spinner = Spinner(f"Updating README into {next_filename}")
         spinner.start()
+        def write_update():
+            with open(next_filename, 'w', encoding='utf-8') as file:
+                return update_with_feedback(user_feedback, stream_to_file(file))
+
         try:
-            feedback_prompt = f"Based on the following feedback, please improve the README:\n{user_feedback}"
-            readme_content = update_with_feedback(feedback_prompt)
-        except Exception as e:
-            print(f"Error updating README: {e}")
             try:
-                readme_content = update_with_feedback(feedback_prompt)
+                readme_content = write_update()
             except Exception as e:
-                print(f"Failed to update README after retry: {e}")
-                break
+                print(f"Error updating README: {e}")
+                readme_content = write_update()
+        except Exception as e:
+            print(f"Failed to update README after retry: {e}")
+            try:
+                os.remove(next_filename)
+            except OSError:
+                pass
+            break
         finally:
             spinner.stop()
 
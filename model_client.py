@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from backends import get_backend
+
+# The roles of the model calls: file and directory summaries, the README and the routing of README feedback
+ROLES = ('file', 'dir', 'readme', 'readme_router')
+
+class ModelClient:
+    """
+    The single entry point of the model calls of the code reader, directory and README models.
+
+    Every call goes through the active backend, so all callers share its transport, its
+    cached models and its retry and concurrency layer instead of holding a client each.
+    The model name and system prompt of every role are configured here: the model modules
+    register their defaults and configure overrides them, e.g. from a JSON file.
+
+    Calls are available in a blocking and an async form. Both accept a per-call timeout.
+    Async and timed calls run on a shared thread pool, in the context of the caller so that
+    profiling and rate limiter budgets still apply. Async calls can be cancelled: the
+    caller gets the TimeoutError or CancelledError at once, and a request still waiting for
+    a pool thread is never sent. A request already sent cannot be interrupted, so it keeps
+    its thread until the backend returns. The pool holds at most max_workers threads, so
+    abandoned requests delay later calls instead of piling up threads.
+
+    Attributes:
+        max_workers (int): The number of threads of the pool running async and timed calls.
+        timeout (float): The default timeout of a call in seconds, or None for no timeout.
+    """
+
+    def __init__(self, max_workers=8, timeout=None):
+        """
+        Initializes a new ModelClient instance.
+
+        Args:
+            max_workers (int, optional): The number of threads running async and timed calls. Defaults to 8.
+            timeout (float, optional): The default timeout of a call in seconds. Defaults to None (no timeout).
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._defaults = {}
+        self._overrides = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def register(self, role, model_name, system_prompt):
+        """
+        Sets the default model and system prompt of a role, used unless configure overrides them.
+
+        Args:
+            role (str): One of ROLES.
+            model_name (str): The name of the model.
+            system_prompt (str): The system instruction of the model.
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown model role: {role}")
+        self._defaults[role] = (model_name, system_prompt)
+
+    def configure(self, role, model_name=None, system_prompt=None):
+        """
+        Overrides the model or the system prompt of a role.
+
+        Args:
+            role (str): One of ROLES.
+            model_name (str, optional): The name of the model. Defaults to None (keep the current one).
+            system_prompt (str, optional): The system instruction of the model. Defaults to None (keep the current one).
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown model role: {role}")
+        override = dict(self._overrides.get(role, {}))
+        if model_name is not None:
+            override['model_name'] = model_name
+        if system_prompt is not None:
+            override['system_prompt'] = system_prompt
+        self._overrides[role] = override
+
+    def configure_from_file(self, config_path):
+        """
+        Overrides models and system prompts from a JSON file.
+
+        The file maps roles to objects with an optional "model" and either a "system_prompt"
+        or a "system_prompt_file", e.g. {"file": {"model": "gemini-1.5-pro"}}.
+
+        Args:
+            config_path (str): The path to the file.
+
+        Raises:
+            ValueError: If the file is not such a JSON object or names an unknown role.
+        """
+        with open(config_path, 'r', encoding='utf-8') as file:
+            config = json.load(file)
+        if not isinstance(config, dict):
+            raise ValueError(f"{config_path} must hold a JSON object keyed by role")
+        for role, options in config.items():
+            if not isinstance(options, dict):
+                raise ValueError(f"The settings of {role} in {config_path} must be a JSON object")
+            system_prompt = options.get('system_prompt')
+            if options.get('system_prompt_file'):
+                with open(options['system_prompt_file'], 'r', encoding='utf-8') as file:
+                    system_prompt = file.read()
+            self.configure(role, options.get('model'), system_prompt)
+
+    def identity(self, role):
+        """
+        Returns the model and system prompt of a role.
+
+        Args:
+            role (str): One of ROLES.
+
+        Returns:
+            tuple: The model name and the system prompt.
+
+        Raises:
+            KeyError: If the role has no registered default.
+        """
+        model_name, system_prompt = self._defaults[role]
+        override = self._overrides.get(role, {})
+        return override.get('model_name', model_name), override.get('system_prompt', system_prompt)
+
+    def generate(self, role, prompt, timeout=None):
+        """
+        Sends a stateless request with the model and system prompt of a role.
+
+        Args:
+            role (str): One of ROLES.
+            prompt (str): The prompt.
+            timeout (float, optional): Seconds to wait for the response. Defaults to the client's timeout.
+
+        Returns:
+            str: The text of the response.
+
+        Raises:
+            TimeoutError: If the response did not arrive in time. The request keeps running in the background.
+        """
+        model_name, system_prompt = self.identity(role)
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is None:
+            return get_backend().generate(model_name, system_prompt, prompt)
+        future = self._get_executor().submit(contextvars.copy_context().run, get_backend().generate, model_name, system_prompt, prompt)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Only a request still queued behind the pool is cancelled, a running one holds its thread until it returns
+            future.cancel()
+            raise TimeoutError(f"The {role} model did not answer within {timeout}s") from None
+
+    def generate_stream(self, role, prompt):
+        """
+        Sends a stateless request with the model and system prompt of a role, yielding the response as it is generated.
+
+        Args:
+            role (str): One of ROLES.
+            prompt (str): The prompt.
+
+        Yields:
+            str: Consecutive pieces of the response text.
+        """
+        model_name, system_prompt = self.identity(role)
+        yield from get_backend().generate_stream(model_name, system_prompt, prompt)
+
+    async def generate_async(self, role, prompt, timeout=None):
+        """
+        Sends a stateless request on the client's thread pool, see generate.
+
+        Args:
+            role (str): One of ROLES.
+            prompt (str): The prompt.
+            timeout (float, optional): Seconds to wait for the response. Defaults to the client's timeout.
+
+        Returns:
+            str: The text of the response.
+
+        Raises:
+            TimeoutError: If the response did not arrive in time.
+            asyncio.CancelledError: If the calling task was cancelled.
+        """
+        model_name, system_prompt = self.identity(role)
+        timeout = self.timeout if timeout is None else timeout
+        call = asyncio.get_running_loop().run_in_executor(self._get_executor(), contextvars.copy_context().run,
+                                                          get_backend().generate, model_name, system_prompt, prompt)
+        try:
+            # Cancelling the wrapped future also cancels the pool task if it has not started yet
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"The {role} model did not answer within {timeout}s") from None
+
+    def summarize_file(self, prompt, timeout=None):
+        """
+        Describes a code file, see generate.
+        """
+        return self.generate('file', prompt, timeout)
+
+    def summarize_dir(self, prompt, timeout=None):
+        """
+        Describes a directory from the descriptions of its entries, see generate.
+        """
+        return self.generate('dir', prompt, timeout)
+
+    def generate_readme(self, prompt, timeout=None):
+        """
+        Writes a README, or a section of one, see generate.
+        """
+        return self.generate('readme', prompt, timeout)
+
+    async def summarize_file_async(self, prompt, timeout=None):
+        """
+        Describes a code file, see generate_async.
+        """
+        return await self.generate_async('file', prompt, timeout)
+
+    async def summarize_dir_async(self, prompt, timeout=None):
+        """
+        Describes a directory from the descriptions of its entries, see generate_async.
+        """
+        return await self.generate_async('dir', prompt, timeout)
+
+    async def generate_readme_async(self, prompt, timeout=None):
+        """
+        Writes a README, or a section of one, see generate_async.
+        """
+        return await self.generate_async('readme', prompt, timeout)
+
+    def close(self):
+        """
+        Stops the thread pool, without waiting for the calls still running, e.g. after a timeout.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='model-client')
+        return self._executor
+
+_client = ModelClient()
+
+def get_client():
+    """
+    Returns the model client shared by the model modules.
+
+    Returns:
+        ModelClient: The shared client.
+    """
+    return _client
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import re
+import sys
+import time
+import subprocess
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.managers import BaseManager
+import main as cli
+from backends import create_backend
+from git_source import GitObjectStore, is_bare_repository
+from rate_limiter import RateLimiter, request_budget
+from redme_model import ReadmeGenerator
+from utils import clone_repository, refresh_repository, repository_dir_name, read_existing_readme, estimate_tokens
+
+GIT_URL_PREFIXES = ('http://', 'https://', 'ssh://', 'git://', 'file://', 'git@')
+
+class LimiterManager(BaseManager):
+    """
+    Serves a single RateLimiter to all worker processes, so the quotas hold for the whole batch.
+    """
+
+LimiterManager.register('RateLimiter', RateLimiter)
+
+def is_git_source(source):
+    """
+    Tells whether a repository source is a Git URL rather than a local path.
+
+    Args:
+        source (str): The Git URL or local path.
+
+    Returns:
+        bool: True for a Git URL.
+    """
+    return source.startswith(GIT_URL_PREFIXES) or (source.endswith('.git') and not os.path.isdir(source))
+
+def read_manifest(manifest_path):
+    """
+    Reads the repositories of a batch from a CSV manifest.
+
+    Each row holds a Git URL or a local path, optionally followed by a description of the
+    codebase. Blank rows, rows starting with "#" and a "source,description" header are skipped.
+
+    Args:
+        manifest_path (str): The path to the manifest.
+
+    Returns:
+        list: Entries with the keys "source", "git" (whether the source is a URL) and "description".
+    """
+    entries = []
+    with open(manifest_path, 'r', encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            source = row[0].strip()
+            if not entries and source.lower() == 'source':
+                continue
+            entries.append({
+                'source': source,
+                'git': is_git_source(source),
+                'description': ",".join(row[1:]).strip(),
+            })
+    return entries
+
+def resolve_repository(entry, args):
+    """
+    Returns the directory of a manifest entry, cloning Git repositories that are not cloned yet
+    and refreshing the ones that are.
+
+    Unlike the interactive mode, a failed clone raises instead of asking whether to retry.
+
+    Args:
+        entry (dict): The manifest entry.
+        args (argparse.Namespace): The parsed command-line arguments, Git repositories are cloned into --root.
+
+    Returns:
+        str: The absolute path to the repository.
+    """
+    if not entry['git']:
+        if not os.path.isdir(entry['source']):
+            raise FileNotFoundError(f"{entry['source']} is not a directory")
+        return os.path.abspath(entry['source'])
+    objects = args.ingest == 'objects'
+    blob_limit = args.blob_limit if objects else None
+    target_dir = os.path.join(args.root, repository_dir_name(entry['source'], objects))
+    if not os.path.isdir(target_dir):
+        return clone_repository(entry['source'], args.root, objects, blob_limit)
+    try:
+        refresh_repository(target_dir, entry['source'], blob_limit)
+    except subprocess.CalledProcessError as e:
+        print(f"Could not refresh the existing clone, proceeding with it as is: {e.stderr or e}")
+    return target_dir
+
+_args = None
+_limiter = None
+
+def init_worker(args, limiter):
+    """
+    Sets up the backend of a worker process.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+        limiter (RateLimiter): The proxy of the shared rate limiter, or None.
+    """
+    global _args, _limiter
+    _args = args
+    _limiter = limiter
+    cli.configure_backend(create_backend(args.backend), args)
+
+def write_repository_readme(entry, repo_dir, args, limiter=None, cache=None):
+    """
+    Summarizes a repository and writes its README, without any user interaction.
+
+    Args:
+        entry (dict): The manifest entry.
+        repo_dir (str): The absolute path to the repository.
+        args (argparse.Namespace): The parsed command-line arguments.
+        limiter (RateLimiter, optional): A rate limiter shared with other runs. Defaults to None.
+        cache (SummaryCache, optional): A summary cache shared with other runs. Defaults to None.
+
+    Returns:
+        str: The path to the written README.
+
+    Raises:
+        RuntimeError: If the README could not be generated.
+    """
+    ignored_dir, ignored_files, ignored_exts = cli.load_ignore_lists(args)
+    bare = is_bare_repository(repo_dir)
+    source = GitObjectStore(repo_dir) if args.ingest == 'objects' or bare else None
+    existing_readme = (source.read_text("README.md") or "") if source else read_existing_readme(repo_dir)
+
+    # A new generator per repository, so that READMEs do not see each other
+    def generate_readme(structure):
+        prompt = cli.build_readme_prompt(entry['description'], existing_readme, structure)
+        with request_budget(limiter, estimate_tokens(prompt)):
+            return ReadmeGenerator().generate_readme(prompt, structure=structure)
+
+    try:
+        _, readme_content = cli.summarize_repository(repo_dir, args, ignored_dir, ignored_files, ignored_exts,
+                                                     generate_readme, limiter, source, cache)
+    finally:
+        if source:
+            source.close()
+    if readme_content is None:
+        raise RuntimeError("The README could not be generated")
+    # A bare repository has no working tree, its README goes next to it
+    readme_path = os.path.splitext(repo_dir)[0] + ".README.md" if bare else os.path.join(repo_dir, "README.md")
+    with open(readme_path, 'w', encoding='utf-8') as file:
+        file.write(readme_content)
+    return readme_path
+
+def process_repository(index, entry):
+    """
+    Summarizes one repository and writes its README, without any user interaction.
+
+    Everything the pipeline prints goes to the log file of the repository. Failures are
+    recorded in the result instead of being raised, so one repository cannot stop the batch.
+
+    Args:
+        index (int): The position of the entry in the manifest.
+        entry (dict): The manifest entry.
+
+    Returns:
+        dict: The source, status ("ok" or "failed"), repository directory, README path, error,
+              log path and elapsed time of the repository.
+    """
+    start = time.monotonic()
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', entry['source'].rstrip('/'))[-60:]
+    log_path = os.path.join(_args.log_dir, f"{index:04d}-{slug}.log")
+    result = {'source': entry['source'], 'status': 'failed', 'repo_dir': None, 'readme': None, 'error': None, 'log': log_path}
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            repo_dir = resolve_repository(entry, _args)
+            result['repo_dir'] = repo_dir
+            readme_path = write_repository_readme(entry, repo_dir, _args, _limiter)
+            result.update(status='ok', readme=readme_path)
+        except (Exception, SystemExit) as e:
+            # The pipeline exits on fatal errors of a single run, which must not end the worker
+            result['error'] = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+    result['elapsed'] = round(time.monotonic() - start, 2)
+    return result
+
+def write_summary(summary_path, results, elapsed):
+    """
+    Writes the per-repository results of a batch.
+
+    Args:
+        summary_path (str): The path to the summary file.
+        results (list): The results of process_repository, in manifest order.
+        elapsed (float): The wall time of the batch in seconds.
+    """
+    summary = {
+        'elapsed': round(elapsed, 2),
+        'total': len(results),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'repositories': results,
+    }
+    try:
+        with open(summary_path, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=1)
+    except Exception as e:
+        print(f"Error writing batch summary {summary_path}: {e}")
+
+def build_parser():
+    """
+    Builds the command-line parser of the batch mode.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(description="Generate READMEs for many repositories without interaction.")
+    parser.add_argument("manifest", help="CSV file listing a Git URL or local path per row, optionally followed by a description")
+    parser.add_argument("--processes", type=int, default=4, help="Number of repositories processed at the same time")
+    parser.add_argument("--summary-file", default="readme-batch-summary.json", help="File receiving the result of every repository")
+    parser.add_argument("--log-dir", default="readme-batch-logs", help="Directory receiving the output of every repository")
+    cli.add_pipeline_arguments(parser)
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    # The workers create their own backend, the specification is checked once here
+    try:
+        create_backend(args.backend)
+    except ValueError as e:
+        parser.error(str(e))
+    args.cache_dir = os.path.abspath(os.path.expanduser(args.cache_dir))
+    args.log_dir = os.path.abspath(args.log_dir)
+    try:
+        entries = read_manifest(args.manifest)
+    except Exception as e:
+        print(f"Error reading manifest {args.manifest}: {e}")
+        sys.exit(1)
+    if any(entry['git'] for entry in entries):
+        if not args.root:
+            print("Please provide a root directory for cloning Git repositories.")
+            sys.exit(1)
+        args.root = os.path.abspath(args.root)
+        os.makedirs(args.root, exist_ok=True)
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    manager = None
+    limiter = None
+    if args.rpm or args.tpm:
+        manager = LimiterManager()
+        manager.start()
+        limiter = manager.RateLimiter(args.rpm, args.tpm)
+
+    start = time.monotonic()
+    results = [None] * len(entries)
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.processes), initializer=init_worker, initargs=(args, limiter)) as executor:
+            futures = {executor.submit(process_repository, index, entry): index for index, entry in enumerate(entries)}
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool as e:
+                    # A crashed worker fails the repositories that were still pending
+                    results[index] = {'source': entries[index]['source'], 'status': 'failed', 'error': f"Worker process died: {e}"}
+                except Exception as e:
+                    results[index] = {'source': entries[index]['source'], 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+                result = results[index]
+                print(f"[{done}/{len(entries)}] {result['status']:<6} {result['source']}" + (f": {result['error']}" if result['error'] else ""))
+    finally:
+        if manager:
+            manager.shutdown()
+
+    write_summary(args.summary_file, results, time.monotonic() - start)
+    failed = sum(result['status'] != 'ok' for result in results)
+    print(f"{len(entries) - failed} of {len(entries)} READMEs written, summary saved to {args.summary_file}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
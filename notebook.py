@@ -0,0 +1,274 @@
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+
+# The characters that change the nesting depth of a skipped value
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_SCALAR = re.compile(r'[^\s,\]}]+')
+
+class JsonStream:
+    """
+    A pull parser reading a JSON document from a text file in fixed-size chunks.
+
+    Only the values asked for are decoded. Everything else is skipped by scanning for the
+    closing quote or bracket, so a value of hundreds of MB (e.g. a base64 image output)
+    never has to fit in memory.
+
+    Attributes:
+        file (file): The text file being read.
+        chunk_size (int): The number of characters read at a time.
+        truncated (bool): Whether the last string read was cut at its limit.
+    """
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.truncated = False
+        self._buffer = ''
+        self._pos = 0
+
+    def _fill(self):
+        # Drops the consumed part of the buffer, so it only ever holds about one chunk
+        data = self.file.read(self.chunk_size)
+        if not data:
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character without consuming it, "" at the end of the file.
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, char):
+        """
+        Consumes the next non-whitespace character, which must be char.
+
+        Raises:
+            ValueError: If the next character is a different one.
+        """
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self._pos += 1
+
+    def _scan_string(self, keep):
+        # Consumes a string after its opening quote, returning its raw contents up to keep characters
+        parts, kept, truncated = [], 0, False
+
+        def take(end):
+            nonlocal kept, truncated
+            if end <= self._pos:
+                return
+            if kept >= keep:
+                truncated = True
+                return
+            piece = self._buffer[self._pos:min(end, self._pos + keep - kept)]
+            truncated = truncated or len(piece) < end - self._pos
+            parts.append(piece)
+            kept += len(piece)
+
+        # Whether the backslashes right before the current position leave the next character escaped
+        escaped = False
+        while True:
+            # str.find is much faster than a regular expression on long strings such as base64 images, and
+            # a quote ends the string when an even number of backslashes precedes it
+            quote = self._buffer.find('"', self._pos)
+            while quote != -1 and self._escapes_before(quote, escaped):
+                quote = self._buffer.find('"', quote + 1)
+            if quote != -1:
+                take(quote)
+                self._pos = quote + 1
+                return ''.join(parts), truncated
+            escaped = self._escapes_before(len(self._buffer), escaped)
+            take(len(self._buffer))
+            self._pos = len(self._buffer)
+            if not self._fill():
+                raise ValueError("Unterminated string")
+
+    def _escapes_before(self, index, escaped):
+        # Whether an odd number of backslashes precedes index, counting those before the current position
+        start = index
+        while start > self._pos and self._buffer[start - 1] == '\\':
+            start -= 1
+        run = index - start
+        if start == self._pos and escaped:
+            run += 1
+        return run % 2 == 1
+
+    def read_string(self, limit=None):
+        """
+        Reads a string value.
+
+        Args:
+            limit (int, optional): The maximum number of characters kept, the rest is skipped. Defaults to None.
+
+        Returns:
+            str: The decoded string, cut at the limit.
+        """
+        self.expect('"')
+        if limit is None:
+            raw, self.truncated = self._scan_string(float('inf'))
+            return json.loads('"' + raw + '"')
+        # A character takes up to twelve raw characters as a pair of escapes
+        limit = max(0, limit)
+        raw, self.truncated = self._scan_string(12 * limit + 12)
+        text = None
+        if self.truncated:
+            # The cut may have split an escape sequence, which is at most six characters long
+            for end in range(len(raw), max(-1, len(raw) - 7), -1):
+                try:
+                    text = json.loads('"' + raw[:end] + '"')
+                    break
+                except ValueError:
+                    pass
+            # Or the pair of escapes of a character outside the Basic Multilingual Plane
+            if text and '\ud800' <= text[-1] <= '\udbff':
+                text = text[:-1]
+        else:
+            text = json.loads('"' + raw + '"')
+        if len(text) > limit:
+            text, self.truncated = text[:limit], True
+        return text
+
+    def skip_value(self):
+        """
+        Consumes the next value without decoding it.
+        """
+        char = self.peek()
+        if char == '"':
+            self._pos += 1
+            self._scan_string(0)
+        elif char in ('{', '['):
+            self._pos += 1
+            depth = 1
+            while depth:
+                match = _STRUCTURE.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    if not self._fill():
+                        raise ValueError("Unterminated value")
+                    continue
+                self._pos = match.end()
+                if match.group() == '"':
+                    self._scan_string(0)
+                else:
+                    depth += 1 if match.group() in '{[' else -1
+        else:
+            match = _SCALAR.match(self._buffer, self._pos)
+            while match and match.end() == len(self._buffer) and self._fill():
+                match = _SCALAR.match(self._buffer, self._pos)
+            if match is None:
+                raise ValueError(f"Unexpected {char!r}")
+            self._pos = match.end()
+
+    def items(self):
+        """
+        Iterates over the keys of an object. The value of each key must be read or skipped before the next one.
+
+        Yields:
+            str: The keys in order.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self._pos += 1
+            else:
+                self.expect('}')
+                return
+
+    def elements(self):
+        """
+        Iterates over the elements of an array. Each element must be read or skipped before the next one.
+
+        Yields:
+            int: The index of each element.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == ',':
+                self._pos += 1
+            else:
+                self.expect(']')
+                return
+
+def _read_source(stream, limit):
+    # A cell source is either one string or a list of lines, returned with whether it was cut at the limit
+    if stream.peek() != '[':
+        return stream.read_string(limit), stream.truncated
+    parts, length, truncated = [], 0, False
+    for _ in stream.elements():
+        if truncated:
+            stream.skip_value()
+            continue
+        parts.append(stream.read_string(limit - length))
+        length += len(parts[-1])
+        truncated = stream.truncated
+    return ''.join(parts), truncated
+
+def extract_notebook_cells(file, max_chars=None, include_markdown=False):
+    """
+    Extracts the code cells of a Jupyter notebook without loading the whole notebook.
+
+    The notebook is parsed as a stream: outputs, attachments and metadata are skipped without
+    being decoded, and parsing stops once max_chars of code were extracted. Memory use stays
+    at a chunk of the file plus the extracted text, however large the embedded outputs are.
+
+    Args:
+        file (file): The notebook, opened in text mode.
+        max_chars (int, optional): The maximum number of characters extracted. Defaults to None (no limit).
+        include_markdown (bool, optional): Include markdown cells as "# " comments for context. Defaults to False.
+
+    Returns:
+        str: The cells separated by blank lines, ending with a note if the limit was reached.
+
+    Raises:
+        ValueError: If the notebook is not valid JSON.
+    """
+    limit = float('inf') if max_chars is None else max_chars
+    stream = JsonStream(file)
+    blocks, length = [], 0
+    for key in stream.items():
+        if key != 'cells':
+            stream.skip_value()
+            continue
+        for _ in stream.elements():
+            cell_type, source, truncated = None, None, False
+            for cell_key in stream.items():
+                if cell_key == 'cell_type':
+                    cell_type = stream.read_string()
+                elif cell_key == 'source':
+                    source, truncated = _read_source(stream, limit - length - (2 if blocks else 0))
+                else:
+                    stream.skip_value()
+            if source is None or cell_type not in ('code', 'markdown') or (cell_type == 'markdown' and not include_markdown):
+                continue
+            if cell_type == 'markdown':
+                source = '\n'.join('# ' + line if line else '#' for line in source.splitlines())
+            length += len(source) + (2 if blocks else 0)
+            blocks.append(source)
+            if truncated or length > limit:
+                # Nothing after the limit is used, so the rest of the file is not parsed at all
+                return '\n\n'.join(blocks)[:max_chars] + f"\n... [truncated after {max_chars} characters]"
+        # The cells were read, the remaining keys only hold metadata
+        break
+    return '\n\n'.join(blocks)
@@ -0,0 +1,352 @@
+import os
+import re
+
+def _translate_segment(segment):
+    """
+    Translates one slash-free gitignore glob segment into a regular expression.
+    """
+    i, n = 0, len(segment)
+    result = []
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == '*':
+            while i < n and segment[i] == '*':
+                i += 1
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '\\' and i < n:
+            result.append(re.escape(segment[i]))
+            i += 1
+        elif c == '[':
+            j = i
+            if j < n and segment[j] in '!^':
+                j += 1
+            if j < n and segment[j] == ']':
+                j += 1
+            while j < n and segment[j] != ']':
+                j += 1
+            if j >= n:
+                result.append('\\[')
+            else:
+                body = segment[i:j].replace('\\', '\\\\')
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                result.append(f'[{body}]')
+                i = j + 1
+        else:
+            result.append(re.escape(c))
+    return ''.join(result)
+
+def translate_pattern(pattern):
+    """
+    Translates a gitignore pattern into a regular expression matching paths relative to
+    the directory of the ignore file.
+
+    Patterns without a slash (other than a trailing one) match at any depth, patterns with
+    a slash are anchored to the directory of the ignore file, and "**" segments match any
+    number of directories.
+
+    Args:
+        pattern (str): The pattern, without negation prefix and trailing slash.
+
+    Returns:
+        str: The regular expression source.
+    """
+    anchored = '/' in pattern
+    segments = pattern.strip('/').split('/')
+    parts = []
+    for index, segment in enumerate(segments):
+        last = index == len(segments) - 1
+        if segment == '**':
+            parts.append('.*' if last else '(?:.*/)?')
+        else:
+            parts.append(_translate_segment(segment) + ('' if last else '/'))
+    regex = ''.join(parts)
+    return regex if anchored else '(?:.*/)?' + regex
+
+def parse_gitignore(lines):
+    """
+    Parses the lines of a gitignore file.
+
+    Args:
+        lines (iterable): The lines of the file.
+
+    Returns:
+        list: (pattern, negate, dir_only) tuples in file order.
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        # Trailing spaces are ignored unless escaped
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '
+        line = stripped
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\#') or line.startswith('\\!'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if line:
+            rules.append((line, negate, dir_only))
+    return rules
+
+class IgnoreRules:
+    """
+    The compiled rules of one ignore file, applying to the paths below its directory.
+
+    All rules are compiled into a single alternation in reverse file order with one named
+    group per rule, so one match finds the last matching rule, which decides per gitignore
+    semantics whether the path is ignored.
+    """
+
+    def __init__(self, rules):
+        """
+        Initializes a new IgnoreRules instance.
+
+        Args:
+            rules (list): (pattern, negate, dir_only) tuples as returned by parse_gitignore.
+        """
+        self.negations = {}
+        file_alternatives, dir_alternatives = [], []
+        for index in reversed(range(len(rules))):
+            pattern, negate, dir_only = rules[index]
+            group = f'(?P<r{index}>{translate_pattern(pattern)})'
+            self.negations[f'r{index}'] = negate
+            dir_alternatives.append(group)
+            if not dir_only:
+                file_alternatives.append(group)
+        self._file_regex = re.compile('|'.join(file_alternatives), re.DOTALL) if file_alternatives else None
+        self._dir_regex = re.compile('|'.join(dir_alternatives), re.DOTALL) if dir_alternatives else None
+
+    def match(self, rel_path, is_dir):
+        """
+        Matches a path against the rules.
+
+        Args:
+            rel_path (str): The path relative to the directory of the ignore file, with forward slashes.
+            is_dir (bool): Whether the path is a directory.
+
+        Returns:
+            bool: True if the path is ignored, False if it is explicitly re-included,
+                  or None if no rule matches.
+        """
+        regex = self._dir_regex if is_dir else self._file_regex
+        if regex is None:
+            return None
+        match = regex.fullmatch(rel_path)
+        if match is None:
+            return None
+        return not self.negations[match.lastgroup]
+
+def load_ignore_file(path):
+    """
+    Loads and compiles an ignore file.
+
+    Args:
+        path (str): The path to the ignore file.
+
+    Returns:
+        IgnoreRules: The compiled rules, or None if the file does not exist or has no rules.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as file:
+            rules = parse_gitignore(file)
+    except OSError:
+        return None
+    return IgnoreRules(rules) if rules else None
+
+class PathFilter:
+    """
+    Decides which files and directories of a repository are skipped.
+
+    Combines the ignored_dir, ignored_files and ignored_exts lists, which are checked with
+    set lookups and a single str.endswith call, with the repository's .gitignore files and
+    .git/info/exclude, which follow gitignore semantics.
+
+    Attributes:
+        root_dir (str): The root directory of the repository.
+        ignored_dirs (frozenset): Directory names that are never descended into.
+        ignored_files (frozenset): File names that are skipped.
+        ignored_exts (tuple): File name suffixes that are skipped.
+        use_gitignore (bool): Whether .gitignore files are honored.
+        read_file (callable): Returns the text of a file from its root-relative path, or None if it
+            does not exist, for repositories that are not read from disk. None reads from disk.
+    """
+
+    def __init__(self, root_dir, ignored_dirs=(), ignored_files=(), ignored_exts=(), use_gitignore=True, read_file=None):
+        """
+        Initializes a new PathFilter instance, loading the root ignore files.
+
+        Args:
+            root_dir (str): The root directory of the repository.
+            ignored_dirs (iterable, optional): Directory names to skip. Defaults to ().
+            ignored_files (iterable, optional): File names to skip. Defaults to ().
+            ignored_exts (iterable, optional): File name suffixes to skip. Defaults to ().
+            use_gitignore (bool, optional): Whether to honor .gitignore files. Defaults to True.
+            read_file (callable, optional): Reads ignore files from somewhere else than the disk. Defaults to None.
+        """
+        self.root_dir = os.path.abspath(root_dir)
+        self.ignored_dirs = frozenset(str(name) for name in ignored_dirs)
+        self.ignored_files = frozenset(str(name) for name in ignored_files)
+        self.ignored_exts = tuple(str(ext) for ext in ignored_exts)
+        self.use_gitignore = use_gitignore
+        self.read_file = read_file
+        self._rules_cache = {}
+        root_rules = []
+        if use_gitignore:
+            for rel_path in ('.git/info/exclude', '.gitignore'):
+                root_rules.extend(self._read_rules(rel_path))
+        self._rules_cache[''] = IgnoreRules(root_rules) if root_rules else None
+
+    def _read_rules(self, rel_path):
+        if self.read_file:
+            text = self.read_file(rel_path)
+            return parse_gitignore(text.splitlines()) if text else []
+        try:
+            with open(os.path.join(self.root_dir, rel_path), 'r', encoding='utf-8', errors='replace') as file:
+                return parse_gitignore(file)
+        except OSError:
+            return []
+
+    def _load_rules(self, rel_dir):
+        rules = self._read_rules(f"{rel_dir}/.gitignore" if rel_dir else '.gitignore')
+        return IgnoreRules(rules) if rules else None
+
+    def rules_for(self, rel_dir):
+        """
+        Returns the compiled rules of the .gitignore file in a directory, loading it on first use.
+
+        Args:
+            rel_dir (str): The directory relative to the root, "" for the root.
+
+        Returns:
+            IgnoreRules: The compiled rules, or None if the directory has no ignore rules.
+        """
+        if rel_dir not in self._rules_cache:
+            rules = None
+            if self.use_gitignore:
+                rules = self._load_rules(rel_dir)
+            self._rules_cache[rel_dir] = rules
+        return self._rules_cache[rel_dir]
+
+    def _gitignored(self, rel_path, is_dir, rule_stack):
+        # Deeper ignore files take precedence over the ones closer to the root
+        for base, rules in reversed(rule_stack):
+            result = rules.match(rel_path[len(base) + 1:] if base else rel_path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def _rule_stack(self, rel_dir):
+        stack = []
+        parts = rel_dir.split('/') if rel_dir else []
+        for depth in range(len(parts) + 1):
+            base = '/'.join(parts[:depth])
+            rules = self.rules_for(base)
+            if rules:
+                stack.append((base, rules))
+        return stack
+
+    def is_ignored(self, rel_path, is_dir=False, rule_stack=None):
+        """
+        Checks a single path, without looking at its parent directories.
+
+        Args:
+            rel_path (str): The path relative to the root, with forward slashes.
+            is_dir (bool, optional): Whether the path is a directory. Defaults to False.
+            rule_stack (list, optional): The (base, rules) pairs of the ignore files above the path,
+                computed from the root if not given. Defaults to None.
+
+        Returns:
+            bool: True if the path is skipped.
+        """
+        name = rel_path.rsplit('/', 1)[-1]
+        if is_dir:
+            if name in self.ignored_dirs:
+                return True
+        elif name in self.ignored_files or name.endswith(self.ignored_exts):
+            return True
+        if not self.use_gitignore:
+            return False
+        if rule_stack is None:
+            rule_stack = self._rule_stack(rel_path.rsplit('/', 1)[0] if '/' in rel_path else '')
+        return self._gitignored(rel_path, is_dir, rule_stack)
+
+    def is_path_ignored(self, rel_path):
+        """
+        Checks a file path and all of its parent directories, for paths that do not come from walk().
+
+        Args:
+            rel_path (str): The file path relative to the root, with forward slashes.
+
+        Returns:
+            bool: True if the file or any of its parent directories is skipped.
+        """
+        parts = rel_path.split('/')
+        for depth in range(1, len(parts)):
+            if self.is_ignored('/'.join(parts[:depth]), is_dir=True):
+                return True
+        return self.is_ignored(rel_path)
+
+    def walk(self, top=None, list_dir=None):
+        """
+        Walks the repository top-down with os.scandir, pruning ignored directories before descending.
+
+        Directories are visited in the same pre-order as os.walk, with entries sorted by name.
+        Symbolic links to directories are not followed.
+
+        Args:
+            top (str, optional): The directory to start from. Defaults to the root directory.
+            list_dir (callable, optional): Returns the (name, is_dir) entries of a directory path,
+                for trees that are not read from disk. Defaults to None (os.scandir).
+
+        Yields:
+            tuple: (dirpath, dirnames, filenames) for every visited directory, like os.walk.
+        """
+        top = os.path.abspath(top or self.root_dir)
+        top_rel = os.path.relpath(top, self.root_dir).replace(os.sep, '/')
+        top_rel = '' if top_rel == '.' else top_rel
+        parent_rel = top_rel.rsplit('/', 1)[0] if '/' in top_rel else ''
+        stack = [(top, top_rel, self._rule_stack(parent_rel) if top_rel and self.use_gitignore else [])]
+        while stack:
+            dirpath, rel_dir, rule_stack = stack.pop()
+            prefix = rel_dir + '/' if rel_dir else ''
+            try:
+                if list_dir:
+                    entries = list_dir(dirpath)
+                else:
+                    with os.scandir(dirpath) as iterator:
+                        entries = []
+                        for entry in iterator:
+                            try:
+                                entries.append((entry.name, entry.is_dir(follow_symlinks=False)))
+                            except OSError:
+                                continue
+            except OSError as e:
+                print(f"Error scanning {dirpath}: {e}")
+                continue
+
+            # Only directories that contain a .gitignore need to be opened to look for rules
+            if self.use_gitignore:
+                if rel_dir not in self._rules_cache:
+                    has_gitignore = any(name == '.gitignore' and not is_dir for name, is_dir in entries)
+                    self._rules_cache[rel_dir] = self._load_rules(rel_dir) if has_gitignore else None
+                if self._rules_cache[rel_dir]:
+                    rule_stack = rule_stack + [(rel_dir, self._rules_cache[rel_dir])]
+
+            dirnames, filenames = [], []
+            for name, is_dir in entries:
+                if not self.is_ignored(prefix + name, is_dir, rule_stack):
+                    (dirnames if is_dir else filenames).append(name)
+            dirnames.sort()
+            filenames.sort()
+            yield dirpath, dirnames, filenames
+            for name in reversed(dirnames):
+                stack.append((os.path.join(dirpath, name), prefix + name, rule_stack))
@@ -0,0 +1,580 @@
+import contextvars
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from tqdm import tqdm
+from code_reader_model import get_code_response
+from dir_sticher_model import get_dir_response
+from batching import fits_in_batch, pack_batches, build_batch_prompt, parse_batch_response
+from cache import SummaryCache
+from chunker import chunk_text, part_budget, part_header
+from model_client import get_client
+from rate_limiter import request_budget
+from profiler import get_profiler, profile_span, profile_item, record
+from utils import extract_code_cells_from_notebook, read_file_with_fallback, estimate_tokens, BinaryFileError, DEFAULT_MAX_BYTES
+from data_sampler import DATA_FORMATS, SAMPLE_BYTES, data_format, sample_data_file
+from skeleton import digest_source
+from git_source import MissingBlobError
+
+# Prefixes of the placeholder responses recorded when reading a file or calling the model failed
+ERROR_PREFIXES = ("File could not be read:", "File was not downloaded:", "Error processing file:", "Error processing directory:")
+
+def is_error_response(response):
+    """
+    Checks whether a response is an error placeholder rather than a model summary.
+
+    Args:
+        response (str): The response to check.
+
+    Returns:
+        bool: True if the response records a failure.
+    """
+    return response.startswith(ERROR_PREFIXES)
+
+def load_file_contents(file_path, max_bytes=DEFAULT_MAX_BYTES, include_markdown=False):
+    """
+    Loads the contents of a file in the form that is sent to the model.
+
+    Args:
+        file_path (str): The path to the file.
+        max_bytes (int, optional): The maximum number of bytes read from a text file, or characters
+            extracted from a notebook. Defaults to DEFAULT_MAX_BYTES.
+        include_markdown (bool, optional): Include the markdown cells of notebooks. Defaults to False.
+
+    Returns:
+        str: The code cells for notebooks, the schema and first rows for data files and the
+             decoded text for everything else. May be None or empty if there is nothing to send.
+    """
+    data_type = None
+    if os.path.splitext(file_path)[1].lower() in DATA_FORMATS:
+        data_type = data_format(file_path, os.path.getsize(file_path))
+    if get_profiler():
+        record(bytes_read=min(os.path.getsize(file_path), SAMPLE_BYTES if data_type else max_bytes))
+    if file_path.endswith('.ipynb'):
+        with profile_span('extract_code_cells_from_notebook', 'io', metric='read_time', path=file_path):
+            return extract_code_cells_from_notebook(file_path, max_bytes, include_markdown)
+    elif data_type:
+        # Data files are described by their schema, at a cost independent of their size
+        with profile_span('sample_data_file', 'io', metric='read_time', path=file_path):
+            return sample_data_file(file_path, data_type)
+    with profile_span('read_file_with_fallback', 'io', metric='read_time', path=file_path):
+        return read_file_with_fallback(file_path, max_bytes)
+
+# Model client role behind each cacheable model function, whose model and system prompt are part of cache keys
+MODEL_ROLES = {
+    get_code_response: 'file',
+    get_dir_response: 'dir',
+}
+
+class InflightCalls:
+    """
+    Lets concurrent identical model calls share a single request.
+
+    A call made while an identical one is in flight, from the same run or from another run
+    of the process, waits for that request and gets its response, or its error.
+
+    Attributes:
+        shared (int): The number of calls answered by a request of another call.
+    """
+
+    def __init__(self):
+        """
+        Initializes a new InflightCalls instance.
+        """
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fn):
+        """
+        Calls fn, unless a call with the same key is in flight, whose result is returned instead.
+
+        Args:
+            key (str): The key identifying the call.
+            fn (callable): The call, without arguments.
+
+        Returns:
+            object: The result of the call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            record(shared_calls=1)
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+# Shared by all the runs of the process, e.g. the jobs of the daemon
+inflight_calls = InflightCalls()
+
+def call_model(model_fn, prompt, limiter=None, cache=None):
+    """
+    Calls a model function once the rate limiter allows it, answering from the cache when possible.
+
+    Identical calls in flight at the same time share one request, see InflightCalls.
+
+    Args:
+        model_fn (callable): The model function to call, e.g. get_code_response.
+        prompt (str): The prompt to pass to the model function.
+        limiter (RateLimiter, optional): The shared rate limiter. Defaults to None.
+        cache (SummaryCache, optional): The summary cache. Defaults to None.
+
+    Returns:
+        str: The model response.
+    """
+    if model_fn not in MODEL_ROLES:
+        return _call_model(model_fn, prompt, limiter)
+    key = SummaryCache.make_key(*get_client().identity(MODEL_ROLES[model_fn]), prompt)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record(cache_hits=1)
+            return cached
+        record(cache_misses=1)
+
+    def request():
+        response = _call_model(model_fn, prompt, limiter)
+        if cache:
+            cache.put(key, response)
+        return response
+    return inflight_calls.run(key, request)
+
+def _call_model(model_fn, prompt, limiter):
+    # The retry layer acquires the limiter before each attempt, see request_budget
+    prompt_tokens = estimate_tokens(prompt)
+    with request_budget(limiter, prompt_tokens), \
+            profile_span(model_fn.__name__, 'model', metric='model_latency', prompt_tokens=prompt_tokens):
+        response = model_fn(prompt)
+    record(requests=1, prompt_tokens=prompt_tokens, response_tokens=estimate_tokens(response))
+    return response
+
+class FileSummarizer:
+    """
+    Summarizes files concurrently with a bounded worker pool.
+
+    Files larger than the chunk budget are split at syntactic boundaries, their chunks are
+    summarized in parallel and the chunk summaries are reduced into one file summary, so
+    no request exceeds the chunk budget however large the file is.
+
+    Attributes:
+        workers (int): The maximum number of concurrent model requests per stage.
+        limiter (RateLimiter): The shared rate limiter, or None.
+        cache (SummaryCache): The summary cache, or None.
+        chunk_tokens (int): The token budget of a single request.
+        chunk_overlap (int): The number of tokens repeated between consecutive chunks.
+        max_file_bytes (int): The maximum number of bytes read from a text file.
+        batch_tokens (int): The token budget of a batch of small files, 0 when batching is disabled.
+        batch_max_files (int): The maximum number of files in a batch.
+        source (GitObjectStore): Where file contents are read from, None for the disk.
+        notebook_markdown (bool): Whether the markdown cells of notebooks are sent along with the code cells.
+        skeleton_ratio (float): The largest size of a source skeleton, as a fraction of the source, for it to replace the source. 0 disables skeletons.
+        duplicate_index (DuplicateIndex): Matches files against the files read before them, None to describe every file.
+        duplicates (dict): (representative path, "exact" or "near", similarity) keyed by the path of each duplicate read,
+            which is not described.
+        skipped_binaries (list): The paths of the files skipped because they look binary.
+        missing_blobs (list): The paths of the files whose contents a blob-filtered clone did not download.
+        batch_requests (int): The number of batch requests sent.
+        batched_files (int): The number of files described by successful batch requests.
+        batch_fallbacks (int): The number of batches that fell back to per-file requests.
+        skeleton_files (int): The number of files sent as a skeleton.
+        skeleton_saved_chars (int): The characters of source left out of the requests by skeletons.
+    """
+
+    def __init__(self, workers=8, limiter=None, cache=None, chunk_tokens=8000, chunk_overlap=200, max_file_bytes=DEFAULT_MAX_BYTES,
+                 batch_tokens=0, batch_max_files=20, source=None, notebook_markdown=False, skeleton_ratio=0, duplicate_index=None):
+        """
+        Initializes a new FileSummarizer instance.
+
+        Args:
+            workers (int, optional): The maximum number of concurrent model requests per stage. Defaults to 8.
+            limiter (RateLimiter, optional): The shared rate limiter. Defaults to None.
+            cache (SummaryCache, optional): The summary cache. Defaults to None.
+            chunk_tokens (int, optional): The token budget of a single request. Defaults to 8000.
+            chunk_overlap (int, optional): The number of tokens repeated between consecutive chunks. Defaults to 200.
+            max_file_bytes (int, optional): The maximum number of bytes read from a text file. Defaults to DEFAULT_MAX_BYTES.
+            batch_tokens (int, optional): The token budget of a batch of small files, 0 to disable batching. Defaults to 0.
+            batch_max_files (int, optional): The maximum number of files in a batch. Defaults to 20.
+            source (GitObjectStore, optional): Reads file contents from a Git object database instead of the disk. Defaults to None.
+            notebook_markdown (bool, optional): Send the markdown cells of notebooks as context. Defaults to False.
+            skeleton_ratio (float, optional): Send the skeleton of a source file instead of its text when it is at most
+                this fraction of the text, 0 to always send the text. Defaults to 0.
+            duplicate_index (DuplicateIndex, optional): Reuse one summary for identical or near-identical files. Defaults to None.
+        """
+        self.workers = max(1, workers)
+        self.limiter = limiter
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.max_file_bytes = max_file_bytes
+        self.batch_tokens = batch_tokens
+        self.batch_max_files = batch_max_files
+        self.source = source
+        self.notebook_markdown = notebook_markdown
+        self.skeleton_ratio = skeleton_ratio
+        self.duplicate_index = duplicate_index
+        self.duplicates = {}
+        self.skipped_binaries = []
+        self.missing_blobs = []
+        self.batch_requests = 0
+        self.batched_files = 0
+        self.batch_fallbacks = 0
+        self.skeleton_files = 0
+        self.skeleton_saved_chars = 0
+        self._stats_lock = threading.Lock()
+        self._chunk_executor = None
+
+    def __enter__(self):
+        """
+        Starts the pool describing the chunks of large files. Summarizing outside of a with
+        block describes chunks sequentially.
+        """
+        self._chunk_executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._chunk_executor.shutdown()
+        self._chunk_executor = None
+
+    def load_contents(self, file_path):
+        """
+        Loads the contents of a file as they are sent to the model, from the disk or the object database.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            str: The contents, may be None or empty if there is nothing to send.
+
+        Raises:
+            BinaryFileError: If the file looks binary.
+        """
+        if self.source:
+            return self.source.load(file_path, self.max_file_bytes, self.notebook_markdown)
+        return load_file_contents(file_path, self.max_file_bytes, self.notebook_markdown)
+
+    def read_file(self, file_path):
+        """
+        Loads the contents of a file to send to the model, replaced by its skeleton when that is small enough.
+
+        A file duplicating one read before it is recorded in duplicates and has nothing to send.
+
+        Args:
+            file_path (str): The path to the file.
+
+        Returns:
+            tuple: The contents, or None when there is nothing to send, and the result to record
+                   in that case (an error message, or None for empty, binary and duplicate files).
+        """
+        try:
+            with profile_item(file_path, 'file'):
+                contents = self.load_contents(file_path)
+                if contents and self.duplicate_index is not None:
+                    # Fingerprinted here, so the file is read once for deduplication and description
+                    with profile_span('fingerprint', 'dedup', path=file_path):
+                        match = self.duplicate_index.match(file_path, contents)
+                    if match:
+                        self.duplicates[file_path] = match
+                        return None, None
+                if contents and self.skeleton_ratio > 0:
+                    with profile_span('digest_source', 'io', metric='read_time', path=file_path):
+                        digested, is_skeleton = digest_source(file_path, contents, self.skeleton_ratio)
+                    if is_skeleton:
+                        record(skeleton=True, skeleton_saved_tokens=estimate_tokens(contents) - estimate_tokens(digested))
+                        with self._stats_lock:
+                            self.skeleton_files += 1
+                            self.skeleton_saved_chars += len(contents) - len(digested)
+                        contents = digested
+        except BinaryFileError:
+            self.skipped_binaries.append(file_path)
+            return None, None
+        except MissingBlobError as e:
+            # Left out by a blob-filtered clone, the next run with a larger limit describes it
+            self.missing_blobs.append(file_path)
+            return None, f"File was not downloaded: {str(e)}"
+        except Exception as e:
+            tqdm.write(f"Error reading {file_path}: {e}")
+            return None, f"File could not be read: {str(e)}"
+        return (contents, None) if contents else (None, None)
+
+    def describe_file(self, file_path, contents):
+        """
+        Asks the code reader model to describe loaded file contents, in chunks if they exceed the chunk budget.
+
+        Args:
+            file_path (str): The path to the file.
+            contents (str): The contents returned by read_file.
+
+        Returns:
+            str: The description of the file, or an error message if the model call failed.
+        """
+        file_name = os.path.basename(file_path)
+        try:
+            with profile_item(file_path, 'file'):
+                if estimate_tokens(file_name + contents) > self.chunk_tokens:
+                    return self._summarize_chunked(file_name, contents)
+                return call_model(get_code_response, file_name + contents, self.limiter, self.cache)
+        except Exception as e:
+            tqdm.write(f"Error getting code response for {file_name}: {e}")
+            return f"Error processing file: {str(e)}"
+
+    def read_batch(self, file_paths):
+        """
+        Loads the contents of the files of a batch.
+
+        Args:
+            file_paths (list): The paths of the files.
+
+        Returns:
+            list: The read_file result of each file, in order.
+        """
+        return [self.read_file(file_path) for file_path in file_paths]
+
+    def describe_batch(self, file_paths, loaded):
+        """
+        Describes several small files with a single request asking for JSON keyed by file name.
+
+        Files found in the cache are not sent. If the answer cannot be parsed, every file of the
+        batch is described with its own request instead. Each description is cached under the
+        key of the single-file request, so batched and unbatched runs share cache entries.
+
+        Args:
+            file_paths (list): The paths of the files, with distinct file names.
+            loaded (list): The read_batch result for the files.
+
+        Returns:
+            list: The description of each file, an error message if reading or the model call failed, or None if the file had no contents to send or looks binary, in order.
+        """
+        results = [None] * len(file_paths)
+        pending = []
+        for index, (file_path, (contents, result)) in enumerate(zip(file_paths, loaded)):
+            results[index] = result
+            if contents is None:
+                continue
+            file_name = os.path.basename(file_path)
+            key = self.cache.make_key(*get_client().identity('file'), file_name + contents) if self.cache else None
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, file_name, contents, key))
+
+        if len(pending) > 1:
+            try:
+                with profile_span('batch', 'model', files=len(pending)):
+                    response = call_model(get_code_response, build_batch_prompt([(name, contents) for _, name, contents, _ in pending]), self.limiter)
+                descriptions = parse_batch_response(response, [name for _, name, _, _ in pending])
+            except Exception as e:
+                tqdm.write(f"Error getting batch response for {len(pending)} files: {e}")
+                descriptions = None
+            with self._stats_lock:
+                self.batch_requests += 1
+                if descriptions is not None:
+                    self.batched_files += len(pending)
+                else:
+                    self.batch_fallbacks += 1
+            if descriptions is not None:
+                for index, name, contents, key in pending:
+                    results[index] = descriptions[name]
+                    if key:
+                        self.cache.put(key, descriptions[name])
+                    # The request is shared, each file is charged its own part of the prompt and answer
+                    record(file_paths[index], prompt_tokens=estimate_tokens(name + contents),
+                           response_tokens=estimate_tokens(descriptions[name]), batched=True)
+                return results
+            for index, _, _, _ in pending:
+                record(file_paths[index], retries=1)
+
+        for index, _, contents, _ in pending:
+            results[index] = self.describe_file(file_paths[index], contents)
+        return results
+
+    def _summarize_chunked(self, file_name, contents):
+        # Map: describe every chunk in parallel on the chunk pool
+        # The header and the overlap are part of the request, so they are taken from its budget
+        chunks = chunk_text(contents, *part_budget(file_name, self.chunk_tokens, self.chunk_overlap))
+        prompts = [part_header(file_name, index, len(chunks)) + chunk for index, chunk in enumerate(chunks, 1)]
+        summaries = self._describe_all(prompts)
+
+        # Reduce: merge the part descriptions, in groups if they do not fit one request
+        header = f"{file_name} was too large to describe at once. The following are descriptions of its consecutive parts, combine them into a single description of the whole file:\n\n"
+        # Only a budget smaller than the header itself is exceeded, by the header
+        limit = max(self.chunk_tokens, estimate_tokens(header) + 2)
+        room = (limit - estimate_tokens(header)) * 4
+        while True:
+            # A single description always fits next to the header
+            summaries = [summary[:room - 4] for summary in summaries]
+            groups = [[]]
+            for summary in summaries:
+                if groups[-1] and estimate_tokens(header + "\n\n".join(groups[-1] + [summary])) > limit:
+                    groups.append([])
+                groups[-1].append(summary)
+            prompts = [header + "\n\n".join(group) for group in groups]
+            if len(prompts) == 1:
+                return call_model(get_code_response, prompts[0], self.limiter, self.cache)
+            if len(groups) == len(summaries):
+                # No two part descriptions fit together, shorten them so that at least two do
+                summaries = [summary[:max(1, (room - 6) // 2)] for summary in summaries]
+                continue
+            summaries = self._describe_all(prompts)
+
+    def _describe_all(self, prompts):
+        if self._chunk_executor is None:
+            return [call_model(get_code_response, prompt, self.limiter, self.cache) for prompt in prompts]
+        # The chunks are charged to the file being described, which is held in a context variable
+        futures = [self._chunk_executor.submit(contextvars.copy_context().run, call_model, get_code_response, prompt, self.limiter, self.cache)
+                   for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def plan_tasks(self, file_paths):
+        """
+        Splits files into requests: batches of small files when batching is enabled, single files otherwise.
+
+        Args:
+            file_paths (list): The paths of the files to summarize.
+
+        Returns:
+            list: The requests as lists of indices into file_paths.
+        """
+        if not self.batch_tokens:
+            return [[index] for index in range(len(file_paths))]
+        get_size = self.source.size if self.source else os.path.getsize
+        tasks, small = [], []
+        for index, file_path in enumerate(file_paths):
+            try:
+                size = get_size(file_path)
+            except OSError:
+                size = 0
+            if fits_in_batch(size, self.batch_tokens):
+                small.append(index)
+            else:
+                tasks.append([index])
+        for batch in pack_batches([file_paths[index] for index in small], self.batch_tokens, self.batch_max_files, get_size):
+            tasks.append([small[position] for position in batch])
+        return tasks
+
+class DirectorySummarizer:
+    """
+    Summarizes a directory tree bottom-up.
+
+    Each directory is described from the summaries of its files and of its child
+    directories, so the root summary covers the whole repository. Entries that do not fit
+    the token budget of one request are described in groups whose summaries are then
+    combined, which keeps every prompt, including the final README prompt, bounded. The
+    groups of a directory are described concurrently.
+
+    Attributes:
+        workers (int): The maximum number of concurrent group requests.
+        limiter (RateLimiter): The shared rate limiter, or None.
+        cache (SummaryCache): The summary cache, or None.
+        token_budget (int): The token budget of a single directory request.
+    """
+
+    def __init__(self, workers=8, limiter=None, cache=None, token_budget=8000):
+        """
+        Initializes a new DirectorySummarizer instance.
+
+        Args:
+            workers (int, optional): The maximum number of concurrent group requests. Defaults to 8.
+            limiter (RateLimiter, optional): The shared rate limiter. Defaults to None.
+            cache (SummaryCache, optional): The summary cache. Defaults to None.
+            token_budget (int, optional): The token budget of a single directory request. Defaults to 8000.
+        """
+        self.workers = max(1, workers)
+        self.limiter = limiter
+        self.cache = cache
+        self.token_budget = token_budget
+        self._group_executor = None
+
+    def __enter__(self):
+        """
+        Starts the pool describing the groups of large directories. Summarizing outside of a
+        with block describes groups sequentially.
+        """
+        self._group_executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._group_executor.shutdown()
+        self._group_executor = None
+
+    def summarize_entries(self, entries):
+        """
+        Describes a list of "name: summary" entries within the token budget.
+
+        Args:
+            entries (list): The entries to describe.
+
+        Returns:
+            str: The description of all entries.
+        """
+        max_chars = self.token_budget * 4
+        while True:
+            groups = [[]]
+            for entry in entries:
+                entry = entry[:max_chars]
+                if groups[-1] and estimate_tokens("\n".join(groups[-1] + [entry])) > self.token_budget:
+                    groups.append([])
+                groups[-1].append(entry)
+            if len(groups) == 1:
+                return call_model(get_dir_response, "\n".join(groups[0]), self.limiter, self.cache)
+            if len(groups) == len(entries):
+                # No two entries fit together, shorten them so that they can be combined
+                max_chars = max(1, max_chars // 2)
+                continue
+            entries = [f"Part {index} of the directory: {summary}" for index, summary in enumerate(self._describe_groups(groups), 1)]
+
+    def _describe_groups(self, groups):
+        prompts = ["\n".join(group) for group in groups]
+        if self._group_executor is None:
+            return [call_model(get_dir_response, prompt, self.limiter, self.cache) for prompt in prompts]
+        # The groups are charged to the directory being described, which is held in a context variable
+        futures = [self._group_executor.submit(contextvars.copy_context().run, call_model, get_dir_response, prompt, self.limiter, self.cache)
+                   for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def summarize_directory(self, dir_path, file_entries, child_entries, previous=None):
+        """
+        Describes a directory from the summaries of its files and child directories.
+
+        Args:
+            dir_path (str): The directory.
+            file_entries (list): (file name, summary) pairs of the files with a summary.
+            child_entries (list): (directory name, summary) pairs of the child directories with a summary.
+            previous (tuple, optional): The (digest, summary) pair of an earlier run, reused when the
+                entries have the same digest. Defaults to None.
+
+        Returns:
+            tuple: The digest of the entries and the summary, or (None, None) if the directory has no entries.
+        """
+        entries = [f"{name}: {summary}" for name, summary in file_entries]
+        entries += [f"{name}/: {summary}" for name, summary in child_entries]
+        if not entries:
+            return None, None
+        digest = hashlib.sha256("\n".join(entries).encode('utf-8', errors='surrogatepass')).hexdigest()
+        if previous and previous[0] == digest:
+            record(dir_path, kind='dir', reused=True)
+            return digest, previous[1]
+        # A directory holding nothing but a single subdirectory is described by it
+        if not file_entries and len(child_entries) == 1:
+            return digest, child_entries[0][1]
+        try:
+            with profile_item(dir_path, 'dir'), profile_span('summarize_directory', 'dir', path=dir_path, entries=len(entries)):
+                return digest, self.summarize_entries(entries)
+        except Exception as e:
+            tqdm.write(f"Error getting directory response for {dir_path}: {e}")
+            return digest, f"Error processing directory: {str(e)}"
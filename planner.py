@@ -0,0 +1,403 @@
+import math
+import os
+import re
+import subprocess
+from batching import fits_in_batch, pack_batches
+from chunker import part_budget
+from data_sampler import SAMPLE_BYTES, data_format
+from incremental import relative_path
+from skeleton import SKELETON_EXTENSIONS
+from utils import estimate_tokens
+
+# Assumed length of a model answer and latency of a request, used to estimate the cost of a run
+RESPONSE_TOKENS = 300
+# The entry of a skimmed file in its directory prompt, its name and a short note
+SKIM_TOKENS = 15
+REQUEST_LATENCY = 5.0
+# Imports are declared at the top of a file, so only its beginning is scanned
+IMPORT_SCAN_BYTES = 64 * 1024
+# Parquet files are described by their footer schema, whatever their size
+PARQUET_DESCRIPTION_BYTES = 4 * 1024
+# Share of a notebook taken by the cell sources, the rest being outputs and metadata that are not sent
+NOTEBOOK_SOURCE_RATIO = 0.3
+RECENT_COMMITS = 2000
+
+ENTRY_POINTS = {'main.py', '__main__.py', 'app.py', 'cli.py', 'manage.py', 'wsgi.py', 'asgi.py', 'server.py', 'setup.py',
+                'index.js', 'index.ts', 'main.js', 'main.ts', 'server.js', 'app.js', 'main.go', 'main.rs', 'lib.rs',
+                'Main.java', 'Program.cs', 'main.c', 'main.cpp', 'Makefile', 'Dockerfile', 'pyproject.toml', 'package.json'}
+# Weights of the ranking signals, each normalized to [0, 1]
+WEIGHTS = {'entry': 3.0, 'centrality': 2.0, 'recency': 1.0, 'depth': 0.5}
+
+_PY_IMPORT = re.compile(r'^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w., ()*]+)|import\s+([\w., ]+))', re.MULTILINE)
+_JS_IMPORT = re.compile(r'''(?:\bfrom\s*|\brequire\s*\(\s*|\bimport\s*\(\s*|^\s*import\s+)['"](\.{1,2}/[^'"]+)['"]''', re.MULTILINE)
+JS_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs')
+
+def content_tokens(file_path, size, args):
+    """
+    Estimates the prompt tokens of a file from its size, as the file summarizer would send it.
+
+    Data files are sent as a sample of their first SAMPLE_BYTES, or as the schema in the footer
+    of a Parquet file. Notebooks are sent as the source of their cells, at most max_file_bytes
+    characters. Source files with a skeleton are assumed to be sent as one, which is at most
+    skeleton_ratio of their text.
+
+    Args:
+        file_path (str): The path to the file.
+        size (int): The size of the file in bytes.
+        args (argparse.Namespace): The parsed command-line arguments, for max_file_bytes and skeleton_ratio.
+
+    Returns:
+        int: The estimated prompt tokens, including the file name.
+    """
+    data_type = data_format(file_path, size)
+    if data_type == 'parquet':
+        sent = min(size, PARQUET_DESCRIPTION_BYTES)
+    elif data_type:
+        sent = min(size, SAMPLE_BYTES)
+    elif file_path.endswith('.ipynb'):
+        sent = min(int(size * NOTEBOOK_SOURCE_RATIO), args.max_file_bytes)
+    else:
+        sent = min(size, args.max_file_bytes)
+        if args.skeleton_ratio > 0 and os.path.splitext(file_path)[1].lower() in SKELETON_EXTENSIONS:
+            sent = int(sent * args.skeleton_ratio)
+    return sent // 4 + estimate_tokens(os.path.basename(file_path))
+
+def file_cost(tokens, args):
+    """
+    Estimates the requests and tokens spent describing one file on its own.
+
+    Args:
+        tokens (int): The estimated prompt tokens of the file.
+        args (argparse.Namespace): The parsed command-line arguments, for the chunk budget.
+
+    Returns:
+        tuple: The number of requests and of prompt tokens, counting the chunks and the merge of a large file.
+    """
+    if tokens <= args.chunk_tokens:
+        return 1, tokens
+    step, _ = part_budget('', args.chunk_tokens, args.chunk_overlap)
+    chunks = math.ceil(tokens / step)
+    # Every chunk request adds its header and overlap to the text, and the merge reads every chunk description
+    return chunks + 1, tokens + chunks * (args.chunk_tokens - step + RESPONSE_TOKENS)
+
+def _python_modules(file_paths, repo_dir):
+    # Every dotted suffix of a module path, so that "pkg.mod" finds src/pkg/mod.py
+    modules = {}
+    for file_path in file_paths:
+        if not file_path.endswith('.py'):
+            continue
+        parts = relative_path(repo_dir, file_path)[:-3].split('/')
+        if parts[-1] == '__init__':
+            parts = parts[:-1]
+        for start in range(len(parts)):
+            modules.setdefault('.'.join(parts[start:]), file_path)
+    return modules
+
+def _resolve_python(file_path, repo_dir, module, names, modules):
+    targets = []
+    if module.startswith('.'):
+        # Relative imports are resolved against the package of the importing file
+        level = len(module) - len(module.lstrip('.'))
+        package = relative_path(repo_dir, os.path.dirname(file_path)).split('/')
+        package = [] if package == ['.'] else package
+        package = package[:len(package) - level + 1] if level > 1 else package
+        module = '.'.join(package + ([module.lstrip('.')] if module.lstrip('.') else []))
+    for name in names:
+        targets.append(modules.get(f"{module}.{name}" if module else name))
+    # The names imported from a module may be attributes rather than submodules
+    targets.append(modules.get(module))
+    return {target for target in targets if target and target != file_path}
+
+def _resolve_js(file_path, specifier, known):
+    base = os.path.normpath(os.path.join(os.path.dirname(file_path), specifier))
+    for candidate in [base] + [base + ext for ext in JS_EXTENSIONS] + [os.path.join(base, 'index' + ext) for ext in JS_EXTENSIONS]:
+        if candidate in known and candidate != file_path:
+            return candidate
+    return None
+
+def find_imports(file_path, text, repo_dir, modules, known):
+    """
+    Lists the files of the repository imported by a Python or JavaScript/TypeScript file.
+
+    Args:
+        file_path (str): The importing file.
+        text (str): The beginning of its contents.
+        repo_dir (str): The repository directory.
+        modules (dict): Python files keyed by every dotted suffix of their module name.
+        known (set): The paths of all files of the repository.
+
+    Returns:
+        set: The paths of the imported files.
+    """
+    imported = set()
+    if file_path.endswith('.py'):
+        for match in _PY_IMPORT.finditer(text):
+            if match.group(3):
+                for name in match.group(3).split(','):
+                    module = name.split(' as ')[0].strip()
+                    # "import a.b.c" imports the packages along the way as well
+                    parts = module.split('.')
+                    imported |= {modules[prefix] for prefix in ('.'.join(parts[:end]) for end in range(1, len(parts) + 1))
+                                 if prefix in modules and modules[prefix] != file_path}
+            else:
+                names = [name.split(' as ')[0].strip(' ()') for name in match.group(2).split(',')]
+                imported |= _resolve_python(file_path, repo_dir, match.group(1), [name for name in names if name and name != '*'], modules)
+    elif file_path.endswith(JS_EXTENSIONS):
+        for match in _JS_IMPORT.finditer(text):
+            target = _resolve_js(file_path, match.group(1), known)
+            if target:
+                imported.add(target)
+    return imported
+
+def import_centrality(file_paths, read_head, repo_dir, iterations=20, damping=0.85):
+    """
+    Ranks files by their PageRank in the import graph, so widely imported core modules rank high.
+
+    Args:
+        file_paths (list): The paths of the files.
+        read_head (callable): Returns the beginning of a file as text.
+        repo_dir (str): The repository directory.
+        iterations (int, optional): The number of power iterations. Defaults to 20.
+        damping (float, optional): The PageRank damping factor. Defaults to 0.85.
+
+    Returns:
+        tuple: The centrality of each file keyed by path, normalized to [0, 1], and the number of
+               files importing each file.
+    """
+    known = set(file_paths)
+    modules = _python_modules(file_paths, repo_dir)
+    edges = {}
+    for file_path in file_paths:
+        if not file_path.endswith(('.py',) + JS_EXTENSIONS):
+            continue
+        try:
+            text = read_head(file_path)
+        except Exception:
+            continue
+        if text:
+            edges[file_path] = find_imports(file_path, text, repo_dir, modules, known)
+    importers = {}
+    for source_path, targets in edges.items():
+        for target in targets:
+            importers[target] = importers.get(target, 0) + 1
+    if not importers:
+        return {}, {}
+
+    nodes = list(known)
+    rank = dict.fromkeys(nodes, 1 / len(nodes))
+    for _ in range(iterations):
+        # Files importing nothing spread their rank evenly
+        dangling = sum(rank[node] for node in nodes if not edges.get(node))
+        following = dict.fromkeys(nodes, (1 - damping + damping * dangling) / len(nodes))
+        for source_path, targets in edges.items():
+            for target in targets:
+                following[target] += damping * rank[source_path] / len(targets)
+        rank = following
+    low, high = min(rank.values()), max(rank.values())
+    return {node: (value - low) / (high - low) if high > low else 0.0 for node, value in rank.items()}, importers
+
+def last_commit_times(repo_dir, file_paths, commit=None):
+    """
+    Finds when each file was last changed, from the recent history of the repository.
+
+    Args:
+        repo_dir (str): The repository directory.
+        file_paths (list): The paths of the files.
+        commit (str, optional): The commit to read the history from. Defaults to None (HEAD).
+
+    Returns:
+        dict: The commit timestamp of the last change of each file found, keyed by path. Empty
+              for a directory that is not a Git repository.
+    """
+    try:
+        output = subprocess.run(["git", "-c", "core.quotepath=off", "-C", repo_dir, "log", f"-n{RECENT_COMMITS}", "--format=%x01%ct",
+                                 "--name-only", commit or "HEAD", "--"], check=True, capture_output=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return {}
+    by_rel = {relative_path(repo_dir, file_path): file_path for file_path in file_paths}
+    # The log is newest first, so the first commit listing a file is its last change
+    times, timestamp = {}, None
+    for line in output.decode('utf-8', errors='surrogateescape').splitlines():
+        if line.startswith('\x01'):
+            timestamp = int(line[1:])
+        elif line in by_rel and by_rel[line] not in times:
+            times[by_rel[line]] = timestamp
+    return times
+
+def _directory_costs(dir_files, dir_children, skimmed, token_budget):
+    # Every file and child directory is an entry of its directory's prompt, a summary or just the name of a skimmed file
+    dirs, total_tokens, total_requests = {}, 0, 0
+    for dir_path in dir_files:
+        names = dir_files[dir_path]
+        tokens = sum(SKIM_TOKENS if os.path.join(dir_path, name) in skimmed else RESPONSE_TOKENS for name in names)
+        tokens += len(dir_children[dir_path]) * RESPONSE_TOKENS
+        if not tokens or (not names and len(dir_children[dir_path]) == 1):
+            requests, tokens = 0, 0
+        elif tokens <= token_budget:
+            requests = 1
+        else:
+            requests = math.ceil(tokens / token_budget) + 1
+            tokens += (requests - 1) * RESPONSE_TOKENS
+        dirs[dir_path] = [len(names), tokens, requests]
+        total_tokens += tokens
+        total_requests += requests
+    # The README request carries the root summary, the description and the existing README
+    return dirs, total_tokens + 2 * RESPONSE_TOKENS, total_requests + 1
+
+def plan_repository(repo_dir, dir_files, dir_children, file_paths, args, source=None, budget=None):
+    """
+    Estimates the cost of summarizing a repository and ranks its files by importance.
+
+    Files are ranked by whether they look like an entry point, their centrality in the import
+    graph, how recently they were changed and how shallow they are. With a budget, the files
+    are picked in rank order while their estimated prompt tokens fit in what is left after the
+    directory and README requests, and the others are skimmed by name only.
+
+    Args:
+        repo_dir (str): The absolute path to the repository.
+        dir_files (dict): The file names of every directory, as walked.
+        dir_children (dict): The child directory paths of every directory.
+        file_paths (list): The paths of the files to describe.
+        args (argparse.Namespace): The parsed command-line arguments.
+        source (GitObjectStore, optional): Where the files are read from, None for the disk. Defaults to None.
+        budget (int, optional): The prompt token budget of the run. Defaults to None (no budget).
+
+    Returns:
+        dict: "files", a list of per-file dicts with path, tokens, requests, score, signals and
+              selected, sorted by score; "dirs", (files, tokens, requests) per directory; and the
+              totals "file_tokens", "file_requests", "dir_tokens", "dir_requests", "tokens",
+              "requests" and "seconds" of the selected files.
+    """
+    get_size = source.size if source else os.path.getsize
+
+    def read_head(file_path):
+        if source:
+            data, _ = source.read_bytes(file_path, IMPORT_SCAN_BYTES)
+            return data.decode('utf-8', errors='replace')
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read(IMPORT_SCAN_BYTES)
+
+    centrality, importers = import_centrality(file_paths, read_head, repo_dir)
+    times = last_commit_times(repo_dir, file_paths, source.commit if source else None)
+    if not times and not source:
+        times = {}
+        for file_path in file_paths:
+            try:
+                times[file_path] = os.path.getmtime(file_path)
+            except OSError:
+                pass
+    oldest, newest = min(times.values(), default=0), max(times.values(), default=0)
+
+    files, sizes = [], {}
+    for file_path in file_paths:
+        try:
+            size = get_size(file_path)
+        except OSError:
+            size = 0
+        sizes[file_path] = size
+        requests, prompt_tokens = file_cost(content_tokens(file_path, size, args), args)
+        depth = relative_path(repo_dir, file_path).count('/')
+        signals = {
+            'entry': 1.0 if os.path.basename(file_path) in ENTRY_POINTS else 0.0,
+            'centrality': centrality.get(file_path, 0.0),
+            'recency': (times[file_path] - oldest) / (newest - oldest) if file_path in times and newest > oldest else 0.0,
+            'depth': 1 / (1 + depth),
+        }
+        files.append({
+            'path': file_path,
+            'tokens': prompt_tokens,
+            'requests': requests,
+            'score': sum(WEIGHTS[name] * value for name, value in signals.items()),
+            'signals': signals,
+            'importers': importers.get(file_path, 0),
+            'selected': True,
+        })
+    files.sort(key=lambda entry: (-entry['score'], entry['path']))
+
+    # Small files share requests when batching is enabled, picked like FileSummarizer.plan_tasks picks them
+    if args.batch_tokens:
+        small = [entry for entry in files if fits_in_batch(sizes[entry['path']], args.batch_tokens)]
+        for batch in pack_batches([entry['path'] for entry in small], args.batch_tokens, args.batch_max_files, get_size):
+            for position in batch:
+                small[position]['requests'] = 1 / len(batch)
+
+    if budget is not None:
+        # Directory prompts are reserved first with every file skimmed, a selected file also pays for its full entry
+        remaining = budget - _directory_costs(dir_files, dir_children, set(file_paths), args.dir_token_budget)[1]
+        for entry in files:
+            cost = entry['tokens'] + RESPONSE_TOKENS - SKIM_TOKENS
+            entry['selected'] = cost <= remaining
+            if entry['selected']:
+                remaining -= cost
+    dirs, dir_tokens, dir_requests = _directory_costs(dir_files, dir_children, {entry['path'] for entry in files if not entry['selected']},
+                                                    args.dir_token_budget)
+    for entry in files:
+        if entry['selected']:
+            counts = dirs[os.path.dirname(entry['path'])]
+            counts[1] += entry['tokens']
+            counts[2] += entry['requests']
+
+    selected = [entry for entry in files if entry['selected']]
+    file_tokens = sum(entry['tokens'] for entry in selected)
+    # Rounded first so that a batch split into thirds does not add up to more than one request
+    file_requests = math.ceil(round(sum(entry['requests'] for entry in selected), 6))
+    requests = file_requests + dir_requests
+    tokens = file_tokens + dir_tokens
+    # Requests run --workers at a time, unless the rate limits are the tighter bound
+    seconds = math.ceil(requests / max(1, args.workers)) * REQUEST_LATENCY
+    if args.rpm:
+        seconds = max(seconds, requests / args.rpm * 60)
+    if args.tpm:
+        seconds = max(seconds, tokens / args.tpm * 60)
+    return {
+        'files': files,
+        'dirs': {dir_path: tuple(counts) for dir_path, counts in dirs.items()},
+        'file_tokens': file_tokens,
+        'file_requests': file_requests,
+        'dir_tokens': dir_tokens,
+        'dir_requests': dir_requests,
+        'tokens': tokens,
+        'requests': requests,
+        'response_tokens': requests * RESPONSE_TOKENS,
+        'seconds': seconds,
+    }
+
+def print_plan(plan, repo_dir, budget=None, top=25):
+    """
+    Prints the ranked files, the costliest directories and the totals of a plan.
+
+    Args:
+        plan (dict): The result of plan_repository.
+        repo_dir (str): The repository directory, paths are shown relative to it.
+        budget (int, optional): The prompt token budget the plan was made for. Defaults to None.
+        top (int, optional): The number of files and directories listed. Defaults to 25.
+    """
+    files = plan['files']
+    print(f"\nPlan for {repo_dir}: {len(files)} files in {len(plan['dirs'])} directories")
+    print(f"{'rank':>4} {'score':>6} {'tokens':>8} {'requests':>8} {'':>7}  {'file':<48} signals")
+    for rank, entry in enumerate(files[:top], 1):
+        signals = []
+        if entry['signals']['entry']:
+            signals.append("entry point")
+        if entry['importers']:
+            signals.append(f"imported by {entry['importers']}")
+        if entry['signals']['recency'] >= 0.5:
+            signals.append("recently changed")
+        print(f"{rank:>4} {entry['score']:>6.2f} {entry['tokens']:>8} {entry['requests']:>8.2g} {'' if entry['selected'] else 'skimmed':>7}"
+              f"  {relative_path(repo_dir, entry['path']):<48} {', '.join(signals)}")
+    if len(files) > top:
+        print(f"     ... {len(files) - top} more files")
+
+    print(f"\nCostliest directories")
+    print(f"{'directory':<48} {'files':>6} {'tokens':>8} {'requests':>8}")
+    for dir_path, (count, tokens, requests) in sorted(plan['dirs'].items(), key=lambda entry: -entry[1][1])[:top // 2]:
+        # Batched files count fractions of a request, a directory sends at least the whole of its share
+        print(f"{relative_path(repo_dir, dir_path):<48} {count:>6} {tokens:>8} {math.ceil(round(requests, 6)):>8}")
+
+    selected = sum(entry['selected'] for entry in files)
+    print(f"\nEstimated: {plan['requests']} requests ({plan['file_requests']} for files, {plan['dir_requests']} for directories and the README),"
+          f" {plan['tokens']} prompt tokens and {plan['response_tokens']} response tokens,"
+          f" about {plan['seconds'] / 60:.1f} min assuming {REQUEST_LATENCY:.0f} s per request")
+    if budget is not None:
+        print(f"Budget of {budget} prompt tokens: {selected} files summarized, {len(files) - selected} skimmed by name only")
+    print("Summary cache hits, reused incremental summaries and duplicate files are not subtracted.")
@@ -0,0 +1,260 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# The file, directory or README the current thread is working on, metrics are recorded against it
+_current_item = contextvars.ContextVar('profile_item', default=None)
+_null_context = nullcontext()
+
+class Profiler:
+    """
+    Records timed spans and per-item metrics of a run.
+
+    Spans become the events of a Chrome trace, which can be opened in chrome://tracing or
+    https://ui.perfetto.dev. Metrics such as read time, bytes read, tokens, model latency,
+    retries and cache hits are accumulated per file, directory and README.
+
+    Attributes:
+        start_time (float): The perf_counter value when profiling started.
+        events (list): The recorded spans as (name, category, start, end, thread id, thread name, args) tuples.
+        items (dict): Metrics keyed by item, with a "kind" entry of "file", "dir" or "readme".
+    """
+
+    def __init__(self):
+        """
+        Initializes a new Profiler instance.
+        """
+        self.start_time = time.perf_counter()
+        self.events = []
+        self.items = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category, metric=None, **args):
+        """
+        Times the enclosed block as a trace event.
+
+        Args:
+            name (str): The name of the event.
+            category (str): The stage of the event, e.g. "io", "model" or "dir".
+            metric (str, optional): A metric of the current item the duration is added to. Defaults to None.
+            **args: Values shown with the event. The yielded dict can be updated inside the block.
+
+        Yields:
+            dict: The args of the event.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            thread = threading.current_thread()
+            with self._lock:
+                self.events.append((name, category, start, end, thread.ident, thread.name, args))
+            if metric:
+                self.record(**{metric: end - start})
+
+    def record(self, item=None, **metrics):
+        """
+        Adds metrics to an item. Numbers are summed, other values replace the previous value.
+
+        Args:
+            item (str, optional): The item, the current item if omitted. Nothing is recorded without one. Defaults to None.
+            **metrics: The metrics to add.
+        """
+        item = item or _current_item.get()
+        if item is None:
+            return
+        with self._lock:
+            entry = self.items.setdefault(item, {})
+            for name, value in metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    entry[name] = entry.get(name, 0) + value
+                else:
+                    entry[name] = value
+
+    def stage_totals(self):
+        """
+        Aggregates the spans by name.
+
+        Returns:
+            dict: The category, count, total and maximum duration in seconds of each span name.
+        """
+        stages = {}
+        with self._lock:
+            events = list(self.events)
+        for name, category, start, end, _, _, _ in events:
+            stage = stages.setdefault(name, {'category': category, 'count': 0, 'total': 0.0, 'max': 0.0})
+            stage['count'] += 1
+            stage['total'] += end - start
+            stage['max'] = max(stage['max'], end - start)
+        return stages
+
+    def summary(self):
+        """
+        Builds the JSON summary of the run.
+
+        Returns:
+            dict: The wall time, the totals of every stage and metric, and the metrics of every item.
+        """
+        with self._lock:
+            items = {item: dict(metrics) for item, metrics in self.items.items()}
+        totals = {}
+        for metrics in items.values():
+            for name, value in metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[name] = totals.get(name, 0) + value
+        return {
+            'wall_time': time.perf_counter() - self.start_time,
+            'stages': self.stage_totals(),
+            'totals': totals,
+            'items': items,
+        }
+
+    def trace(self):
+        """
+        Builds the Chrome trace of the run.
+
+        Returns:
+            dict: The trace in the Trace Event Format, with one complete event per span.
+        """
+        pid = os.getpid()
+        trace_events = []
+        thread_names = {}
+        with self._lock:
+            events = list(self.events)
+        for name, category, start, end, tid, thread_name, args in events:
+            thread_names[tid] = thread_name
+            trace_events.append({
+                'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (start - self.start_time) * 1e6, 'dur': (end - start) * 1e6,
+                'args': {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+                         for key, value in args.items()},
+            })
+        for tid, thread_name in thread_names.items():
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path_prefix):
+        """
+        Writes the JSON summary to <path_prefix>.json and the Chrome trace to <path_prefix>.trace.json.
+
+        Args:
+            path_prefix (str): The path of the output files without extension.
+        """
+        try:
+            with open(path_prefix + '.json', 'w', encoding='utf-8') as file:
+                json.dump(self.summary(), file, indent=1)
+            with open(path_prefix + '.trace.json', 'w', encoding='utf-8') as file:
+                json.dump(self.trace(), file)
+            print(f"Profile written to {path_prefix}.json and {path_prefix}.trace.json")
+        except Exception as e:
+            print(f"Error writing profile {path_prefix}: {e}")
+
+    def print_report(self, top=10, base_dir=None):
+        """
+        Prints the time spent per stage, the slowest files and the top token consumers.
+
+        Args:
+            top (int, optional): The number of rows of each table. Defaults to 10.
+            base_dir (str, optional): Paths are shown relative to this directory. Defaults to None.
+        """
+        summary = self.summary()
+        items = summary['items']
+
+        def label(item):
+            if base_dir and os.path.isabs(item):
+                item = os.path.relpath(item, base_dir)
+            return item if len(item) <= 48 else "..." + item[-45:]
+
+        print(f"\nRun profile ({summary['wall_time']:.2f} s wall time)")
+        print(f"{'stage':<34} {'count':>7} {'total (s)':>10} {'max (s)':>8}")
+        for name, stage in sorted(summary['stages'].items(), key=lambda entry: -entry[1]['total']):
+            print(f"{name:<34} {stage['count']:>7} {stage['total']:>10.2f} {stage['max']:>8.2f}")
+
+        files = [(item, metrics) for item, metrics in items.items() if metrics.get('kind') == 'file']
+        files.sort(key=lambda entry: -(entry[1].get('read_time', 0) + entry[1].get('model_latency', 0)))
+        print(f"\nSlowest files")
+        print(f"{'file':<48} {'read (ms)':>9} {'KB':>7} {'model (s)':>9} {'requests':>8} {'retries':>7} {'cache':>7}")
+        for item, metrics in files[:top]:
+            if metrics.get('reused'):
+                cache = 'reused'
+            elif metrics.get('duplicate_of'):
+                cache = 'dup'
+            elif metrics.get('cache_hits') and not metrics.get('requests'):
+                cache = 'hit'
+            elif metrics.get('batched'):
+                cache = 'batched'
+            else:
+                cache = 'miss' if metrics.get('cache_misses') else '-'
+            print(f"{label(item):<48} {metrics.get('read_time', 0) * 1000:>9.1f} {metrics.get('bytes_read', 0) / 1024:>7.1f}"
+                  f" {metrics.get('model_latency', 0):>9.2f} {metrics.get('requests', 0):>8} {metrics.get('retries', 0):>7} {cache:>7}")
+
+        consumers = sorted(items.items(), key=lambda entry: -(entry[1].get('prompt_tokens', 0) + entry[1].get('response_tokens', 0)))
+        print(f"\nTop token consumers")
+        print(f"{'item':<48} {'kind':>6} {'prompt tok':>10} {'response tok':>12}")
+        for item, metrics in consumers[:top]:
+            if not metrics.get('prompt_tokens'):
+                break
+            print(f"{label(item):<48} {metrics.get('kind', ''):>6} {metrics.get('prompt_tokens', 0):>10} {metrics.get('response_tokens', 0):>12}")
+
+_profiler = None
+
+def get_profiler():
+    """
+    Returns the active profiler.
+
+    Returns:
+        Profiler: The active profiler, or None when the run is not profiled.
+    """
+    return _profiler
+
+def set_profiler(profiler):
+    """
+    Sets the profiler the instrumented code records to.
+
+    Args:
+        profiler (Profiler): The profiler, or None to stop profiling.
+    """
+    global _profiler
+    _profiler = profiler
+
+def profile_span(name, category, metric=None, **args):
+    """
+    Times the enclosed block with the active profiler, see Profiler.span. Does nothing when the run is not profiled.
+
+    Returns:
+        contextmanager: The span, yielding its args dict, or None when the run is not profiled.
+    """
+    if _profiler is None:
+        return _null_context
+    return _profiler.span(name, category, metric, **args)
+
+@contextmanager
+def profile_item(item, kind):
+    """
+    Makes an item the current item of the enclosed block, so that its spans and metrics are recorded against it.
+
+    Args:
+        item (str): The file or directory path, or "README".
+        kind (str): "file", "dir" or "readme".
+    """
+    if _profiler is None:
+        yield
+        return
+    _profiler.record(item, kind=kind)
+    token = _current_item.set(item)
+    try:
+        yield
+    finally:
+        _current_item.reset(token)
+
+def record(item=None, **metrics):
+    """
+    Adds metrics to an item with the active profiler, see Profiler.record. Does nothing when the run is not profiled.
+    """
+    if _profiler is not None:
+        _profiler.record(item, **metrics)
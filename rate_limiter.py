@@ -0,0 +1,173 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills continuously over time.
+
+    Attributes:
+        capacity (float): The maximum number of tokens the bucket can hold.
+        refill_rate (float): The number of tokens added to the bucket per second.
+        tokens (float): The number of tokens currently available.
+    """
+
+    def __init__(self, capacity, refill_rate):
+        """
+        Initializes a new TokenBucket instance, starting full.
+
+        Args:
+            capacity (float): The maximum number of tokens the bucket can hold.
+            refill_rate (float): The number of tokens added to the bucket per second.
+        """
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.refill_rate)
+        self._last = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until the requested amount of tokens is available and consumes it.
+
+        Requests larger than the bucket capacity are clamped to the capacity so that
+        they can still proceed once the bucket is full.
+
+        Args:
+            amount (float, optional): The number of tokens to consume. Defaults to 1.
+        """
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def try_acquire(self, amount=1):
+        """
+        Consumes the requested amount of tokens if it is available, without waiting.
+
+        Args:
+            amount (float, optional): The number of tokens to consume. Defaults to 1.
+
+        Returns:
+            bool: True if the tokens were consumed.
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def release(self, amount=1):
+        """
+        Gives back tokens consumed by a request that was not sent after all.
+
+        Args:
+            amount (float, optional): The number of tokens to give back. Defaults to 1.
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + min(float(amount), self.capacity))
+
+class RateLimiter:
+    """
+    Shared limiter for model calls enforcing requests-per-minute and tokens-per-minute quotas.
+
+    Either quota may be None, in which case it is not enforced.
+
+    Attributes:
+        requests (TokenBucket): The bucket limiting the number of requests, or None.
+        tokens (TokenBucket): The bucket limiting the number of prompt tokens, or None.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Initializes a new RateLimiter instance.
+
+        Args:
+            requests_per_minute (int, optional): Maximum requests per minute. Defaults to None (unlimited).
+            tokens_per_minute (int, optional): Maximum prompt tokens per minute. Defaults to None (unlimited).
+        """
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until one request carrying the given number of tokens may be sent.
+
+        Args:
+            tokens (int, optional): The estimated number of prompt tokens of the request. Defaults to 0.
+        """
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and tokens:
+            self.tokens.acquire(tokens)
+
+    def try_acquire(self, tokens=0):
+        """
+        Lets one request carrying the given number of tokens through if the quotas allow it now, without waiting.
+
+        Args:
+            tokens (int, optional): The estimated number of prompt tokens of the request. Defaults to 0.
+
+        Returns:
+            bool: True if the request may be sent.
+        """
+        if self.requests and not self.requests.try_acquire(1):
+            return False
+        if self.tokens and tokens and not self.tokens.try_acquire(tokens):
+            if self.requests:
+                self.requests.release(1)
+            return False
+        return True
+
+# The rate limiter the model requests of the current block are charged to, and their prompt tokens
+_request_budget = contextvars.ContextVar('request_budget', default=None)
+
+@contextmanager
+def request_budget(limiter, tokens=0):
+    """
+    Charges the model requests sent in the enclosed block to a rate limiter.
+
+    The retry layer of the backend acquires the limiter before every attempt, so retries and
+    hedged requests count against the quotas like first attempts.
+
+    Args:
+        limiter (RateLimiter): The rate limiter, or None for no limit.
+        tokens (int, optional): The estimated prompt tokens of each request. Defaults to 0.
+    """
+    token = _request_budget.set((limiter, tokens) if limiter else None)
+    try:
+        yield
+    finally:
+        _request_budget.reset(token)
+
+def acquire_request_budget(blocking=True):
+    """
+    Waits until the rate limiter of the current request_budget block lets one more request through.
+
+    Args:
+        blocking (bool, optional): Return False instead of waiting if the quotas are used up. Defaults to True.
+
+    Returns:
+        bool: True if the request may be sent, always True outside of a request_budget block.
+    """
+    budget = _request_budget.get()
+    if budget is None:
+        return True
+    limiter, tokens = budget
+    if not blocking:
+        return limiter.try_acquire(tokens)
+    limiter.acquire(tokens)
+    return True
@@ -0,0 +1,208 @@
+import json
+import re
+
+# Headings of these levels start a section, deeper headings stay inside their section
+SECTION_LEVELS = 2
+# The earlier feedback kept in edit prompts, and its length per turn
+MAX_FEEDBACK_NOTES = 5
+MAX_NOTE_CHARS = 500
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+
+ROUTING_INSTRUCTIONS = (
+    "A user reviewed a README and gave the feedback below. The README has the following sections:\n\n"
+    "{outline}\n\n"
+    "Feedback:\n{feedback}\n\n"
+    "Which sections have to change to follow the feedback? Answer with a JSON array of their numbers only, e.g. [2, 5]. "
+    "Answer [] if the feedback concerns the whole document, its structure, or sections that do not exist yet."
+)
+
+def split_sections(text):
+    """
+    Splits a Markdown document at its top-level headings.
+
+    Lines inside fenced code blocks are never taken for headings. The text before the first
+    heading, e.g. badges or a title image, is a section without a title.
+
+    Args:
+        text (str): The document.
+
+    Returns:
+        list: (title, text) pairs in document order, where the text includes the heading line.
+              Joining the texts gives back the document, without blank text before the first heading.
+    """
+    sections = []
+    title, lines = '', []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else _HEADING.match(line.rstrip('\n'))
+        if heading and len(heading.group(1)) <= SECTION_LEVELS:
+            if ''.join(lines).strip():
+                sections.append((title, ''.join(lines)))
+            title, lines = heading.group(2), []
+        lines.append(line)
+    if ''.join(lines).strip():
+        sections.append((title, ''.join(lines)))
+    return sections
+
+def join_sections(sections):
+    """
+    Joins sections back into a document, separating them with a blank line.
+
+    Args:
+        sections (list): (title, text) pairs.
+
+    Returns:
+        str: The document.
+    """
+    return '\n\n'.join(text.rstrip('\n') for _, text in sections) + '\n'
+
+def outline(sections):
+    """
+    Lists the sections of a document as a numbered outline.
+
+    Args:
+        sections (list): (title, text) pairs.
+
+    Returns:
+        str: One "number. title" line per section, numbered from 1.
+    """
+    return '\n'.join(f"{index}. {title or '(introduction, before the first heading)'}" for index, (title, _) in enumerate(sections, 1))
+
+def build_routing_prompt(sections, feedback):
+    """
+    Builds the prompt asking which sections a feedback applies to. It carries the section titles only.
+
+    Args:
+        sections (list): (title, text) pairs.
+        feedback (str): The feedback of the user.
+
+    Returns:
+        str: The prompt.
+    """
+    return ROUTING_INSTRUCTIONS.format(outline=outline(sections), feedback=feedback)
+
+def parse_routing_response(response, section_count):
+    """
+    Reads the section numbers out of the answer to a routing prompt.
+
+    Args:
+        response (str): The model response.
+        section_count (int): The number of sections of the document.
+
+    Returns:
+        list: The indices of the sections to regenerate, sorted and starting at 0, or None if the
+              whole document has to be rewritten: the answer is empty, cannot be parsed or names
+              a section that does not exist.
+    """
+    match = re.search(r'\[[^\[\]]*\]', response)
+    if not match:
+        return None
+    try:
+        numbers = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not numbers or not all(isinstance(number, int) and 1 <= number <= section_count for number in numbers):
+        return None
+    return sorted({number - 1 for number in numbers})
+
+def format_notes(notes):
+    """
+    Formats the earlier feedback of the user, which every edit has to keep respecting.
+
+    Args:
+        notes (list): The earlier feedback, oldest first.
+
+    Returns:
+        str: A paragraph listing the feedback, or "" without earlier feedback.
+    """
+    if not notes:
+        return ""
+    return "Earlier feedback, already applied and still to be respected:\n" + '\n'.join(f"- {note}" for note in notes) + "\n\n"
+
+def format_structure(structure):
+    """
+    Formats the summary of the repository root, so that edits can add facts about the code.
+
+    Args:
+        structure (str): The summary of the repository root, bounded by the directory token budget.
+
+    Returns:
+        str: A paragraph with the summary, or "" without one.
+    """
+    if not structure:
+        return ""
+    return f"Structure of the repository:\n{structure}\n\n"
+
+def build_section_prompt(sections, index, feedback, notes, structure=""):
+    """
+    Builds the prompt regenerating one section of a README.
+
+    Args:
+        sections (list): (title, text) pairs of the README.
+        index (int): The index of the section to regenerate.
+        feedback (str): The feedback of the user.
+        notes (list): The earlier feedback, oldest first.
+        structure (str, optional): The summary of the repository root. Defaults to "".
+
+    Returns:
+        str: The prompt, carrying the repository summary, the outline of the README and the text of that section only.
+    """
+    return (f"{format_structure(structure)}"
+            f"You are revising one section of a README. The README has the following sections:\n\n{outline(sections)}\n\n"
+            f"{format_notes(notes)}"
+            f"Based on the following feedback, please improve section {index + 1}:\n{feedback}\n\n"
+            f"Current text of section {index + 1}:\n\n{sections[index][1]}\n\n"
+            "Answer with the revised section in Markdown, starting with its heading if it has one, and nothing else. "
+            "Do not repeat the content of the other sections.")
+
+def build_rewrite_prompt(readme, feedback, notes, structure=""):
+    """
+    Builds the prompt rewriting a whole README, without the initial prompt or the earlier drafts.
+
+    Args:
+        readme (str): The current README.
+        feedback (str): The feedback of the user.
+        notes (list): The earlier feedback, oldest first.
+        structure (str, optional): The summary of the repository root. Defaults to "".
+
+    Returns:
+        str: The prompt.
+    """
+    return (f"{format_structure(structure)}Current README:\n\n{readme}\n\n{format_notes(notes)}"
+            f"Based on the following feedback, please improve the README:\n{feedback}\n\n"
+            "Answer with the complete revised README in Markdown and nothing else.")
+
+def clean_section(response, section):
+    """
+    Prepares a regenerated section for splicing into the README.
+
+    Args:
+        response (str): The model response.
+        section (tuple): The (title, text) pair of the section being replaced.
+
+    Returns:
+        str: The response without a surrounding Markdown code fence, or the original text if the response is empty.
+    """
+    text = response.strip()
+    fenced = re.match(r'^```(?:markdown|md)?\s*\n(.*?)\n```$', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    return text + '\n' if text else section[1]
+
+def add_note(notes, feedback):
+    """
+    Remembers a feedback for the following edits, keeping only the latest ones, shortened.
+
+    Args:
+        notes (list): The earlier feedback, oldest first, updated in place.
+        feedback (str): The feedback of the user.
+    """
+    note = ' '.join(feedback.split())
+    if len(note) > MAX_NOTE_CHARS:
+        note = note[:MAX_NOTE_CHARS - 3] + '...'
+    notes.append(note)
+    del notes[:-MAX_FEEDBACK_NOTES]
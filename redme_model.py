@@ -1,84 +1,187 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
+import contextvars
 import os
-
-load_dotenv()
-api_key = os.environ['GOOGLE_API_KEY']
-
-with open('readme-sys-prpt.txt', 'r') as file:
+import time
+from concurrent.futures import ThreadPoolExecutor
+from model_client import get_client
+from readme_sections import split_sections, join_sections, build_routing_prompt, parse_routing_response, build_section_prompt, \
+    build_rewrite_prompt, clean_section, add_note
+from profiler import profile_span, profile_item, record
+from utils import estimate_tokens
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'readme-sys-prpt.txt'), 'r') as file:
     sys_prpt = file.read()
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-pro', system_instruction=sys_prpt)
+model_name = 'gemini-1.5-pro'
+
+# Picking the sections a feedback applies to only needs their titles and a fast model
+router_model_name = 'gemini-1.5-flash'
+router_sys_prpt = "You route feedback on a README to the sections it applies to. You answer with a JSON array only."
+get_client().register('readme', model_name, sys_prpt)
+get_client().register('readme_router', router_model_name, router_sys_prpt)
 
 class ReadmeGenerator:
     """
     A class to generate README files using the Gemini 1.5 Pro model.
 
+    Responses are streamed, so that a caller can write the README while it is generated.
+    There is no chat history: each feedback turn sends the current README, or only the
+    sections the feedback applies to, with a short list of the earlier feedback and the
+    summary of the repository root. The prompts therefore stay the size of the README
+    instead of growing with every turn, and the description and existing README of the
+    initial prompt are only sent once.
+
     Attributes:
-        chat (genai.Chat): The chat instance for interacting with the model.
+        readme (str): The current README, "" before the first one was generated.
+        structure (str): The summary of the repository root, sent with every feedback turn.
+        notes (list): The latest feedback of the user, oldest first.
+        section_edits (bool): Whether feedback only regenerates the sections it applies to.
+        sections_regenerated (int): The number of sections regenerated by section edits.
+        full_rewrites (int): The number of feedback turns that rewrote the whole README.
     """
 
-    def __init__(self):
+    def __init__(self, section_edits=True):
         """
         Initializes the ReadmeGenerator instance.
 
-        Creates a new chat instance with the Gemini 1.5 Pro model.
+        Args:
+            section_edits (bool, optional): Regenerate only the sections a feedback applies to,
+                instead of the whole README. Defaults to True.
         """
-        self.chat = model.start_chat(history=[])
-
-    def generate_readme(self, prompt: str) -> str:
+        self.readme = ""
+        self.structure = ""
+        self.notes = []
+        self.section_edits = section_edits
+        self.sections_regenerated = 0
+        self.full_rewrites = 0
+
+    def generate_readme(self, prompt: str, on_text=None, structure: str = "") -> str:
         """
         Generates a README file based on the given prompt.
 
         Args:
             prompt (str): The prompt to generate the README file.
+            on_text (callable, optional): Called with each piece of the README as it is generated. Defaults to None.
+            structure (str, optional): The summary of the repository root, kept for the feedback turns. Defaults to "".
 
         Returns:
             str: The generated README file content.
 
         """
-        response = self.chat.send_message(prompt)
-        return response.text
+        self.readme = self._stream('generate_readme', prompt, on_text)
+        self.structure = structure
+        self.notes = []
+        return self.readme
 
-    def provide_feedback(self, feedback: str) -> str:
+    def provide_feedback(self, feedback: str, on_text=None) -> str:
         """
         Provides feedback to the model for the generated README file.
 
+        With section edits, the model first picks the sections the feedback applies to from
+        their titles. Only these are regenerated, concurrently, and spliced back into the
+        README. Feedback about the whole document, or that cannot be routed, rewrites it.
+
         Args:
             feedback (str): The feedback to provide to the model.
+            on_text (callable, optional): Called with each piece of the new README, in order. Defaults to None.
 
         Returns:
             str: The response from the model after providing feedback.
 
         """
-        response = self.chat.send_message(feedback)
-        return response.text
+        sections = split_sections(self.readme)
+        targets = self._route(sections, feedback) if self.section_edits and len(sections) > 1 else None
+        if targets is None:
+            self.full_rewrites += 1
+            readme = self._stream('provide_feedback', build_rewrite_prompt(self.readme, feedback, self.notes, self.structure), on_text)
+        else:
+            readme = self._edit_sections(sections, targets, feedback, on_text)
+        add_note(self.notes, feedback)
+        self.readme = readme
+        return readme
+
+    def _route(self, sections, feedback):
+        try:
+            response = self._send('route_feedback', 'readme_router', build_routing_prompt(sections, feedback))
+        except Exception as e:
+            print(f"Could not select the sections to edit, rewriting the whole README: {e}")
+            return None
+        return parse_routing_response(response, len(sections))
+
+    def _edit_sections(self, sections, targets, feedback, on_text):
+        prompts = {index: build_section_prompt(sections, index, feedback, self.notes, self.structure) for index in targets}
+        self.sections_regenerated += len(targets)
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = {index: executor.submit(contextvars.copy_context().run, self._send, 'edit_section', 'readme', prompt)
+                       for index, prompt in prompts.items()}
+            # Sections are emitted in order: unchanged ones at once, edited ones as soon as they and those before them are done
+            edited = []
+            for index, section in enumerate(sections):
+                if index in futures:
+                    section = (section[0], clean_section(futures[index].result(), section))
+                edited.append(section)
+                if on_text:
+                    on_text(('\n\n' if index else '') + section[1].rstrip('\n') + ('\n' if index == len(sections) - 1 else ''))
+        return join_sections(edited)
+
+    def _send(self, name, role, prompt):
+        with profile_item('README', 'readme'), profile_span(name, 'readme', metric='model_latency'):
+            response = get_client().generate(role, prompt)
+            record(requests=1, prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
+        return response
+
+    def _stream(self, name, prompt, on_text):
+        pieces = []
+        with profile_item('README', 'readme'), profile_span(name, 'readme', metric='model_latency'):
+            start = time.perf_counter()
+            for piece in get_client().generate_stream('readme', prompt):
+                if not pieces:
+                    record(time_to_first_text=time.perf_counter() - start)
+                pieces.append(piece)
+                if on_text and piece:
+                    on_text(piece)
+            response = ''.join(pieces)
+            record(requests=1, prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(response))
+        return response
+
+readme_generator = None
+
+def get_readme_generator():
+    """
+    Returns the shared ReadmeGenerator, creating it on first use.
 
-readme_generator = ReadmeGenerator()
+    Returns:
+        ReadmeGenerator: The shared instance.
+    """
+    global readme_generator
+    if readme_generator is None:
+        readme_generator = ReadmeGenerator()
+    return readme_generator
 
-def get_final_response(prompt: str) -> str:
+def get_final_response(prompt: str, on_text=None, structure: str = "") -> str:
     """
     Generates a README file based on the given prompt.
 
     Args:
         prompt (str): The prompt to generate the README file.
+        on_text (callable, optional): Called with each piece of the README as it is generated. Defaults to None.
+        structure (str, optional): The summary of the repository root, kept for the feedback turns. Defaults to "".
 
     Returns:
         str: The generated README file content.
 
     """
-    return readme_generator.generate_readme(prompt)
+    return get_readme_generator().generate_readme(prompt, on_text, structure)
 
-def update_with_feedback(feedback: str) -> str:
+def update_with_feedback(feedback: str, on_text=None) -> str:
     """
     Provides feedback to the model for the generated README file.
 
     Args:
         feedback (str): The feedback to provide to the model.
+        on_text (callable, optional): Called with each piece of the new README, in order. Defaults to None.
 
     Returns:
         str: The response from the model after providing feedback.
 
     """
-    return readme_generator.provide_feedback(feedback)
\ No newline at end of file
+    return get_readme_generator().provide_feedback(feedback, on_text)
\ No newline at end of file
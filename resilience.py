@@ -0,0 +1,344 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from backends import ModelBackend, RateLimitError, PermanentError
+from profiler import profile_span, record
+from rate_limiter import acquire_request_budget
+
+class AdaptiveConcurrency:
+    """
+    A concurrency limit adjusted AIMD-style from the outcome of model calls.
+
+    The limit grows by one slot per limit's worth of successful calls, and is halved when
+    the API answers with a rate limit error. It is also reduced by a tenth when the smoothed
+    latency rises well above the best latency seen, which is how an overloaded endpoint
+    shows up before it starts rejecting requests. Decreases are at most once per cooldown
+    so that a burst of failures from the same window only counts once.
+
+    The limit never grows above its maximum, which defaults to the starting limit: recovery
+    after a decrease climbs back to the starting value at most, it does not probe beyond it.
+
+    Attributes:
+        limit (float): The current concurrency limit.
+        minimum (int): The lowest limit.
+        maximum (int): The highest limit.
+        in_flight (int): The number of calls currently holding a slot.
+        latency_tolerance (float): The ratio of smoothed to best latency treated as overload.
+        cooldown (float): The minimum number of seconds between two decreases.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=None, latency_tolerance=3.0, cooldown=1.0):
+        """
+        Initializes a new AdaptiveConcurrency instance.
+
+        Args:
+            initial (int, optional): The starting limit. Defaults to 8.
+            minimum (int, optional): The lowest limit. Defaults to 1.
+            maximum (int, optional): The highest limit. Defaults to the starting limit.
+            latency_tolerance (float, optional): The latency ratio treated as overload. Defaults to 3.0.
+            cooldown (float, optional): The minimum seconds between two decreases. Defaults to 1.0.
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._smoothed_latency = None
+        self._best_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, blocking=True):
+        """
+        Takes a slot, waiting for one to free up if the limit is reached.
+
+        Args:
+            blocking (bool, optional): Whether to wait for a slot. Defaults to True.
+
+        Returns:
+            bool: True if a slot was taken.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, rate_limited=False):
+        """
+        Frees a slot and adjusts the limit from the outcome of the call.
+
+        Args:
+            latency (float, optional): The latency of a successful call in seconds. Defaults to None.
+            rate_limited (bool, optional): Whether the call was rejected with a rate limit error. Defaults to False.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._adjust(latency, rate_limited)
+            self._condition.notify_all()
+
+    def observe(self, latency=None, rate_limited=False):
+        """
+        Adjusts the limit from the outcome of a call that did not hold a slot.
+
+        Args:
+            latency (float, optional): The latency of a successful call in seconds. Defaults to None.
+            rate_limited (bool, optional): Whether the call was rejected with a rate limit error. Defaults to False.
+        """
+        with self._condition:
+            self._adjust(latency, rate_limited)
+
+    def _adjust(self, latency, rate_limited):
+        now = time.monotonic()
+        if rate_limited:
+            self._decrease(now, 0.5)
+        elif latency is not None:
+            self._smoothed_latency = latency if self._smoothed_latency is None else 0.8 * self._smoothed_latency + 0.2 * latency
+            self._best_latency = self._smoothed_latency if self._best_latency is None else min(self._best_latency, self._smoothed_latency)
+            if self._smoothed_latency > self.latency_tolerance * self._best_latency:
+                self._decrease(now, 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def _decrease(self, now, factor):
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit * factor)
+            self._last_decrease = now
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the most recent successful calls to estimate percentiles.
+
+    Attributes:
+        samples (deque): The recent latencies in seconds.
+    """
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def percentile(self, percent, min_samples=20):
+        """
+        Returns a latency percentile, or None until enough calls were observed.
+
+        Args:
+            percent (float): The percentile, between 0 and 100.
+            min_samples (int, optional): The number of samples required. Defaults to 20.
+
+        Returns:
+            float: The latency in seconds, or None.
+        """
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+class ResilientBackend(ModelBackend):
+    """
+    Wraps a backend with retries, adaptive concurrency and hedged requests.
+
+    Every model call of the code reader, directory and README models goes through the active
+    backend, so wrapping it gives all three the same call layer:
+
+    - Failed calls are retried with exponential backoff and full jitter. A rate limit error
+      waits at least the retry-after delay suggested by the API. Permanent errors (invalid
+      requests, missing credentials) are raised immediately.
+    - The number of calls in flight is limited by an AdaptiveConcurrency, so throughput
+      settles at the quota instead of turning most calls into rate limit errors. The starting
+      concurrency is also its ceiling.
+    - Every attempt, including retries and hedges, is charged to the rate limiter of the
+      enclosing request_budget block.
+    - Optionally, a stateless request still running after the given latency percentile is
+      sent a second time and the first answer wins. Chat messages are never hedged, since
+      sending one twice would duplicate it in the chat history. Streamed requests are not
+      hedged either, and are only retried until their first piece arrives.
+
+    Attributes:
+        backend (ModelBackend): The wrapped backend.
+        concurrency (AdaptiveConcurrency): The concurrency limit.
+        latencies (LatencyTracker): The recent call latencies.
+        max_retries (int): The number of retries after the first attempt.
+        base_delay (float): The backoff delay of the first retry in seconds.
+        max_delay (float): The maximum backoff delay in seconds.
+        hedge_percentile (float): The latency percentile after which a request is hedged, or None.
+        retries (int): The number of retries.
+        rate_limited (int): The number of rate limit errors.
+        hedges (int): The number of hedged requests sent.
+        hedge_wins (int): The number of hedged requests answered before the original.
+    """
+
+    def __init__(self, backend, concurrency=8, max_retries=5, base_delay=0.5, max_delay=60.0, hedge_percentile=None, seed=None):
+        """
+        Initializes a new ResilientBackend instance.
+
+        Args:
+            backend (ModelBackend): The backend to wrap.
+            concurrency (int, optional): The starting and maximum concurrency limit. Defaults to 8.
+            max_retries (int, optional): The number of retries after the first attempt. Defaults to 5.
+            base_delay (float, optional): The backoff delay of the first retry in seconds. Defaults to 0.5.
+            max_delay (float, optional): The maximum backoff delay in seconds. Defaults to 60.0.
+            hedge_percentile (float, optional): Hedge requests slower than this latency percentile. Defaults to None (no hedging).
+            seed (int, optional): The seed of the jitter. Defaults to None.
+        """
+        self.backend = backend
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self.latencies = LatencyTracker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.retries = 0
+        self.rate_limited = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._hedge_executor = None
+        self._hedges_in_flight = 0
+
+    def generate(self, model_name, system_prompt, prompt):
+        return self.call(lambda: self.backend.generate(model_name, system_prompt, prompt), hedge=bool(self.hedge_percentile))
+
+    def generate_stream(self, model_name, system_prompt, prompt):
+        # Only the wait for the first piece is retried, the pieces after it have already been shown
+        def start():
+            stream = iter(self.backend.generate_stream(model_name, system_prompt, prompt))
+            return stream, next(stream, '')
+
+        stream, first = self.call(start)
+        yield first
+        yield from stream
+
+    def start_chat(self, model_name, system_prompt):
+        return ResilientChat(self, self.backend.start_chat(model_name, system_prompt))
+
+    def call(self, fn, hedge=False):
+        """
+        Calls a model function under the concurrency limit, retrying failures.
+
+        Args:
+            fn (callable): The call, without arguments.
+            hedge (bool, optional): Whether the call may be sent twice. Defaults to False.
+
+        Returns:
+            object: The result of the call.
+        """
+        attempt = 0
+        while True:
+            # Every attempt is charged to the rate limiter, a retry after a 429 most of all
+            with profile_span('rate_limiter', 'wait', metric='rate_limit_wait'):
+                acquire_request_budget()
+            self.concurrency.acquire()
+            start = time.monotonic()
+            try:
+                result = self._hedged(fn) if hedge else fn()
+            except PermanentError:
+                self.concurrency.release()
+                raise
+            except RateLimitError as e:
+                self.concurrency.release(rate_limited=True)
+                with self._lock:
+                    self.rate_limited += 1
+                error, delay = e, max((e.retry_after or 0) * self._random.uniform(1, 1.2), self._backoff(attempt))
+            except Exception as e:
+                self.concurrency.release()
+                error, delay = e, self._backoff(attempt)
+            else:
+                latency = time.monotonic() - start
+                self.concurrency.release(latency)
+                self.latencies.add(latency)
+                return result
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            record(retries=1)
+            time.sleep(min(delay, self.max_delay))
+
+    def _backoff(self, attempt):
+        # Full jitter spreads the retries of calls that failed together
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _hedged(self, fn):
+        threshold = self.latencies.percentile(self.hedge_percentile)
+        if threshold is None:
+            return fn()
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.concurrency.maximum, thread_name_prefix='hedge')
+        primary = self._hedge_executor.submit(fn)
+        try:
+            return primary.result(timeout=threshold)
+        except FutureTimeoutError:
+            pass
+        # Hedges are bounded to a quarter of the limit on top of it, and stop once the limit was
+        # lowered, since there is no point in hedging an endpoint that is already overloaded
+        with self._lock:
+            allowed = self._hedges_in_flight < max(1, self.concurrency.maximum // 4) and self.concurrency.limit >= self.concurrency.maximum
+            # A hedge is a request of its own, it is only sent if the quotas allow it right away
+            allowed = allowed and acquire_request_budget(blocking=False)
+            if allowed:
+                self._hedges_in_flight += 1
+                self.hedges += 1
+        if not allowed:
+            return primary.result()
+        hedge = self._hedge_executor.submit(fn)
+        hedge.add_done_callback(self._hedge_done)
+
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        for future in (primary, hedge):
+            if future in done and future.exception() is None:
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return future.result()
+        # The first answer was an error, wait for the other one
+        other = hedge if primary in done else primary
+        if other.exception() is None:
+            return other.result()
+        return primary.result()
+
+    def _hedge_done(self, future):
+        with self._lock:
+            self._hedges_in_flight -= 1
+        if isinstance(future.exception(), RateLimitError):
+            self.concurrency.observe(rate_limited=True)
+
+    def stats(self):
+        """
+        Returns the call layer counters.
+
+        Returns:
+            dict: The retry, rate limit and hedging counters and the current concurrency limit.
+        """
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'concurrency_limit': round(self.concurrency.limit, 1),
+            }
+
+class ResilientChat:
+    """
+    A chat session whose messages are retried by a ResilientBackend, without hedging.
+    """
+
+    def __init__(self, backend, chat):
+        self.backend = backend
+        self.chat = chat
+
+    def send_message(self, prompt):
+        return self.backend.call(lambda: self.chat.send_message(prompt))
@@ -0,0 +1,126 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class DependencyError(Exception):
+    """
+    Recorded for a task that was not run because one of its dependencies failed.
+    """
+
+class DagScheduler:
+    """
+    Runs a graph of tasks, starting each task as soon as all of its dependencies are done.
+
+    Tasks are either "io" tasks (disk reads, parsing) or "model" tasks (model requests),
+    and each kind runs on its own thread pool so that local I/O overlaps with in-flight
+    model calls instead of waiting behind them. Tasks run in a copy of the context of the
+    thread calling run, so context variables set by the caller hold in every task.
+
+    Attributes:
+        io_workers (int): The number of threads running io tasks.
+        model_workers (int): The number of threads running model tasks.
+        results (dict): The results of the finished tasks, keyed by task name.
+        errors (dict): The exceptions of the failed tasks, keyed by task name.
+    """
+
+    def __init__(self, io_workers=4, model_workers=8):
+        """
+        Initializes a new DagScheduler instance.
+
+        Args:
+            io_workers (int, optional): The number of threads running io tasks. Defaults to 4.
+            model_workers (int, optional): The number of threads running model tasks. Defaults to 8.
+        """
+        self.io_workers = max(1, io_workers)
+        self.model_workers = max(1, model_workers)
+        self.results = {}
+        self.errors = {}
+        self._tasks = {}
+        self._order = []
+
+    def add(self, name, fn, deps=(), kind='model'):
+        """
+        Adds a task to the graph. Its dependencies must have been added before it.
+
+        Args:
+            name (hashable): The unique name of the task.
+            fn (callable): The function of the task, called with the results of its dependencies in order.
+            deps (iterable, optional): The names of the tasks it depends on. Defaults to ().
+            kind (str, optional): "io" or "model", selecting the thread pool. Defaults to 'model'.
+
+        Returns:
+            hashable: The name of the task.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self._tasks:
+                raise ValueError(f"Task {name} depends on unknown task {dep}")
+        if kind not in ('io', 'model'):
+            raise ValueError(f"Unknown task kind: {kind}")
+        self._tasks[name] = (fn, deps, kind)
+        self._order.append(name)
+        return name
+
+    def run(self, on_done=None):
+        """
+        Runs every task of the graph.
+
+        Args:
+            on_done (callable, optional): Called with the name of each task when it finishes or fails. Defaults to None.
+
+        Returns:
+            dict: The results of the successful tasks, keyed by task name. Failures are recorded in errors.
+        """
+        remaining = {}
+        dependents = {}
+        for name in self._order:
+            _, deps, _ = self._tasks[name]
+            remaining[name] = len(set(deps))
+            for dep in set(deps):
+                dependents.setdefault(dep, []).append(name)
+
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool, \
+                ThreadPoolExecutor(max_workers=self.model_workers) as model_pool:
+            pools = {'io': io_pool, 'model': model_pool}
+            futures = {}
+
+            def start(name):
+                fn, deps, kind = self._tasks[name]
+                futures[pools[kind].submit(context.copy().run, fn, *[self.results[dep] for dep in deps])] = name
+
+            def finish(name, result=None, error=None):
+                # Iterative so that long chains of skipped tasks do not recurse
+                pending = [(name, result, error)]
+                while pending:
+                    name, result, error = pending.pop()
+                    if error is None:
+                        self.results[name] = result
+                    else:
+                        self.errors[name] = error
+                    if on_done:
+                        on_done(name)
+                    for dependent in dependents.get(name, []):
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            failed = [dep for dep in self._tasks[dependent][1] if dep in self.errors]
+                            if failed:
+                                pending.append((dependent, None, DependencyError(f"{dependent} was skipped because {failed[0]} failed")))
+                            else:
+                                start(dependent)
+
+            for name in self._order:
+                if remaining[name] == 0:
+                    start(name)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        finish(name, error=e)
+                    else:
+                        finish(name, result=result)
+        return self.results
@@ -0,0 +1,272 @@
+import ast
+import os
+import re
+
+# The longest docstring summary and expression kept in a skeleton, and the most callees listed per function
+DOCSTRING_CHARS = 300
+EXPRESSION_CHARS = 80
+MAX_CALLS = 12
+# Control flow is outlined down to this nesting depth inside a function
+FLOW_DEPTH = 2
+# Larger Python sources are outlined line by line, a syntax tree of them takes seconds and hundreds of MB
+AST_MAX_CHARS = 256 * 1024
+
+SKELETON_HEADER = "# Outline: imports, signatures, docstrings and control flow. Function bodies are omitted.\n"
+
+_BRACE_LANGUAGES = {'.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.java', '.kt', '.kts', '.scala', '.cs', '.go', '.rs', '.swift',
+                    '.c', '.h', '.cc', '.cpp', '.cxx', '.hpp', '.hh', '.m', '.php', '.dart'}
+_INDENT_LANGUAGES = {'.rb'}
+SKELETON_EXTENSIONS = _BRACE_LANGUAGES | _INDENT_LANGUAGES | {'.py', '.pyw', '.pyi'}
+
+# Declarations of indentation-based languages, kept by the line outline
+_DECLARATION_LINE = re.compile(r'^\s*(?:import\b|from\s+\S+\s+import\b|require(?:_relative)?\b|include\b|extend\b|attr_\w+\b|'
+                               r'(?:async\s+)?def\b|class\b|module\b)')
+# A block opened after these is a function body, after anything else a class, namespace, type or object literal
+_BODY_HEADER = re.compile(r'(?:\)[^()]*|=>|->.*|\b(?:else|try|do|finally|static|init|get|set|constructor|fn\s.*))\s*$')
+_CONTAINER_KEYWORD = re.compile(r'\b(?:class|interface|enum|struct|union|trait|impl|namespace|module|object|record|protocol|extension|extern|mod)\b')
+_KEPT_DIRECTIVE = re.compile(r'^\s*#\s*(?:include|import|define)\b')
+_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|/\*.*?\*/|//.*$')
+MAX_LINE_CHARS = 200
+MAX_COMMENT_LINES = 3
+
+def _short(node, limit=EXPRESSION_CHARS):
+    text = ast.unparse(node).replace('\n', ' ')
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+def _docstring(node, indent):
+    # The first paragraph summarizes, the Args and Returns sections mostly repeat the signature
+    doc = (ast.get_docstring(node) or '').strip().split('\n\n')[0].strip()
+    if not doc:
+        return []
+    if len(doc) > DOCSTRING_CHARS:
+        doc = doc[:DOCSTRING_CHARS].rstrip() + '...'
+    lines = doc.replace('"""', "'''").splitlines()
+    if len(lines) == 1:
+        return [f'{indent}"""{lines[0]}"""']
+    return [f'{indent}"""{lines[0]}'] + [f'{indent}{line}' if line else '' for line in lines[1:]] + [f'{indent}"""']
+
+def _calls(node):
+    # The functions a body calls, in order of first use, say more about its logic than its statements
+    names = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            try:
+                name = ast.unparse(child.func)
+            except Exception:
+                continue
+            if len(name) <= 40 and '(' not in name and name not in names:
+                names.append(name)
+    return names
+
+def _outline_flow(statements, indent, depth):
+    # The headers of compound statements and the exits of a body, without the straight-line code in between
+    lines = []
+    for statement in statements:
+        if isinstance(statement, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try, ast.Match)) or \
+           (hasattr(ast, 'TryStar') and isinstance(statement, ast.TryStar)):
+            if isinstance(statement, ast.If):
+                header = f"if {_short(statement.test)}:"
+            elif isinstance(statement, (ast.For, ast.AsyncFor)):
+                header = f"{'async ' if isinstance(statement, ast.AsyncFor) else ''}for {_short(statement.target)} in {_short(statement.iter)}:"
+            elif isinstance(statement, ast.While):
+                header = f"while {_short(statement.test)}:"
+            elif isinstance(statement, (ast.With, ast.AsyncWith)):
+                header = f"{'async ' if isinstance(statement, ast.AsyncWith) else ''}with {', '.join(_short(item) for item in statement.items)}:"
+            elif isinstance(statement, ast.Match):
+                header = f"match {_short(statement.subject)}:"
+            else:
+                header = "try:"
+            lines.append(indent + header)
+            if depth < FLOW_DEPTH:
+                nested = _outline_flow(getattr(statement, 'body', []), indent + '    ', depth + 1)
+                lines += nested or [indent + '    ...']
+            else:
+                lines.append(indent + '    ...')
+            for handler in getattr(statement, 'handlers', []):
+                lines.append(f"{indent}except{' ' + _short(handler.type) if handler.type else ''}:")
+            if isinstance(statement, ast.If) and statement.orelse:
+                lines.append(indent + "else:")
+                lines.append(indent + '    ...')
+        elif isinstance(statement, (ast.Return, ast.Raise, ast.Yield)) or \
+                (isinstance(statement, ast.Expr) and isinstance(statement.value, (ast.Yield, ast.YieldFrom, ast.Await))):
+            lines.append(indent + _short(statement))
+        elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            lines += _outline_definition(statement, indent)
+    return lines
+
+def _outline_definition(node, indent):
+    lines = [f"{indent}@{_short(decorator)}" for decorator in node.decorator_list]
+    if isinstance(node, ast.ClassDef):
+        bases = [_short(base) for base in node.bases] + [_short(keyword) for keyword in node.keywords]
+        lines.append(f"{indent}class {node.name}{'(' + ', '.join(bases) + ')' if bases else ''}:")
+        lines += _docstring(node, indent + '    ')
+        for statement in node.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                lines += _outline_definition(statement, indent + '    ')
+            elif isinstance(statement, (ast.Assign, ast.AnnAssign)):
+                lines.append(indent + '    ' + _short(statement))
+        return lines
+    prefix = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+    returns = f" -> {_short(node.returns)}" if node.returns else ''
+    lines.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+    body = _docstring(node, indent + '    ')
+    calls = _calls(node)
+    if calls:
+        body.append(f"{indent}    # calls: {', '.join(calls[:MAX_CALLS])}{', ...' if len(calls) > MAX_CALLS else ''}")
+    body += _outline_flow(node.body, indent + '    ', 1)
+    return lines + (body or [indent + '    ...'])
+
+def python_skeleton(text):
+    """
+    Outlines a Python module with its syntax tree.
+
+    Args:
+        text (str): The source code.
+
+    Returns:
+        str: The module docstring, imports, constants, class and function signatures with their
+             docstrings, the functions each one calls and its control flow, or "" if there are none.
+
+    Raises:
+        SyntaxError: If the source cannot be parsed, e.g. because it was truncated.
+    """
+    tree = ast.parse(text)
+    lines = _docstring(tree, '')
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            lines.append(ast.unparse(statement))
+        elif isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            lines += [''] + _outline_definition(statement, '')
+        elif isinstance(statement, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            lines.append(_short(statement))
+        elif isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+            lines.append(_short(statement))
+        else:
+            # Module-level control flow, e.g. the "if __name__ == '__main__':" block
+            flow = _outline_flow([statement], '', 1)
+            if flow:
+                lines += [''] + flow
+    return '\n'.join(lines).strip() + '\n' if lines else ''
+
+def brace_skeleton(text):
+    """
+    Outlines a source file of a language with braces, e.g. JavaScript, TypeScript, Java, C, C++, C#, Go or Rust.
+
+    Every line outside function bodies is kept: imports, type and class declarations with
+    their fields, and function signatures, also those spanning several lines. A block is a
+    function body when the text before its opening brace ends like a parameter list or an
+    arrow, and a class, namespace, type or object literal otherwise. Within a body, only the
+    lines opening a block at its first level are kept, which outlines its control flow and
+    the functions nested in closures. Comment blocks are cut to their first lines.
+
+    Args:
+        text (str): The source code.
+
+    Returns:
+        str: The kept lines, or "" if there are none.
+    """
+    lines = []
+    # The kind of every open block, and the text since the last statement or block boundary
+    blocks, header = [], ''
+    in_comment, comment_lines = False, 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        outside = 'body' not in blocks
+        first_level = blocks.count('body') == 1 and blocks[-1] == 'body'
+        if in_comment or stripped.startswith(('/*', '//', '*')):
+            in_comment = (in_comment or stripped.startswith('/*')) and '*/' not in stripped
+            if outside and comment_lines < MAX_COMMENT_LINES:
+                lines.append(line.rstrip()[:MAX_LINE_CHARS])
+            comment_lines += 1
+            continue
+        comment_lines = 0
+        if stripped.startswith('#'):
+            if outside and _KEPT_DIRECTIVE.match(line):
+                lines.append(line.rstrip()[:MAX_LINE_CHARS])
+            continue
+        code = _STRING_OR_COMMENT.sub('""', line)
+        if '/*' in code:
+            code, in_comment = code[:code.index('/*')], True
+        for char in code:
+            if char == '{':
+                # Blocks inside a body are all code, whatever they look like
+                body = 'body' in blocks or (_BODY_HEADER.search(header.strip()) and not _CONTAINER_KEYWORD.search(header))
+                blocks.append('body' if body else 'container')
+                header = ''
+            elif char == '}':
+                if blocks:
+                    blocks.pop()
+                header = ''
+            elif char == ';':
+                header = ''
+            else:
+                header += char
+        opens_body = len(blocks) > 0 and blocks[-1] == 'body' and line.rstrip().endswith('{')
+        if stripped and (outside or first_level and opens_body and blocks.count('body') == 2):
+            lines.append(line.rstrip()[:MAX_LINE_CHARS] + (' ... }' if opens_body else ''))
+    return '\n'.join(lines).strip() + '\n' if lines else ''
+
+def line_skeleton(text):
+    """
+    Outlines a source file of a language with indentation or "end" blocks, e.g. Ruby, or Python that is too large or does not parse.
+
+    Args:
+        text (str): The source code.
+
+    Returns:
+        str: The imports, class, module and function lines with the comments right above them, or "" if there are none.
+    """
+    lines, comments = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            comments = (comments + [line.rstrip()])[:MAX_COMMENT_LINES]
+            continue
+        if _DECLARATION_LINE.match(line):
+            lines += comments + [line.rstrip()[:MAX_LINE_CHARS]]
+        if stripped:
+            comments = []
+    return '\n'.join(lines).strip() + '\n' if lines else ''
+
+def extract_skeleton(file_path, text):
+    """
+    Outlines a source file, with the Python syntax tree, or block structure and line patterns for other languages.
+
+    Args:
+        file_path (str): The path to the file, its extension selects the language.
+        text (str): The source code.
+
+    Returns:
+        str: The skeleton, or None if the language is not supported or nothing was extracted.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in SKELETON_EXTENSIONS:
+        return None
+    if ext in ('.py', '.pyw', '.pyi') and len(text) <= AST_MAX_CHARS:
+        try:
+            return python_skeleton(text) or None
+        except (SyntaxError, ValueError, RecursionError):
+            # Truncated or invalid sources still have recognizable def and class lines
+            return line_skeleton(text) or None
+    if ext in _INDENT_LANGUAGES or ext in ('.py', '.pyw', '.pyi'):
+        return line_skeleton(text) or None
+    return brace_skeleton(text) or None
+
+def digest_source(file_path, text, ratio):
+    """
+    Replaces the text of a source file by its skeleton when the skeleton is small enough.
+
+    Args:
+        file_path (str): The path to the file.
+        text (str): The contents that would be sent to the model.
+        ratio (float): The largest accepted skeleton size as a fraction of the text size.
+
+    Returns:
+        tuple: The contents to send and whether they are a skeleton.
+    """
+    if ratio <= 0 or not text:
+        return text, False
+    skeleton = extract_skeleton(file_path, text)
+    if skeleton is None or len(SKELETON_HEADER) + len(skeleton) > ratio * len(text):
+        return text, False
+    return SKELETON_HEADER + skeleton, True
@@ -37,6 +37,8 @@ class Spinner:
         chars = "|/-\\"
         while self.running:
             for char in chars:
+                if not self.running:
+                    break
                 sys.stdout.write(f'\r{self.message} {char}')
                 sys.stdout.flush()
                 time.sleep(self.delay)
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def git(repo_dir, *args):
+    return subprocess.run(["git", "-C", str(repo_dir), "-c", "user.name=test", "-c", "user.email=test@example.com",
+                           "-c", "commit.gpgsign=false"] + list(args), check=True, capture_output=True, text=True).stdout
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """
+    An empty Git repository, driven with the git helper.
+    """
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    git(repo_dir, "init", "-q")
+    return repo_dir
@@ -0,0 +1,66 @@
+import pytest
+import backends
+from backends import FakeBackend, set_backend
+from chunker import chunk_text, part_budget, split_into_blocks
+from pipeline import FileSummarizer
+from utils import estimate_tokens
+
+SOURCE = "".join(
+    f"@decorator\ndef function_{index}(value):\n" + "".join(f"    value = value * {line} + {index}\n" for line in range(index % 7 * 6 + 1)) + "\n"
+    for index in range(60)
+) + "x = '" + "y" * 5000 + "'\n"
+
+def tokens(chunk):
+    return sum(estimate_tokens(line) for line in chunk.splitlines(keepends=True))
+
+@pytest.mark.parametrize('chunk_tokens', [20, 100, 400])
+def test_chunks_fit_the_budget_and_cover_the_text(chunk_tokens):
+    chunks = chunk_text(SOURCE, chunk_tokens)
+    assert ''.join(chunks) == SOURCE
+    # Including the pieces of the line longer than the budget
+    assert all(tokens(chunk) <= chunk_tokens for chunk in chunks)
+
+def test_fitting_blocks_are_not_split():
+    chunks = chunk_text(SOURCE, 400)
+    for block in split_into_blocks(SOURCE)[:-1]:
+        text = ''.join(block)
+        assert any(text in chunk for chunk in chunks), block[1]
+
+def test_overlap_is_bounded():
+    chunks = chunk_text(SOURCE, 100, overlap_tokens=30)
+    plain = chunk_text(SOURCE, 100)
+    assert len(chunks) == len(plain)
+    for chunk, original in zip(chunks[1:], plain[1:]):
+        assert chunk.endswith(original)
+        assert tokens(chunk[:len(chunk) - len(original)]) <= 30
+
+def test_decorators_stay_with_their_definition():
+    blocks = split_into_blocks("@cached\n@other\ndef f():\n    pass\n\nclass A:\n    pass\n")
+    assert [block[0] for block in blocks] == ["@cached\n", "class A:\n"]
+
+class RecordingBackend(FakeBackend):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def generate(self, model_name, system_prompt, prompt):
+        self.prompts.append(prompt)
+        return "A description of this part of the file."
+
+@pytest.mark.parametrize('chunk_tokens, overlap', [(100, 30), (300, 200), (60, 0)])
+def test_chunk_requests_fit_the_budget(chunk_tokens, overlap):
+    previous = backends._backend
+    backend = RecordingBackend()
+    set_backend(backend)
+    try:
+        summary = FileSummarizer(chunk_tokens=chunk_tokens, chunk_overlap=overlap).describe_file('module.py', SOURCE)
+    finally:
+        set_backend(previous)
+    assert summary == "A description of this part of the file."
+    parts = [prompt for prompt in backend.prompts if prompt.startswith('module.py (part ')]
+    assert len(parts) > 1
+    assert all(estimate_tokens(prompt) <= chunk_tokens for prompt in backend.prompts)
+
+def test_overlap_leaves_room_for_the_text():
+    text_tokens, overlap = part_budget('module.py', 100, 500)
+    assert overlap <= text_tokens and text_tokens + overlap < 100
@@ -0,0 +1,59 @@
+import time
+import pytest
+import backends
+from conftest import git
+from daemon import ReadmeDaemon, build_parser
+
+@pytest.fixture
+def make_daemon(tmp_path):
+    previous = backends._backend
+
+    def make_daemon(*options):
+        args = build_parser().parse_args(['serve', '--backend', 'fake', '--no-cache', '--log-dir', str(tmp_path / 'logs'),
+                                          '--jobs', '1'] + list(options))
+        (tmp_path / 'logs').mkdir(exist_ok=True)
+        return ReadmeDaemon(args)
+
+    yield make_daemon
+    backends.set_backend(previous)
+
+def make_repo(path, text):
+    path.mkdir()
+    (path / 'app.py').write_text(text)
+    git(path, 'init', '-q')
+    git(path, 'add', '-A')
+    git(path, 'commit', '-qm', 'init')
+    return path
+
+def wait(daemon, job_id):
+    for _ in range(200):
+        job = daemon.get(job_id)
+        if job is None or job['finished'] is not None:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_job_writes_the_readme(make_daemon, tmp_path):
+    daemon = make_daemon()
+    repo_dir = make_repo(tmp_path / 'repo', "print('hello')\n")
+    job = wait(daemon, daemon.submit(str(repo_dir), "A greeting")['id'])
+    assert job['status'] == 'ok', job['error']
+    assert open(job['readme'], encoding='utf-8').read()
+    assert daemon.stats()['jobs']['ok'] == 1
+
+def test_finished_jobs_are_evicted_by_count(make_daemon, tmp_path):
+    daemon = make_daemon('--max-finished-jobs', '1')
+    first = daemon.submit(str(make_repo(tmp_path / 'first', "a = 1\n")))['id']
+    wait(daemon, first)
+    second = daemon.submit(str(make_repo(tmp_path / 'second', "b = 2\n")))['id']
+    assert wait(daemon, second)['status'] == 'ok'
+    assert daemon.get(first) is None
+    assert list(daemon.jobs) == [second]
+
+def test_finished_jobs_are_evicted_by_age(make_daemon, tmp_path):
+    daemon = make_daemon('--job-max-age-hours', '1')
+    job_id = daemon.submit(str(make_repo(tmp_path / 'repo', "a = 1\n")))['id']
+    wait(daemon, job_id)
+    daemon.jobs[job_id]['finished'] -= 2 * 3600
+    daemon.submit(str(tmp_path / 'missing'))
+    assert daemon.get(job_id) is None
@@ -0,0 +1,73 @@
+import io
+import struct
+import data_sampler
+from data_sampler import sample_data
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def zigzag(value):
+    return varint((value << 1) ^ (value >> 63))
+
+def struct_bytes(fields):
+    # fields: (field id, Thrift type, encoded value) in increasing field id order
+    out, last = bytearray(), 0
+    for field_id, field_type, value in fields:
+        out.append((field_id - last) << 4 | field_type)
+        out += value
+        last = field_id
+    return bytes(out) + b'\0'
+
+def list_bytes(element_type, elements):
+    header = bytes([len(elements) << 4 | element_type]) if len(elements) < 15 else bytes([0xf0 | element_type]) + varint(len(elements))
+    return header + b''.join(elements)
+
+def binary(text):
+    return varint(len(text)) + text.encode()
+
+def parquet_file(row_groups=1, trailing_field=None):
+    schema = [
+        struct_bytes([(4, 8, binary('schema')), (5, 5, zigzag(2))]),
+        struct_bytes([(1, 5, zigzag(2)), (3, 5, zigzag(0)), (4, 8, binary('id'))]),
+        struct_bytes([(1, 5, zigzag(6)), (3, 5, zigzag(1)), (4, 8, binary('name')), (6, 5, zigzag(0))]),
+    ]
+    group = struct_bytes([(1, 9, list_bytes(12, [])), (2, 6, zigzag(1024)), (3, 6, zigzag(10))])
+    fields = [(1, 5, zigzag(1)), (2, 9, list_bytes(12, schema)), (3, 6, zigzag(10 * row_groups)),
+              (4, 9, list_bytes(12, [group] * row_groups))]
+    footer = struct_bytes(fields)
+    if trailing_field:
+        footer = footer[:-1] + trailing_field + b'\0'
+    return b'PAR1' + b'\0' * 16 + footer + struct.pack('<I', len(footer)) + b'PAR1'
+
+def describe(data):
+    return sample_data(io.BytesIO(data), 'parquet', len(data))
+
+def test_parquet_footer_schema_and_rows():
+    summary = describe(parquet_file(row_groups=3))
+    assert "30 rows in 3 row groups" in summary
+    assert "Columns (2):" in summary
+    assert "  id: int64" in summary
+    assert "  name: string, nullable" in summary
+
+def test_oversized_footer_is_read_from_its_start(monkeypatch):
+    data = parquet_file(row_groups=2000)
+    monkeypatch.setattr(data_sampler, 'MAX_FOOTER_BYTES', 200)
+    summary = describe(data)
+    assert "20,000 rows" in summary
+    assert "  id: int64" in summary
+
+def test_unknown_thrift_type_keeps_the_schema():
+    # Field 7 with type 13, which the compact protocol does not define
+    summary = describe(parquet_file(trailing_field=bytes([0x3d])))
+    assert "  name: string, nullable" in summary
+
+def test_invalid_footer():
+    assert "without a valid Parquet footer" in describe(b'PAR1' + b'\0' * 16)
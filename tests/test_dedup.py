@@ -0,0 +1,28 @@
+from dedup import DuplicateIndex
+from pipeline import FileSummarizer
+
+TEXT = "\n".join(f"value_{index} = compute({index})" for index in range(100))
+
+def test_only_identical_files_match_by_default():
+    index = DuplicateIndex()
+    assert index.match('a.py', TEXT) is None
+    assert index.match('b.py', TEXT) == ('a.py', 'exact', 1.0)
+    assert index.match('c.py', TEXT + "\nextra = 1") is None
+
+def test_near_duplicates_match_from_the_threshold():
+    index = DuplicateIndex(0.8)
+    index.match('a.py', TEXT)
+    representative, kind, score = index.match('c.py', TEXT + "\nextra = 1")
+    assert (representative, kind) == ('a.py', 'near') and score >= 0.8
+
+def test_duplicates_are_read_once(tmp_path):
+    for name in ('a.txt', 'b.txt'):
+        (tmp_path / name).write_text(TEXT)
+    summarizer = FileSummarizer(duplicate_index=DuplicateIndex())
+    reads = []
+    load = summarizer.load_contents
+    summarizer.load_contents = lambda path: reads.append(path) or load(path)
+    loaded = summarizer.read_batch([str(tmp_path / 'a.txt'), str(tmp_path / 'b.txt')])
+    assert loaded[0][0] == TEXT and loaded[1] == (None, None)
+    assert summarizer.duplicates == {str(tmp_path / 'b.txt'): (str(tmp_path / 'a.txt'), 'exact', 1.0)}
+    assert len(reads) == 2
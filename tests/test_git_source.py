@@ -0,0 +1,60 @@
+import json
+import pytest
+import data_sampler
+import git_source
+from conftest import git
+from git_source import GitObjectStore, MissingBlobError
+from pipeline import FileSummarizer
+from test_data_sampler import parquet_file
+
+OUTPUT = "A" * (2 * 1024 * 1024)
+
+def notebook():
+    cells = [{"cell_type": "code", "source": ["import os\n", "print(os.getcwd())"], "outputs": [{"data": {"image/png": OUTPUT}}]},
+             {"cell_type": "markdown", "source": "# Title"},
+             {"cell_type": "code", "source": "x = 1", "outputs": []}]
+    return json.dumps({"cells": cells, "metadata": {}, "nbformat": 4})
+
+@pytest.fixture
+def bare_repo(git_repo, tmp_path):
+    (git_repo / "analysis.ipynb").write_text(notebook())
+    (git_repo / "data.parquet").write_bytes(b'\0' * (1024 * 1024) + parquet_file(row_groups=2000))
+    (git_repo / "notes.txt").write_text("plain text\n")
+    git(git_repo, "add", "-A")
+    git(git_repo, "commit", "-qm", "files")
+    git(git_repo, "config", "uploadpack.allowFilter", "true")
+    bare_dir = tmp_path / "bare.git"
+    git(tmp_path, "clone", "-q", "--bare", str(git_repo), str(bare_dir))
+    return bare_dir
+
+def test_notebook_is_streamed(bare_repo):
+    with GitObjectStore(str(bare_repo)) as store:
+        cells = store.load(store.path("analysis.ipynb"))
+        assert cells == "import os\nprint(os.getcwd())\n\nx = 1"
+        # The stream stays in sync after a notebook that was not read to its end
+        assert store.load(store.path("analysis.ipynb"), max_bytes=10).startswith("import os\n")
+        assert store.load(store.path("notes.txt")) == "plain text\n"
+
+def test_parquet_reads_the_tail(bare_repo, monkeypatch):
+    with GitObjectStore(str(bare_repo)) as store:
+        summary = store.load(store.path("data.parquet"))
+        assert "20,000 rows in 2,000 row groups" in summary and "  id: int64" in summary
+        # An oversized footer starts before the tail, its start is streamed again
+        monkeypatch.setattr(git_source, 'MAX_FOOTER_BYTES', 100)
+        monkeypatch.setattr(data_sampler, 'MAX_FOOTER_BYTES', 100)
+        summary = store.load(store.path("data.parquet"))
+        assert "20,000 rows" in summary and "  id: int64" in summary
+        assert store.load(store.path("notes.txt")) == "plain text\n"
+
+def test_missing_blob_is_reported(git_repo, bare_repo, tmp_path):
+    partial_dir = tmp_path / "partial.git"
+    git(tmp_path, "clone", "-q", "--bare", "--filter=blob:limit=1k", f"file://{git_repo}", str(partial_dir))
+    with GitObjectStore(str(partial_dir)) as store:
+        assert store.size(store.path("analysis.ipynb")) == 0
+        with pytest.raises(MissingBlobError):
+            store.load(store.path("analysis.ipynb"))
+        summarizer = FileSummarizer(source=store)
+        contents, result = summarizer.read_file(store.path("analysis.ipynb"))
+        assert contents is None and result.startswith("File was not downloaded:")
+        assert summarizer.missing_blobs == [store.path("analysis.ipynb")]
+        assert summarizer.read_file(store.path("notes.txt")) == ("plain text\n", None)
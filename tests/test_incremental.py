@@ -0,0 +1,33 @@
+from conftest import git
+from incremental import get_changed_files, get_head_commit
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def test_changed_files_are_relative_to_a_subdirectory(git_repo):
+    write(git_repo / "pkg" / "a.py", "a = 1\n")
+    write(git_repo / "pkg" / "b.py", "b = 1\n")
+    write(git_repo / "other.py", "c = 1\n")
+    git(git_repo, "add", "-A")
+    git(git_repo, "commit", "-q", "-m", "initial")
+    since = get_head_commit(git_repo)
+
+    write(git_repo / "pkg" / "a.py", "a = 2\n")
+    (git_repo / "pkg" / "b.py").unlink()
+    write(git_repo / "other.py", "c = 2\n")
+    changed, deleted = get_changed_files(str(git_repo / "pkg"), since)
+    assert changed == {"a.py"}
+    assert deleted == {"b.py"}
+
+def test_untracked_files_count_as_changed(git_repo):
+    write(git_repo / ".gitignore", "*.log\n")
+    git(git_repo, "add", "-A")
+    git(git_repo, "commit", "-q", "-m", "initial")
+    since = get_head_commit(git_repo)
+
+    write(git_repo / "new.py", "x = 1\n")
+    write(git_repo / "debug.log", "ignored\n")
+    changed, deleted = get_changed_files(str(git_repo), since)
+    assert changed == {"new.py"}
+    assert deleted == set()
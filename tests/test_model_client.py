@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import threading
+import pytest
+import backends
+from backends import FakeBackend, set_backend
+from model_client import ModelClient
+
+caller = contextvars.ContextVar('caller', default=None)
+
+class ContextBackend(FakeBackend):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def generate(self, model_name, system_prompt, prompt):
+        if prompt == 'slow':
+            self.release.wait(5)
+        return f"{caller.get()}: {prompt}"
+
+@pytest.fixture
+def client():
+    previous = backends._backend
+    backend = ContextBackend()
+    set_backend(backend)
+    client = ModelClient(max_workers=2)
+    client.register('file', 'model', 'system prompt')
+    yield client, backend
+    backend.release.set()
+    client.close()
+    set_backend(previous)
+
+def test_timed_calls_run_in_the_caller_context(client):
+    client, _ = client
+    token = caller.set('pipeline')
+    try:
+        assert client.summarize_file('hello', timeout=5) == 'pipeline: hello'
+    finally:
+        caller.reset(token)
+
+def test_timeout_stops_waiting(client):
+    client, backend = client
+    with pytest.raises(TimeoutError):
+        client.summarize_file('slow', timeout=0.05)
+    # The abandoned request holds one thread, the other one still serves calls
+    assert client.summarize_file('fast', timeout=5) == 'None: fast'
+
+class CountingBackend(ContextBackend):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def generate(self, model_name, system_prompt, prompt):
+        self.prompts.append(prompt)
+        return super().generate(model_name, system_prompt, prompt)
+
+@pytest.fixture
+def async_client():
+    previous = backends._backend
+    backend = CountingBackend()
+    set_backend(backend)
+    client = ModelClient(max_workers=1)
+    client.register('file', 'model', 'system prompt')
+    yield client, backend
+    backend.release.set()
+    client.close()
+    set_backend(previous)
+
+def test_async_calls_run_in_the_caller_context(async_client):
+    client, _ = async_client
+
+    async def call():
+        caller.set('task')
+        return await client.summarize_file_async('hello', timeout=5)
+    assert asyncio.run(call()) == 'task: hello'
+
+def test_async_timeout_and_cancellation_reach_the_caller(async_client):
+    client, backend = async_client
+
+    async def call():
+        with pytest.raises(TimeoutError):
+            await client.summarize_file_async('slow', timeout=0.05)
+        # The single pool thread is held by the abandoned request, this one waits in the queue
+        queued = asyncio.ensure_future(client.summarize_file_async('queued'))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+    asyncio.run(call())
+    backend.release.set()
+    assert client.summarize_file('after', timeout=5) == 'None: after'
+    # The cancelled request was dropped before it was sent
+    assert backend.prompts == ['slow', 'after']
@@ -0,0 +1,48 @@
+import io
+import json
+import pytest
+from notebook import extract_notebook_cells
+
+class TrickleFile(io.StringIO):
+    # Returns a few characters per read, so that every token crosses a chunk boundary somewhere
+    def read(self, size=-1):
+        return super().read(7)
+
+CELLS = [
+    {"cell_type": "markdown", "metadata": {}, "source": ["# Title\n", "\n", "Some *text*"]},
+    {"cell_type": "code", "execution_count": 1, "metadata": {"tags": ["a]b", "{c}"]},
+     "source": ["s = \"quote \\\" and [bracket] {brace}\"\n", "u = 'café \U0001F600'\n", "t = '\\t'"],
+     "outputs": [{"output_type": "stream", "text": ["]}\"[{\n"]}, {"data": {"image/png": "iVBOR" * 1000}, "output_type": "display_data"}]},
+    {"cell_type": "raw", "source": "raw text"},
+    {"cell_type": "code", "source": "x = 1", "outputs": [], "execution_count": None},
+]
+
+def reference(cells, include_markdown=False):
+    blocks = []
+    for cell in cells:
+        source = ''.join(cell['source']) if isinstance(cell['source'], list) else cell['source']
+        if cell['cell_type'] == 'code':
+            blocks.append(source)
+        elif cell['cell_type'] == 'markdown' and include_markdown:
+            blocks.append('\n'.join('# ' + line if line else '#' for line in source.splitlines()))
+    return '\n\n'.join(blocks)
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+@pytest.mark.parametrize('include_markdown', [True, False])
+def test_matches_json_parsing(ensure_ascii, include_markdown):
+    # Metadata before and after the cells, escaped and raw non-ASCII text, brackets inside strings
+    text = json.dumps({"metadata": {"kernel": {"name": "[python3]"}}, "cells": CELLS, "nbformat": 4}, ensure_ascii=ensure_ascii, indent=1)
+    expected = reference(CELLS, include_markdown)
+    assert extract_notebook_cells(io.StringIO(text), include_markdown=include_markdown) == expected
+    assert extract_notebook_cells(TrickleFile(text), include_markdown=include_markdown) == expected
+
+def test_stops_at_the_limit():
+    cells = [{"cell_type": "code", "source": f"value_{index} = {index}\n" * 50, "outputs": []} for index in range(100)]
+    text = json.dumps({"cells": cells}) + "this is never parsed"
+    result = extract_notebook_cells(io.StringIO(text), max_chars=500)
+    assert result.endswith("... [truncated after 500 characters]")
+    assert result[:500] == reference(cells)[:500]
+
+def test_invalid_notebook():
+    with pytest.raises(ValueError):
+        extract_notebook_cells(io.StringIO('{"cells": [{"source": "x" ]}'))
@@ -0,0 +1,63 @@
+import os
+from conftest import git
+from path_filter import PathFilter
+
+FILES = [
+    "app.py", "debug.log", "keep.log", "root_only.txt", "notes.txt",
+    "build/out.js", "src/build/gen.py", "src/app.py", "src/root_only.txt",
+    "docs/a.md", "docs/guide/b.md", "docs/guide/c.rst",
+    "pkg/tmp/x.py", "tmp/y.py", "pkg/data/x.csv", "pkg/data/keep/y.csv", "pkg/lib.py",
+    "vendor/lib/a.js", "vendor/lib/important.js", "name with space.txt", "#hash.txt",
+]
+ROOT_GITIGNORE = """
+# Comments and blank lines are skipped
+*.log
+!keep.log
+build/
+/root_only.txt
+docs/**/*.md
+**/tmp
+vendor/lib/*
+!vendor/lib/important.js
+name\\ with\\ space.txt
+\\#hash.txt
+"""
+PKG_GITIGNORE = """
+data/*
+!data/keep/
+*.py
+!lib.py
+"""
+
+def walked_files(path_filter, root):
+    found = set()
+    for dirpath, _, filenames in path_filter.walk():
+        for name in filenames:
+            found.add(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/'))
+    return found
+
+def test_walk_matches_git(git_repo):
+    for rel_path in FILES:
+        path = git_repo / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("content\n")
+    (git_repo / ".gitignore").write_text(ROOT_GITIGNORE)
+    (git_repo / "pkg" / ".gitignore").write_text(PKG_GITIGNORE)
+    (git_repo / ".git" / "info").mkdir(exist_ok=True)
+    (git_repo / ".git" / "info" / "exclude").write_text("notes.txt\n")
+
+    expected = set(git(git_repo, "ls-files", "-o", "--exclude-standard", "-z").split('\0')) - {''}
+    path_filter = PathFilter(str(git_repo), ignored_dirs=['.git'])
+    assert walked_files(path_filter, git_repo) == expected
+    for rel_path in FILES:
+        assert path_filter.is_path_ignored(rel_path) == (rel_path not in expected), rel_path
+
+def test_ignore_lists_and_disabled_gitignore(git_repo):
+    for rel_path in ("a.py", "a.min.js", "Makefile", "node_modules/x.js", "out.log"):
+        path = git_repo / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("content\n")
+    (git_repo / ".gitignore").write_text("*.log\n")
+    path_filter = PathFilter(str(git_repo), ignored_dirs=['.git', 'node_modules'], ignored_files=['Makefile'],
+                             ignored_exts=['.min.js'], use_gitignore=False)
+    assert walked_files(path_filter, git_repo) == {"a.py", "out.log", ".gitignore"}
@@ -0,0 +1,42 @@
+import threading
+import time
+import pytest
+import backends
+from backends import FakeBackend, set_backend
+from pipeline import DirectorySummarizer
+
+class ConcurrencyBackend(FakeBackend):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.running = self.peak = self.calls = 0
+
+    def generate(self, model_name, system_prompt, prompt):
+        with self.lock:
+            self.running += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return "A short description."
+
+@pytest.fixture
+def backend():
+    previous = backends._backend
+    backend = ConcurrencyBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+ENTRIES = [(f"file_{index}.py", "Describes one part of the program in a sentence of moderate length. " * 3) for index in range(40)]
+
+def test_directory_groups_are_described_concurrently(backend):
+    with DirectorySummarizer(workers=4, token_budget=200) as summarizer:
+        _, summary = summarizer.summarize_directory('pkg', ENTRIES, [])
+    assert summary == "A short description."
+    assert backend.calls > 4 and 1 < backend.peak <= 4
+
+def test_without_pool_groups_are_sequential(backend):
+    _, summary = DirectorySummarizer(workers=4, token_budget=200).summarize_directory('pkg', ENTRIES, [])
+    assert summary == "A short description." and backend.peak == 1
@@ -0,0 +1,30 @@
+from argparse import Namespace
+from planner import content_tokens, print_plan, PARQUET_DESCRIPTION_BYTES
+from data_sampler import SAMPLE_BYTES
+
+ARGS = Namespace(max_file_bytes=1024 * 1024, skeleton_ratio=0)
+MB = 1024 * 1024
+
+def test_data_files_count_their_sample():
+    assert content_tokens('big.csv', 500 * MB, ARGS) <= SAMPLE_BYTES // 4 + 5
+    assert content_tokens('big.parquet', 500 * MB, ARGS) <= PARQUET_DESCRIPTION_BYTES // 4 + 5
+    # Small JSON files are sent as they are
+    assert content_tokens('config.json', 4000, ARGS) >= 1000
+
+def test_notebooks_count_their_cell_sources():
+    assert content_tokens('analysis.ipynb', 100 * 1024, ARGS) < content_tokens('analysis.txt', 100 * 1024, ARGS)
+    assert content_tokens('huge.ipynb', 500 * MB, ARGS) <= ARGS.max_file_bytes // 4 + 5
+
+def test_source_files_count_their_skeleton():
+    args = Namespace(max_file_bytes=MB, skeleton_ratio=0.25)
+    assert content_tokens('module.py', 40000, args) <= 40000 * 0.25 // 4 + 5
+    assert content_tokens('notes.txt', 40000, args) >= 10000
+
+def test_directory_requests_are_whole(capsys):
+    entry = {'path': '/repo/src/a.py', 'score': 1.0, 'tokens': 10, 'requests': 1 / 3, 'selected': True, 'importers': 0,
+             'signals': {'entry': 0.0, 'recency': 0.0}}
+    plan = {'files': [entry], 'dirs': {'/repo/src': [3, 30, 1 / 3 + 1 / 3 + 1 / 3 + 1], '/repo/lib': [1, 5, 1 / 3]},
+            'requests': 3, 'file_requests': 1, 'dir_requests': 2, 'tokens': 35, 'response_tokens': 100, 'seconds': 60}
+    print_plan(plan, '/repo')
+    rows = {line.split()[0]: line.split()[-1] for line in capsys.readouterr().out.splitlines() if line.startswith(('src ', 'lib '))}
+    assert rows == {'src': '2', 'lib': '1'}
@@ -0,0 +1,45 @@
+import pytest
+import backends
+from backends import FakeBackend, set_backend
+from redme_model import ReadmeGenerator
+
+STRUCTURE = "The repository holds a parser and a command line interface."
+README = "# Project\n\nIntro.\n\n## Usage\n\nRun it.\n\n## License\n\nMIT.\n"
+
+class RecordingBackend(FakeBackend):
+    def __init__(self, route="[2]"):
+        super().__init__()
+        self.route = route
+        self.prompts = []
+
+    def generate(self, model_name, system_prompt, prompt):
+        self.prompts.append(prompt)
+        return self.route if "JSON array" in prompt else "## Usage\n\nRun it with --help.\n"
+
+    def generate_stream(self, model_name, system_prompt, prompt):
+        self.prompts.append(prompt)
+        yield README
+
+@pytest.fixture
+def backend():
+    previous = backends._backend
+    backend = RecordingBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+def test_section_edits_carry_the_structure(backend):
+    generator = ReadmeGenerator()
+    generator.generate_readme("initial prompt", structure=STRUCTURE)
+    readme = generator.provide_feedback("Show the --help flag")
+    assert "Run it with --help." in readme and "MIT." in readme
+    assert generator.sections_regenerated == 1
+    assert STRUCTURE in backend.prompts[-1]
+
+def test_rewrites_carry_the_structure(backend):
+    backend.route = "[]"
+    generator = ReadmeGenerator()
+    generator.generate_readme("initial prompt", structure=STRUCTURE)
+    generator.provide_feedback("Restructure the document")
+    assert generator.full_rewrites == 1
+    assert STRUCTURE in backend.prompts[-1] and README in backend.prompts[-1]
@@ -0,0 +1,33 @@
+from backends import FakeBackend
+from resilience import ResilientBackend, AdaptiveConcurrency
+from rate_limiter import RateLimiter, request_budget
+
+class CountingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.acquired = 0
+
+    def acquire(self, tokens=0):
+        self.acquired += 1
+
+def test_every_attempt_is_charged_to_the_rate_limiter():
+    fake = FakeBackend(rate_limit_rate=0.5, seed=1)
+    backend = ResilientBackend(fake, 4, max_retries=20, base_delay=0, max_delay=0, seed=1)
+    limiter = CountingLimiter()
+    with request_budget(limiter, 10):
+        for index in range(5):
+            backend.generate('model', 'system', f'prompt {index}')
+    assert fake.rate_limited > 0
+    assert limiter.acquired == fake.requests
+
+def test_requests_outside_a_budget_are_not_limited():
+    backend = ResilientBackend(FakeBackend(), 2)
+    assert backend.generate('model', 'system', 'prompt').startswith('Summary')
+
+def test_concurrency_recovers_up_to_its_starting_limit():
+    concurrency = AdaptiveConcurrency(4, cooldown=0)
+    concurrency.observe(rate_limited=True)
+    assert concurrency.limit < 4
+    for _ in range(200):
+        concurrency.observe(latency=0.01)
+    assert concurrency.limit == 4
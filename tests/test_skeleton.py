@@ -0,0 +1,21 @@
+from skeleton import SKELETON_HEADER, brace_skeleton, digest_source, extract_skeleton, python_skeleton
+
+IMPORTS_AND_CONSTANTS = "import os\nfrom pathlib import Path\n\nROOT = Path(os.getcwd())\nLIMIT = 10\n"
+
+def test_empty_outlines():
+    assert python_skeleton('') == ''
+    assert python_skeleton("# Only a comment\n") == ''
+    assert brace_skeleton('') == ''
+    assert extract_skeleton('empty.py', "# Only a comment\n") is None
+
+def test_imports_and_constants_are_kept():
+    assert python_skeleton(IMPORTS_AND_CONSTANTS) == "import os\nfrom pathlib import Path\nROOT = Path(os.getcwd())\nLIMIT = 10\n"
+
+def test_source_is_sent_when_the_skeleton_is_not_smaller():
+    assert digest_source('settings.py', IMPORTS_AND_CONSTANTS, 0.9) == (IMPORTS_AND_CONSTANTS, False)
+    assert digest_source('empty.py', "# Only a comment\n", 1.0) == ("# Only a comment\n", False)
+
+def test_skeleton_replaces_a_large_module():
+    text = "import os\n\ndef walk(root):\n    \"\"\"Lists the files.\"\"\"\n" + "    total = 0\n" * 100 + "    return os.listdir(root)\n"
+    digest, is_skeleton = digest_source('walk.py', text, 0.5)
+    assert is_skeleton and digest.startswith(SKELETON_HEADER) and "def walk(root):" in digest
@@ -1,32 +1,151 @@
-import pandas as pd
 import os
 import sys
-import json
+import csv
+import mmap
+import codecs
 import subprocess 
 import chardet
+from notebook import extract_notebook_cells
 
-def read_file_with_fallback(file_path):
+# Files at least this large are mapped into memory instead of read into a buffer
+MMAP_THRESHOLD = 1024 * 1024
+
+# Default cap on the number of bytes of a single file that are read and sent to the model
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+# Control characters that commonly appear in text files
+TEXT_CONTROL_BYTES = frozenset(b'\t\n\r\f\b\x1b')
+
+class BinaryFileError(ValueError):
+    """
+    Raised when a file looks like binary data rather than text.
+    """
+
+def read_file_bytes(file_path, max_bytes=None):
+    """
+    Reads the contents of a file in a single pass, memory-mapping large files.
+
+    Args:
+        file_path (str): The path to the file.
+        max_bytes (int, optional): The maximum number of bytes to read. Defaults to None (no limit).
+
+    Returns:
+        tuple: The bytes read and a flag telling whether the file was truncated to max_bytes.
+    """
     with open(file_path, 'rb') as file:
-        raw = file.read(10000) 
-        detected = chardet.detect(raw)
-        encoding = detected['encoding']
+        size = os.fstat(file.fileno()).st_size
+        limit = size if max_bytes is None else min(size, max_bytes)
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                raw = mapped[:limit]
+        else:
+            raw = file.read(limit if max_bytes is not None else -1)
+    return raw, size > len(raw)
+
+def is_binary(raw, sample_size=8192):
+    """
+    Guesses whether a buffer holds binary data by looking for NUL bytes and at the
+    ratio of printable characters in its first bytes.
+
+    Args:
+        raw (bytes): The buffer to inspect.
+        sample_size (int, optional): The number of leading bytes to inspect. Defaults to 8192.
+
+    Returns:
+        bool: True if the buffer looks like binary data.
+    """
+    sample = raw[:sample_size]
+    if not sample or sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE, codecs.BOM_UTF8)):
+        return False
+    if b'\x00' in sample:
+        return True
+    control = sum(1 for byte in sample if byte < 32 and byte not in TEXT_CONTROL_BYTES or byte == 127)
+    return control / len(sample) > 0.1
 
+def decode_bytes(raw, truncated=False):
+    """
+    Decodes a buffer with the detected encoding, falling back to utf-8, latin-1 and ascii.
+
+    Args:
+        raw (bytes): The buffer to decode.
+        truncated (bool, optional): Whether the buffer was cut short, in which case an incomplete
+            trailing multi-byte sequence is dropped instead of failing the decode. Defaults to False.
+
+    Returns:
+        str: The decoded text, or None if no encoding could decode the buffer.
+    """
+    # Most source files are valid UTF-8, which is far cheaper to verify than to detect
+    try:
+        text = codecs.getincrementaldecoder('utf-8')().decode(raw, final=not truncated)
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+    except UnicodeDecodeError:
+        pass
+
+    encoding = chardet.detect(raw[:10000])['encoding']
     encodings = [encoding, 'utf-8', 'latin-1', 'ascii'] if encoding else ['utf-8', 'latin-1', 'ascii']
-    
+
     for enc in encodings:
         try:
-            with open(file_path, 'r', encoding=enc) as file:
-                return file.read()
-        except UnicodeDecodeError:
+            text = codecs.getincrementaldecoder(enc)().decode(raw, final=not truncated)
+        except (UnicodeDecodeError, LookupError):
             continue
-    return f"Unable to read {file_path} with any of the attempted encodings"
+        # Normalizing line endings the same way text mode reading does
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+    return None
 
-def extract_code_cells_from_notebook(file_path):
+def read_file_with_fallback(file_path, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Reads a text file once, rejecting binary content and decoding the buffer with a fallback chain of encodings.
+
+    Args:
+        file_path (str): The path to the file.
+        max_bytes (int, optional): The maximum number of bytes to read. Defaults to DEFAULT_MAX_BYTES.
+
+    Returns:
+        str: The decoded contents of the file, with a note appended if it was truncated.
+
+    Raises:
+        BinaryFileError: If the file looks like binary data.
+    """
+    raw, truncated = read_file_bytes(file_path, max_bytes)
+    return decode_file_bytes(raw, truncated, file_path)
+
+def decode_file_bytes(raw, truncated, file_path):
+    """
+    Turns the raw contents of a text file into the text sent to the model, see read_file_with_fallback.
+
+    Args:
+        raw (bytes): The contents of the file.
+        truncated (bool): Whether raw stops before the end of the file.
+        file_path (str): The path to the file, used in messages.
+
+    Returns:
+        str: The decoded contents, with a note appended if they were truncated.
+
+    Raises:
+        BinaryFileError: If the contents look like binary data.
+    """
+    if is_binary(raw):
+        raise BinaryFileError(f"{file_path} looks like a binary file")
+
+    text = decode_bytes(raw, truncated)
+    if text is None:
+        return f"Unable to read {file_path} with any of the attempted encodings"
+    if truncated:
+        text += f"\n... [truncated after {len(raw)} bytes]"
+    return text
+
+def extract_code_cells_from_notebook(file_path, max_chars=None, include_markdown=False):
     """
     Extracts code cells from a Jupyter notebook file.
 
+    The notebook is parsed as a stream, so cell outputs and attachments are skipped
+    without being loaded into memory.
+
     Args:
         file_path (str): The path to the Jupyter notebook file.
+        max_chars (int, optional): The maximum number of characters extracted. Defaults to None (no limit).
+        include_markdown (bool, optional): Include markdown cells as comments. Defaults to False.
 
     Returns:
         str: A string containing the code from all code cells in the notebook, 
@@ -35,14 +154,7 @@ def extract_code_cells_from_notebook(file_path):
     
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            notebook_data = json.load(f)
-        
-        code_blocks = []
-        for cell in notebook_data['cells']:
-            if cell['cell_type'] == 'code':
-                code_blocks.append(''.join(cell['source']))
-        
-        return '\n\n'.join(code_blocks)
+            return extract_notebook_cells(f, max_chars, include_markdown)
     
     except Exception as e:
         print(f"Error processing Jupyter notebook {file_path}: {e}")
@@ -62,37 +174,101 @@ def read_csv_file(file_path):
     """
 
     try:
-        df = pd.read_csv(file_path, header=None)
-        return df.iloc[:, 0].tolist()
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            values = [row[0] for row in csv.reader(file) if row and row[0].strip()]
+        if not values:
+            print(f"The file {file_path} is empty.")
+        return values
     except UnicodeDecodeError as e:
         print(f"Error decoding the file {file_path}: {e}")
-    except pd.errors.EmptyDataError:
-        print(f"The file {file_path} is empty.")
     except FileNotFoundError:
         print(f"The file {file_path} was not found.")
     except Exception as e:
         print(f"An unexpected error occurred while reading {file_path}: {e}")
     return []
 
-def clone_repository(repo_name, root_dir):
+def repository_dir_name(repo_name, bare=False):
     """
-    Clones a Git repository to a specified directory.
+    Returns the name of the directory Git clones a repository into.
+
+    Args:
+        repo_name (str): The URL of the Git repository.
+        bare (bool, optional): Whether the clone is bare. Defaults to False.
+
+    Returns:
+        str: The directory name, e.g. "project" or "project.git" for a bare clone.
+    """
+    name = repo_name.rstrip('/').split('/')[-1].split(':')[-1]
+    if name.endswith('.git'):
+        name = name[:-len('.git')]
+    return name + '.git' if bare else name
+
+def clone_repository(repo_name, root_dir, bare=False, blob_limit=None):
+    """
+    Clones the latest commit of a Git repository to a specified directory, without its history.
 
     Args:
         repo_name (str): The URL of the Git repository.
         root_dir (str): The directory where the repository will be cloned.
+        bare (bool, optional): Clone without a working tree, for reading files from the object
+            database. Defaults to False.
+        blob_limit (int, optional): For bare clones, do not download files larger than this many
+            bytes. Needs a server that supports partial clone. Defaults to None.
 
     Returns:
-        None
+        str: The path to the cloned repository directory.
     """
 
     url = f"{repo_name}"
+    target_dir = os.path.abspath(os.path.join(root_dir, repository_dir_name(repo_name, bare)))
+    command = ["git", "clone", "--depth", "1"]
+    if bare:
+        command.append("--bare")
+        if blob_limit:
+            command.append(f"--filter=blob:limit={blob_limit}")
     try:
-        subprocess.run(["git", "clone", url], cwd=root_dir, check=True)
+        subprocess.run(command + [url, target_dir], cwd=root_dir, check=True)
         print(f"Successfully cloned the repository: {repo_name}")
     except subprocess.CalledProcessError as e:
         print(f"Failed to clone the repository. Error: {e}")
         raise
+    return target_dir
+
+def refresh_repository(repo_dir, repo_name, blob_limit=None):
+    """
+    Updates an existing clone to the latest commit of its remote with a shallow fetch.
+
+    A bare clone is moved to the fetched commit. A clone with a working tree is reset to it
+    with "git reset --keep", which refuses to discard local changes.
+
+    Args:
+        repo_dir (str): The directory of the existing clone.
+        repo_name (str): The URL the clone is expected to come from.
+        blob_limit (int, optional): For bare clones, do not download files larger than this many bytes. Defaults to None.
+
+    Raises:
+        ValueError: If the directory is not a clone of repo_name.
+        subprocess.CalledProcessError: If a Git command failed.
+    """
+    def git(*args):
+        return subprocess.run(["git", "-C", repo_dir] + list(args), check=True, capture_output=True, text=True).stdout.strip()
+
+    try:
+        origin = git("remote", "get-url", "origin")
+    except subprocess.CalledProcessError:
+        origin = None
+    if origin != repo_name:
+        raise ValueError(f"{repo_dir} is not a clone of {repo_name} (origin: {origin})")
+    bare = git("rev-parse", "--is-bare-repository") == "true"
+    command = ["fetch", "--depth", "1"]
+    if bare and blob_limit:
+        command.append(f"--filter=blob:limit={blob_limit}")
+    git(*command, "origin", "HEAD")
+    if bare:
+        git("update-ref", "HEAD", "FETCH_HEAD")
+    else:
+        git("reset", "--keep", "FETCH_HEAD")
+    print(f"Refreshed {repo_dir} to {git('rev-parse', '--short', 'HEAD')}")
 
 def read_existing_readme(repo_dir):
     """
@@ -115,34 +291,41 @@ def read_existing_readme(repo_dir):
         print(f"Error reading existing README.md: {e}")
     return ""
 
-def check_and_clone_repository(repo_name, root_dir):
+def check_and_clone_repository(repo_name, root_dir, bare=False, blob_limit=None):
     """
-    Checks if a repository is already cloned, and clones it if not.
+    Checks if a repository is already cloned, refreshing it if so and cloning it if not.
 
     Args:
         repo_name (str): The URL of the Git repository.
         root_dir (str): The directory where the repository will be cloned.
+        bare (bool, optional): Whether to use a bare clone. Defaults to False.
+        blob_limit (int, optional): For bare clones, the largest file downloaded in bytes. Defaults to None.
 
     Returns:
         str: The path to the cloned repository directory.
 
     """
-    repo_dir = repo_name.split('/')[-1]
-    target_dir = os.path.join(root_dir, repo_dir)
+    target_dir = os.path.abspath(os.path.join(root_dir, repository_dir_name(repo_name, bare)))
     
     if os.path.exists(target_dir):
-        print(f"Repository '{repo_name}' is already cloned. Proceeding with existing directory.")
+        print(f"Repository '{repo_name}' is already cloned. Fetching the latest commit.")
+        try:
+            refresh_repository(target_dir, repo_name, blob_limit)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        except subprocess.CalledProcessError as e:
+            print(f"Could not refresh the existing clone, proceeding with it as is: {e.stderr or e}")
         return target_dir
     
     print(f"Cloning repository '{repo_name}'...")
     try:
-        clone_repository(repo_name, root_dir)
-        return target_dir
+        return clone_repository(repo_name, root_dir, bare, blob_limit)
     except Exception as e:
         print(f"Error cloning repository: {e}")
         retry = input("Do you want to retry? (y/n): ")
         if retry.lower() == 'y':
-            return check_and_clone_repository(repo_name, root_dir)
+            return check_and_clone_repository(repo_name, root_dir, bare, blob_limit)
         else:
             print("Exiting due to cloning failure.")
             sys.exit(1)
@@ -157,6 +340,8 @@ def get_repo_path(args):
                 - git (str): The URL of the Git repository.
                 - root (str): The root directory for cloning Git repositories.
                 - local (str): The path to a local directory.
+                - ingest (str): "objects" for a bare clone read from the object database.
+                - blob_limit (int): For bare clones, the largest file downloaded in bytes, or None.
 
     Returns:
         str: The path to the repository directory.
@@ -165,7 +350,8 @@ def get_repo_path(args):
         if not args.root:
             print("Please provide a root directory for cloning Git repositories.")
             exit(1)
-        return check_and_clone_repository(args.git, args.root)
+        objects = args.ingest == 'objects'
+        return check_and_clone_repository(args.git, args.root, bare=objects, blob_limit=args.blob_limit if objects else None)
     elif args.local:
         if os.path.isdir(args.local):
             return os.path.abspath(args.local)
@@ -174,4 +360,16 @@ def get_repo_path(args):
             exit(1)
     else:
         print("Please provide either a Git repository URL or a local directory path.")
-        exit(1)
\ No newline at end of file
+        exit(1)
+
+def estimate_tokens(text):
+    """
+    Roughly estimates the number of model tokens in a piece of text.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated token count, assuming about four characters per token.
+    """
+    return len(text) // 4 + 1